@@ -1,25 +1,44 @@
 """Provide pre-made queries on top of the recorder component."""
 from collections import defaultdict
 from datetime import timedelta
-from itertools import groupby
+from heapq import merge
+from itertools import chain, groupby
+import json
 import logging
+from operator import attrgetter
 import time
 
+from aiohttp import web
 import voluptuous as vol
 
 from homeassistant.const import (
+    CONTENT_TYPE_JSON,
     HTTP_BAD_REQUEST,
     CONF_DOMAINS,
     CONF_ENTITIES,
     CONF_EXCLUDE,
     CONF_INCLUDE,
+    EVENT_STATE_CHANGED,
 )
+from homeassistant.core import State, callback
 import homeassistant.util.dt as dt_util
-from homeassistant.components import recorder, script
+from homeassistant.components import recorder, script, websocket_api
 from homeassistant.components.http import HomeAssistantView
 from homeassistant.const import ATTR_HIDDEN
-from homeassistant.components.recorder.util import session_scope, execute
+from homeassistant.components.recorder.const import EVENT_RECORDER_PURGE_PROGRESS
+from homeassistant.components.recorder.snapshots import most_recent_state_ids
+from homeassistant.components.recorder.models import STATE_COLUMNS, decode_states
+from homeassistant.components.recorder.util import (
+    execute,
+    execute_states,
+    session_scope,
+)
 import homeassistant.helpers.config_validation as cv
+from homeassistant.helpers.entityfilter import generate_filter
+from homeassistant.helpers.json import JSONEncoder
+
+from .cache import BUCKET_SIZE, SETTLE_TIME, CachedBucket, HistoryCache, bucket_start
+from .downsample import MIN_POINTS, downsample
 
 
 # mypy: allow-untyped-defs, no-check-untyped-defs
@@ -28,11 +47,20 @@ _LOGGER = logging.getLogger(__name__)
 
 DOMAIN = "history"
 CONF_ORDER = "use_include_order"
+CONF_CACHE_SIZE = "cache_size_mb"
+
+DATA_CACHE = "history_cache"
+DEFAULT_CACHE_SIZE = 16
 
 CONFIG_SCHEMA = vol.Schema(
     {
         DOMAIN: recorder.FILTER_SCHEMA.extend(
-            {vol.Optional(CONF_ORDER, default=False): cv.boolean}
+            {
+                vol.Optional(CONF_ORDER, default=False): cv.boolean,
+                vol.Optional(CONF_CACHE_SIZE, default=DEFAULT_CACHE_SIZE): vol.All(
+                    vol.Coerce(int), vol.Range(min=0)
+                ),
+            }
         )
     },
     extra=vol.ALLOW_EXTRA,
@@ -41,6 +69,21 @@ CONFIG_SCHEMA = vol.Schema(
 SIGNIFICANT_DOMAINS = ("thermostat", "climate", "water_heater")
 IGNORE_DOMAINS = ("zone", "scene")
 
+# Periods longer than these use the statistics of numeric entities
+STATISTICS_SHORT_TERM_MIN_PERIOD = timedelta(days=3)
+STATISTICS_MIN_PERIOD = timedelta(days=30)
+
+# Number of states fetched from the database at once when streaming
+STREAM_BATCH_SIZE = 1000
+
+# Seconds a history stream waits for the recorder to commit the queued states
+STREAM_COMMIT_TIMEOUT = 10
+
+# Number of state ids queried at once, below the SQLite bound parameter limit
+QUERY_MAX_IDS = 990
+
+MAX_POINTS_SCHEMA = vol.All(vol.Coerce(int), vol.Range(min=MIN_POINTS))
+
 
 def get_significant_states(
     hass,
@@ -49,6 +92,8 @@ def get_significant_states(
     entity_ids=None,
     filters=None,
     include_start_time_state=True,
+    minimal_response=False,
+    max_points=None,
 ):
     """
     Return states changes during UTC period start_time - end_time.
@@ -56,30 +101,51 @@ def get_significant_states(
     Significant states are all states where there is a state change,
     as well as all states from certain domains (for instance
     thermostat so that we get current temperature in our graphs).
+
+    For long periods numeric entities are represented by the mean of their
+    recorded statistics instead.
+
+    With minimal_response only the first state of an entity is a State, the
+    later changes of its state are (state, last_changed timestamp) pairs.
+
+    With max_points the states of numeric entities are downsampled to about
+    that many points.
     """
+    if max_points is not None:
+        result = get_significant_states(
+            hass,
+            start_time,
+            end_time,
+            entity_ids,
+            filters,
+            include_start_time_state,
+            minimal_response,
+        )
+        return {
+            entity_id: downsample(states, max_points)
+            for entity_id, states in result.items()
+        }
+
+    if minimal_response:
+        return _get_minimal_states(
+            hass, start_time, end_time, entity_ids, filters, include_start_time_state
+        )
+
     timer_start = time.perf_counter()
     from homeassistant.components.recorder.models import States
 
-    with session_scope(hass=hass) as session:
-        query = session.query(States).filter(
-            (
-                States.domain.in_(SIGNIFICANT_DOMAINS)
-                | (States.last_changed == States.last_updated)
-            )
-            & (States.last_updated > start_time)
+    with session_scope(hass=hass, read_only=True) as session:
+        statistics, spans = _get_statistics(
+            session, start_time, end_time, entity_ids, filters
         )
 
-        if filters:
-            query = filters.apply(query, entity_ids)
-
-        if end_time is not None:
-            query = query.filter(States.last_updated < end_time)
-
-        query = query.order_by(States.last_updated)
+        query = _significant_states_query(
+            session, start_time, end_time, entity_ids, filters, spans
+        ).order_by(States.last_updated)
 
         states = (
             state
-            for state in execute(query)
+            for state in execute_states(query)
             if (_is_significant(state) and not state.attributes.get(ATTR_HIDDEN, False))
         )
 
@@ -88,15 +154,412 @@ def get_significant_states(
         _LOGGER.debug("get_significant_states took %fs", elapsed)
 
     return states_to_json(
-        hass, states, start_time, entity_ids, filters, include_start_time_state
+        hass,
+        merge(
+            states,
+            sorted(statistics, key=attrgetter("last_updated")),
+            key=attrgetter("last_updated"),
+        ),
+        start_time,
+        entity_ids,
+        filters,
+        include_start_time_state,
     )
 
 
+def stream_significant_states(
+    hass,
+    start_time,
+    end_time=None,
+    entity_ids=None,
+    filters=None,
+    include_start_time_state=True,
+    max_points=None,
+):
+    """Yield the significant states of a period as a JSON array per entity.
+
+    The states are those of get_significant_states. They are read in
+    batches ordered by entity id and the array of an entity is yielded as
+    soon as its last state is read, so only the states of one entity are
+    held in memory. The batches are read through a read session that stays
+    open until the generator is exhausted or closed.
+    """
+    from homeassistant.components.recorder.models import States
+
+    session = hass.data[recorder.DATA_INSTANCE].get_read_session.session_factory()
+
+    with session_scope(session=session):
+        statistics, spans = _get_statistics(
+            session, start_time, end_time, entity_ids, filters
+        )
+
+        initial_states = {}
+        if include_start_time_state:
+            for state in get_states(hass, start_time, entity_ids, filters=filters):
+                state.last_changed = start_time
+                state.last_updated = start_time
+                initial_states[state.entity_id] = state
+
+        query = _significant_states_query(
+            session, start_time, end_time, entity_ids, filters, spans
+        ).order_by(States.entity_id, States.last_updated)
+
+        states = (
+            state
+            for state in decode_states(
+                query.with_entities(*STATE_COLUMNS).yield_per(STREAM_BATCH_SIZE)
+            )
+            if _is_significant(state) and not state.attributes.get(ATTR_HIDDEN, False)
+        )
+
+        for entity_id, group in groupby(
+            merge(states, statistics, key=attrgetter("entity_id", "last_updated")),
+            attrgetter("entity_id"),
+        ):
+            initial_state = initial_states.pop(entity_id, None)
+            if initial_state is not None:
+                group = chain((initial_state,), group)
+            group = list(group)
+            if max_points is not None:
+                group = downsample(group, max_points)
+            yield json.dumps(group, cls=JSONEncoder)
+
+    # Entities that did not change during the period
+    for state in initial_states.values():
+        yield json.dumps([state], cls=JSONEncoder)
+
+
+def _json_array(arrays):
+    """Yield the JSON arrays of the entities as the parts of one JSON array."""
+    separator = "["
+    try:
+        for array in arrays:
+            yield separator + array
+            separator = ","
+    finally:
+        arrays.close()
+    yield "[]" if separator == "[" else "]"
+
+
+def get_significant_states_json(
+    hass,
+    cache,
+    start_time,
+    end_time,
+    entity_ids=None,
+    filters=None,
+    include_start_time_state=True,
+):
+    """Return the significant states of a period JSON encoded by entity id.
+
+    The states of a period shorter than the statistics period are returned
+    as lists of JSON encoded states. The states of the hourly buckets in the
+    period are taken from the cache as far as they are cached. Only the
+    states from the moment a bucket was cached until are read, and states
+    are only cached once the recorder committed the states of their moment.
+    """
+    timer_start = time.perf_counter()
+    result = defaultdict(list)
+    # Set all entity IDs to empty lists in result set to maintain the order
+    if entity_ids is not None:
+        for ent_id in entity_ids:
+            result[ent_id] = []
+
+    if include_start_time_state:
+        for state in get_states(hass, start_time, entity_ids, filters=filters):
+            state.last_changed = start_time
+            state.last_updated = start_time
+            result[state.entity_id].append(json.dumps(state, cls=JSONEncoder))
+
+    def add(fragments):
+        """Add the JSON encoded states of a part of the period."""
+        for entity_id, parts in fragments.items():
+            result[entity_id].extend(parts)
+
+    # Only states the recorder committed are cached
+    committed = hass.data[recorder.DATA_INSTANCE].committed_until
+    settled = start_time if committed is None else committed - SETTLE_TIME
+    cache_key = None if entity_ids is None else tuple(entity_ids)
+
+    with session_scope(hass=hass, read_only=True) as session:
+        start = bucket_start(start_time)
+        if start < start_time:
+            start += BUCKET_SIZE
+        covered = min(start, end_time)
+        add(_significant_states_json(session, start_time, covered, entity_ids, filters))
+
+        while start < end_time and start < settled:
+            until = min(start + BUCKET_SIZE, end_time, settled)
+            key = (cache_key, start)
+            bucket = cache.get(key)
+
+            if bucket is not None and bucket.until > until:
+                # The states of the bucket go past the end of the period
+                add(
+                    _significant_states_json(
+                        session, start, until, entity_ids, filters, True
+                    )
+                )
+            else:
+                if bucket is None:
+                    bucket = CachedBucket(start, {})
+                if bucket.until < until:
+                    bucket = bucket.extend(
+                        until,
+                        _significant_states_json(
+                            session, bucket.until, until, entity_ids, filters, True
+                        ),
+                    )
+                    cache.set(key, bucket)
+                add(bucket.fragments)
+
+            start += BUCKET_SIZE
+            covered = until
+
+        add(
+            _significant_states_json(
+                session, covered, end_time, entity_ids, filters, True
+            )
+        )
+
+    if _LOGGER.isEnabledFor(logging.DEBUG):
+        elapsed = time.perf_counter() - timer_start
+        _LOGGER.debug("get_significant_states_json took %fs", elapsed)
+
+    # Filter out the empty lists if some states had 0 results.
+    return {key: val for key, val in result.items() if val}
+
+
+def _significant_states_json(
+    session, start_time, end_time, entity_ids, filters, include_start=False
+):
+    """Return the JSON encoded significant states of a period by entity id."""
+    from homeassistant.components.recorder.models import States
+
+    fragments = defaultdict(list)
+    if start_time >= end_time:
+        return fragments
+
+    query = _significant_states_query(
+        session,
+        start_time,
+        end_time,
+        entity_ids,
+        filters,
+        {},
+        include_start=include_start,
+    ).order_by(States.last_updated)
+
+    for state in execute_states(query):
+        if _is_significant(state) and not state.attributes.get(ATTR_HIDDEN, False):
+            fragments[state.entity_id].append(json.dumps(state, cls=JSONEncoder))
+
+    return fragments
+
+
+def _get_minimal_states(
+    hass, start_time, end_time, entity_ids, filters, include_start_time_state
+):
+    """Return the changes of the states of a period with minimal payload.
+
+    The state and last_changed columns are all that is read of the changes
+    after the first state of an entity, so their attributes are never
+    decoded. Whether an entity is hidden is decided by its first state.
+    """
+    timer_start = time.perf_counter()
+    from homeassistant.components.recorder.models import States
+
+    result = defaultdict(list)
+    # Set all entity IDs to empty lists in result set to maintain the order
+    if entity_ids is not None:
+        for ent_id in entity_ids:
+            result[ent_id] = []
+
+    if include_start_time_state:
+        for state in get_states(hass, start_time, entity_ids, filters=filters):
+            state.last_changed = start_time
+            state.last_updated = start_time
+            result[state.entity_id].append(state)
+    start_entity_ids = {entity_id for entity_id, states in result.items() if states}
+
+    changes = defaultdict(list)
+    with session_scope(hass=hass, read_only=True) as session:
+        statistics, spans = _get_statistics(
+            session, start_time, end_time, entity_ids, filters
+        )
+        for state in statistics:
+            changes[state.entity_id].append(state)
+
+        query = _significant_states_query(
+            session,
+            start_time,
+            end_time,
+            entity_ids,
+            filters,
+            spans,
+            minimal_response=True,
+        ).order_by(States.last_updated)
+
+        for row in query:
+            changes[row.entity_id].append(row)
+
+        # Raw states outside of the statistics of an entity go in between
+        for entity_id in spans:
+            changes[entity_id].sort(
+                key=lambda change: dt_util.as_utc(change.last_changed)
+            )
+
+        # The first change of an entity without a state at the start time
+        # is a full state
+        first_state_ids = []
+        for entity_id, entity_changes in changes.items():
+            if result[entity_id]:
+                continue
+            first_change = entity_changes.pop(0)
+            if isinstance(first_change, State):
+                result[entity_id].append(first_change)
+            else:
+                first_state_ids.append(first_change.state_id)
+
+        for index in range(0, len(first_state_ids), QUERY_MAX_IDS):
+            query = session.query(States).filter(
+                States.state_id.in_(first_state_ids[index : index + QUERY_MAX_IDS])
+            )
+            for state in execute_states(query):
+                result[state.entity_id].append(state)
+
+    for entity_id, entity_changes in changes.items():
+        entity_states = result[entity_id]
+        if not entity_states:
+            continue
+        if not _is_significant(entity_states[0]) or entity_states[0].attributes.get(
+            ATTR_HIDDEN, False
+        ):
+            if entity_id not in start_entity_ids:
+                entity_states.clear()
+            continue
+        entity_states.extend(
+            (change.state, dt_util.as_utc(change.last_changed).timestamp())
+            for change in entity_changes
+        )
+
+    if _LOGGER.isEnabledFor(logging.DEBUG):
+        elapsed = time.perf_counter() - timer_start
+        _LOGGER.debug("getting minimal states took %fs", elapsed)
+
+    # Filter out the empty lists if some states had 0 results.
+    return {key: val for key, val in result.items() if val}
+
+
+def _significant_states_query(
+    session,
+    start_time,
+    end_time,
+    entity_ids,
+    filters,
+    statistics_spans,
+    minimal_response=False,
+    include_start=False,
+):
+    """Return the query of the significant states of a period.
+
+    A minimal query returns only the columns needed for a minimal response
+    of the changes of the state, as changes of the attributes are not sent.
+    States at start_time are only included with include_start. The states
+    of an entity within the span of its statistics are left out.
+    """
+    from homeassistant.components.recorder.models import States
+    from sqlalchemy import or_
+
+    if include_start:
+        after_start = States.last_updated >= start_time
+    else:
+        after_start = States.last_updated > start_time
+
+    if minimal_response:
+        query = session.query(
+            States.state_id, States.entity_id, States.state, States.last_changed
+        ).filter((States.last_changed == States.last_updated) & after_start)
+    else:
+        query = session.query(States).filter(
+            (
+                States.domain.in_(SIGNIFICANT_DOMAINS)
+                | (States.last_changed == States.last_updated)
+            )
+            & after_start
+        )
+
+    if filters:
+        query = filters.apply(query, entity_ids)
+
+    if end_time is not None:
+        query = query.filter(States.last_updated < end_time)
+
+    if statistics_spans:
+        entity_ids_by_span = defaultdict(list)
+        for entity_id, span in statistics_spans.items():
+            entity_ids_by_span[span].append(entity_id)
+        query = query.filter(
+            ~or_(
+                *(
+                    States.entity_id.in_(sorted(span_entity_ids))
+                    & (States.last_updated >= span_start)
+                    & (States.last_updated < span_end)
+                    for (span_start, span_end), span_entity_ids in sorted(
+                        entity_ids_by_span.items()
+                    )
+                )
+            )
+        )
+
+    return query
+
+
+def _get_statistics(session, start_time, end_time, entity_ids, filters):
+    """Return the statistics of a period as states, if it is long enough.
+
+    Also returns the span the statistics of every entity cover, from the
+    start of its first period until the end of its last period.
+    """
+    from homeassistant.components.recorder.models import Statistics, StatisticsShortTerm
+
+    period = (end_time or dt_util.utcnow()) - start_time
+    if period > STATISTICS_MIN_PERIOD:
+        table = Statistics
+    elif period > STATISTICS_SHORT_TERM_MIN_PERIOD:
+        table = StatisticsShortTerm
+    else:
+        return [], {}
+
+    query = session.query(table).filter(table.start >= start_time)
+
+    if end_time is not None:
+        query = query.filter(table.start < end_time)
+
+    if filters:
+        query = filters.apply(query, entity_ids, table)
+    elif entity_ids is not None:
+        query = query.filter(table.entity_id.in_(entity_ids))
+
+    query = query.order_by(table.entity_id, table.start)
+
+    statistics = []
+    spans = {}
+    for state in execute(query):
+        if state.attributes.get(ATTR_HIDDEN, False):
+            continue
+        statistics.append(state)
+        span_start = spans.get(state.entity_id, (state.last_updated,))[0]
+        spans[state.entity_id] = (span_start, state.last_updated + table.period)
+
+    return statistics, spans
+
+
 def state_changes_during_period(hass, start_time, end_time=None, entity_id=None):
     """Return states changes during UTC period start_time - end_time."""
     from homeassistant.components.recorder.models import States
 
-    with session_scope(hass=hass) as session:
+    with session_scope(hass=hass, read_only=True) as session:
         query = session.query(States).filter(
             (States.last_changed == States.last_updated)
             & (States.last_updated > start_time)
@@ -110,7 +573,7 @@ def state_changes_during_period(hass, start_time, end_time=None, entity_id=None)
 
         entity_ids = [entity_id] if entity_id is not None else None
 
-        states = execute(query.order_by(States.last_updated))
+        states = execute_states(query.order_by(States.last_updated))
 
     return states_to_json(hass, states, start_time, entity_ids)
 
@@ -121,7 +584,7 @@ def get_last_state_changes(hass, number_of_states, entity_id):
 
     start_time = dt_util.utcnow()
 
-    with session_scope(hass=hass) as session:
+    with session_scope(hass=hass, read_only=True) as session:
         query = session.query(States).filter(
             (States.last_changed == States.last_updated)
         )
@@ -131,7 +594,7 @@ def get_last_state_changes(hass, number_of_states, entity_id):
 
         entity_ids = [entity_id] if entity_id is not None else None
 
-        states = execute(
+        states = execute_states(
             query.order_by(States.last_updated.desc()).limit(number_of_states)
         )
 
@@ -151,9 +614,7 @@ def get_states(hass, utc_point_in_time, entity_ids=None, run=None, filters=None)
         if run is None:
             return []
 
-    from sqlalchemy import and_, func
-
-    with session_scope(hass=hass) as session:
+    with session_scope(hass=hass, read_only=True) as session:
         query = session.query(States)
 
         if entity_ids and len(entity_ids) == 1:
@@ -171,44 +632,14 @@ def get_states(hass, utc_point_in_time, entity_ids=None, run=None, filters=None)
 
         else:
             # We have more than one entity to look at (most commonly we want
-            # all entities,) so we need to do a search on all states since the
-            # last recorder run started.
-
-            most_recent_states_by_date = session.query(
-                States.entity_id.label("max_entity_id"),
-                func.max(States.last_updated).label("max_last_updated"),
-            ).filter(
-                (States.last_updated >= run.start)
-                & (States.last_updated < utc_point_in_time)
-            )
-
-            if entity_ids:
-                most_recent_states_by_date.filter(States.entity_id.in_(entity_ids))
-
-            most_recent_states_by_date = most_recent_states_by_date.group_by(
-                States.entity_id
-            )
-
-            most_recent_states_by_date = most_recent_states_by_date.subquery()
-
-            most_recent_state_ids = session.query(
-                func.max(States.state_id).label("max_state_id")
-            ).join(
-                most_recent_states_by_date,
-                and_(
-                    States.entity_id == most_recent_states_by_date.c.max_entity_id,
-                    States.last_updated
-                    == most_recent_states_by_date.c.max_last_updated,
-                ),
+            # all entities,) so we need to search the states since the last
+            # checkpoint of the recorder run.
+            state_ids = most_recent_state_ids(
+                session, run.start, utc_point_in_time, entity_ids
             )
 
-            most_recent_state_ids = most_recent_state_ids.group_by(States.entity_id)
-
-            most_recent_state_ids = most_recent_state_ids.subquery()
-
             query = query.join(
-                most_recent_state_ids,
-                States.state_id == most_recent_state_ids.c.max_state_id,
+                state_ids, States.state_id == state_ids.c.max_state_id
             ).filter(~States.domain.in_(IGNORE_DOMAINS))
 
             if filters:
@@ -216,7 +647,7 @@ def get_states(hass, utc_point_in_time, entity_ids=None, run=None, filters=None)
 
         return [
             state
-            for state in execute(query)
+            for state in execute_states(query)
             if not state.attributes.get(ATTR_HIDDEN, False)
         ]
 
@@ -279,7 +710,23 @@ async def async_setup(hass, config):
         filters.included_domains = include.get(CONF_DOMAINS, [])
     use_include_order = conf.get(CONF_ORDER)
 
-    hass.http.register_view(HistoryPeriodView(filters, use_include_order))
+    cache = None
+    cache_size = conf.get(CONF_CACHE_SIZE, DEFAULT_CACHE_SIZE)
+    if cache_size:
+        cache = hass.data[DATA_CACHE] = HistoryCache(cache_size * 1024 * 1024)
+
+        @callback
+        def async_clear_cache(event):
+            """Forget the cached states, some may be purged."""
+            cache.clear()
+
+        hass.bus.async_listen(EVENT_RECORDER_PURGE_PROGRESS, async_clear_cache)
+
+    hass.data[DOMAIN] = filters
+    hass.http.register_view(HistoryPeriodView(filters, use_include_order, cache))
+    hass.components.websocket_api.async_register_command(ws_get_history_period)
+    hass.components.websocket_api.async_register_command(ws_get_cache_info)
+    hass.components.websocket_api.async_register_command(ws_stream_history)
     hass.components.frontend.async_register_built_in_panel(
         "history", "history", "hass:poll-box"
     )
@@ -294,10 +741,11 @@ class HistoryPeriodView(HomeAssistantView):
     name = "api:history:view-period"
     extra_urls = ["/api/history/period/{datetime}"]
 
-    def __init__(self, filters, use_include_order):
+    def __init__(self, filters, use_include_order, cache=None):
         """Initialize the history period view."""
         self.filters = filters
         self.use_include_order = use_include_order
+        self.cache = cache
 
     async def get(self, request, datetime=None):
         """Return history over a period of time."""
@@ -332,10 +780,56 @@ class HistoryPeriodView(HomeAssistantView):
         if entity_ids:
             entity_ids = entity_ids.lower().split(",")
         include_start_time_state = "skip_initial_state" not in request.query
+        minimal_response = "minimal_response" in request.query
+        max_points = request.query.get("max_points")
+        if max_points is not None:
+            try:
+                max_points = MAX_POINTS_SCHEMA(max_points)
+            except vol.Invalid:
+                return self.json_message("Invalid max_points", HTTP_BAD_REQUEST)
 
         hass = request.app["hass"]
 
-        result = await hass.async_add_job(
+        # The include order needs all entities before the first is written
+        if (
+            "stream" in request.query
+            and not self.use_include_order
+            and not minimal_response
+        ):
+            return await recorder.async_stream_read_response(
+                request,
+                _json_array(
+                    stream_significant_states(
+                        hass,
+                        start_time,
+                        end_time,
+                        entity_ids,
+                        self.filters,
+                        include_start_time_state,
+                        max_points,
+                    )
+                ),
+            )
+
+        if (
+            self.cache is not None
+            and not minimal_response
+            and max_points is None
+            and end_time - start_time <= STATISTICS_SHORT_TERM_MIN_PERIOD
+        ):
+            body = await recorder.async_add_read_job(
+                hass,
+                self._cached_json,
+                hass,
+                start_time,
+                end_time,
+                entity_ids,
+                include_start_time_state,
+            )
+            return web.Response(body=body, content_type=CONTENT_TYPE_JSON)
+
+        result = await recorder.async_add_read_job(
+            hass,
             get_significant_states,
             hass,
             start_time,
@@ -343,6 +837,8 @@ class HistoryPeriodView(HomeAssistantView):
             entity_ids,
             self.filters,
             include_start_time_state,
+            minimal_response,
+            max_points,
         )
         result = list(result.values())
         if _LOGGER.isEnabledFor(logging.DEBUG):
@@ -364,6 +860,188 @@ class HistoryPeriodView(HomeAssistantView):
 
         return await hass.async_add_job(self.json, result)
 
+    def _cached_json(
+        self, hass, start_time, end_time, entity_ids, include_start_time_state
+    ):
+        """Return the history of a period as JSON using the cache."""
+        result = get_significant_states_json(
+            hass,
+            self.cache,
+            start_time,
+            end_time,
+            entity_ids,
+            self.filters,
+            include_start_time_state,
+        )
+
+        order = list(result)
+        # Optionally reorder the result to respect the ordering given
+        # by any entities explicitly included in the configuration.
+        if self.use_include_order:
+            included = {
+                entity_id: index
+                for index, entity_id in enumerate(self.filters.included_entities)
+            }
+            order.sort(key=lambda entity_id: included.get(entity_id, len(included)))
+
+        return "[{}]".format(
+            ",".join("[{}]".format(",".join(result[entity_id])) for entity_id in order)
+        ).encode("utf-8")
+
+
+@websocket_api.websocket_command(
+    {
+        vol.Required("type"): "history/period",
+        vol.Required("start_time"): cv.datetime,
+        vol.Optional("end_time"): cv.datetime,
+        vol.Optional("entity_ids"): cv.entity_ids,
+        vol.Optional("include_start_time_state", default=True): cv.boolean,
+        vol.Optional("minimal_response", default=False): cv.boolean,
+        vol.Optional("max_points"): MAX_POINTS_SCHEMA,
+    }
+)
+@websocket_api.async_response
+async def ws_get_history_period(hass, connection, msg):
+    """Return the history of a period by entity id."""
+    start_time = dt_util.as_utc(msg["start_time"])
+    end_time = msg.get("end_time")
+    if end_time is not None:
+        end_time = dt_util.as_utc(end_time)
+
+    result = await recorder.async_add_read_job(
+        hass,
+        get_significant_states,
+        hass,
+        start_time,
+        end_time,
+        msg.get("entity_ids"),
+        hass.data[DOMAIN],
+        msg["include_start_time_state"],
+        msg["minimal_response"],
+        msg.get("max_points"),
+    )
+    connection.send_result(msg["id"], result)
+
+
+@websocket_api.websocket_command(
+    {
+        vol.Required("type"): "history/stream",
+        vol.Required("start_time"): cv.datetime,
+        vol.Optional("entity_ids"): cv.entity_ids,
+        vol.Optional("include_start_time_state", default=True): cv.boolean,
+        vol.Optional("minimal_response", default=False): cv.boolean,
+    }
+)
+@websocket_api.async_response
+async def ws_stream_history(hass, connection, msg):
+    """Send the history since a moment and then the new significant states.
+
+    The history is sent as the first event, every later event holds the new
+    states by entity id. States recorded while the history is read are sent
+    after it.
+    """
+    filters = hass.data[DOMAIN]
+    entity_ids = msg.get("entity_ids")
+    minimal_response = msg["minimal_response"]
+    if entity_ids is not None:
+        entity_filter = set(entity_ids).__contains__
+    else:
+        entity_filter = filters.entity_filter()
+
+    pending = []
+    sent_entity_ids = None
+
+    @callback
+    def send_states(states):
+        """Send new states, in minimal form once an entity was sent."""
+        result = defaultdict(list)
+        for state in states:
+            if minimal_response and state.entity_id in sent_entity_ids:
+                result[state.entity_id].append(
+                    (state.state, state.last_changed.timestamp())
+                )
+            else:
+                sent_entity_ids.add(state.entity_id)
+                result[state.entity_id].append(state)
+        connection.send_message(
+            websocket_api.event_message(msg["id"], {"states": result})
+        )
+
+    @callback
+    def forward_state(event):
+        """Forward a new state that is significant for history."""
+        state = event.data.get("new_state")
+        if state is None or not entity_filter(state.entity_id):
+            return
+        if state.last_changed != state.last_updated and (
+            minimal_response or state.domain not in SIGNIFICANT_DOMAINS
+        ):
+            return
+        if entity_ids is None and state.domain in IGNORE_DOMAINS:
+            return
+        if not _is_significant(state) or state.attributes.get(ATTR_HIDDEN, False):
+            return
+
+        if sent_entity_ids is None:
+            pending.append(state)
+        else:
+            send_states([state])
+
+    connection.subscriptions[msg["id"]] = hass.bus.async_listen(
+        EVENT_STATE_CHANGED, forward_state
+    )
+    connection.send_result(msg["id"])
+
+    # The states before the end time are read from the database
+    end_time = dt_util.utcnow()
+    if not await hass.data[recorder.DATA_INSTANCE].async_wait_committed(
+        STREAM_COMMIT_TIMEOUT
+    ):
+        _LOGGER.debug(
+            "The recorder did not commit within %ss, the history may miss states",
+            STREAM_COMMIT_TIMEOUT,
+        )
+    try:
+        history = await recorder.async_add_read_job(
+            hass,
+            get_significant_states,
+            hass,
+            dt_util.as_utc(msg["start_time"]),
+            end_time,
+            entity_ids,
+            filters,
+            msg["include_start_time_state"],
+            minimal_response,
+        )
+    except Exception as err:  # pylint: disable=broad-except
+        _LOGGER.exception("Error reading the history to stream")
+        pending.clear()
+        unsub = connection.subscriptions.pop(msg["id"], None)
+        if unsub is not None:
+            unsub()
+            connection.send_error(
+                msg["id"], websocket_api.const.ERR_UNKNOWN_ERROR, str(err)
+            )
+        return
+
+    if msg["id"] not in connection.subscriptions:
+        return
+
+    connection.send_message(websocket_api.event_message(msg["id"], {"states": history}))
+    sent_entity_ids = set(history)
+    new_states = [state for state in pending if state.last_updated >= end_time]
+    pending.clear()
+    if new_states:
+        send_states(new_states)
+
+
+@websocket_api.websocket_command({vol.Required("type"): "history/cache_info"})
+@callback
+def ws_get_cache_info(hass, connection, msg):
+    """Return the size and hit rate of the history cache."""
+    cache = hass.data.get(DATA_CACHE)
+    connection.send_result(msg["id"], cache.as_dict() if cache is not None else None)
+
 
 class Filters:
     """Container for the configured include and exclude filters."""
@@ -375,9 +1053,21 @@ class Filters:
         self.included_entities = []
         self.included_domains = []
 
-    def apply(self, query, entity_ids=None):
+    def entity_filter(self):
+        """Return a function testing whether an entity passes the filters."""
+        return generate_filter(
+            self.included_domains,
+            self.included_entities,
+            self.excluded_domains,
+            self.excluded_entities,
+        )
+
+    def apply(self, query, entity_ids=None, table=None):
         """Apply the include/exclude filter on domains and entities on query.
 
+        The filter is applied to the States table unless another table with
+        domain and entity_id columns is passed.
+
         Following rules apply:
         * only the include section is configured - just query the specified
           entities or domains.
@@ -388,45 +1078,48 @@ class Filters:
         """
         from homeassistant.components.recorder.models import States
 
+        if table is None:
+            table = States
+
         # specific entities requested - do not in/exclude anything
         if entity_ids is not None:
-            return query.filter(States.entity_id.in_(entity_ids))
-        query = query.filter(~States.domain.in_(IGNORE_DOMAINS))
+            return query.filter(table.entity_id.in_(entity_ids))
+        query = query.filter(~table.domain.in_(IGNORE_DOMAINS))
 
         filter_query = None
         # filter if only excluded domain is configured
         if self.excluded_domains and not self.included_domains:
-            filter_query = ~States.domain.in_(self.excluded_domains)
+            filter_query = ~table.domain.in_(self.excluded_domains)
             if self.included_entities:
-                filter_query &= States.entity_id.in_(self.included_entities)
+                filter_query &= table.entity_id.in_(self.included_entities)
         # filter if only included domain is configured
         elif not self.excluded_domains and self.included_domains:
-            filter_query = States.domain.in_(self.included_domains)
+            filter_query = table.domain.in_(self.included_domains)
             if self.included_entities:
-                filter_query |= States.entity_id.in_(self.included_entities)
+                filter_query |= table.entity_id.in_(self.included_entities)
         # filter if included and excluded domain is configured
         elif self.excluded_domains and self.included_domains:
-            filter_query = ~States.domain.in_(self.excluded_domains)
+            filter_query = ~table.domain.in_(self.excluded_domains)
             if self.included_entities:
-                filter_query &= States.domain.in_(
+                filter_query &= table.domain.in_(
                     self.included_domains
-                ) | States.entity_id.in_(self.included_entities)
+                ) | table.entity_id.in_(self.included_entities)
             else:
-                filter_query &= States.domain.in_(
+                filter_query &= table.domain.in_(
                     self.included_domains
-                ) & ~States.domain.in_(self.excluded_domains)
+                ) & ~table.domain.in_(self.excluded_domains)
         # no domain filter just included entities
         elif (
             not self.excluded_domains
             and not self.included_domains
             and self.included_entities
         ):
-            filter_query = States.entity_id.in_(self.included_entities)
+            filter_query = table.entity_id.in_(self.included_entities)
         if filter_query is not None:
             query = query.filter(filter_query)
         # finally apply excluded entities filter if configured
         if self.excluded_entities:
-            query = query.filter(~States.entity_id.in_(self.excluded_entities))
+            query = query.filter(~table.entity_id.in_(self.excluded_entities))
         return query
 
 
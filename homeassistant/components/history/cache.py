@@ -0,0 +1,107 @@
+"""Cache of the history of past time buckets."""
+from collections import OrderedDict
+from datetime import datetime, timedelta
+import threading
+from typing import Any, Dict, Hashable, List, Optional
+
+import homeassistant.util.dt as dt_util
+
+# Length of the periods the history is cached by
+BUCKET_SIZE = timedelta(hours=1)
+# Time before the last committed event after which states of a moment are
+# no longer expected to be recorded
+SETTLE_TIME = timedelta(minutes=5)
+
+
+class CachedBucket:
+    """The JSON encoded states of every entity in part of a bucket.
+
+    A bucket holds the states from its start until until. Buckets are not
+    changed once cached, an extended bucket replaces the cached one.
+    """
+
+    __slots__ = ("until", "fragments", "size")
+
+    def __init__(self, until: datetime, fragments: Dict[str, List[str]]) -> None:
+        """Initialize the bucket."""
+        self.until = until
+        self.fragments = fragments
+        self.size = sum(
+            len(fragment) for parts in fragments.values() for fragment in parts
+        )
+
+    def extend(
+        self, until: datetime, fragments: Dict[str, List[str]]
+    ) -> "CachedBucket":
+        """Return the bucket with the states until until added."""
+        extended = {
+            entity_id: list(parts) for entity_id, parts in self.fragments.items()
+        }
+        for entity_id, parts in fragments.items():
+            extended.setdefault(entity_id, []).extend(parts)
+        return CachedBucket(until, extended)
+
+
+class HistoryCache:
+    """Least recently used cache of buckets, bounded by the size of their JSON.
+
+    Used from the threads of the read executor.
+    """
+
+    def __init__(self, max_bytes: int) -> None:
+        """Initialize the cache."""
+        self.max_bytes = max_bytes
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self._buckets: Dict[Hashable, CachedBucket] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: Hashable) -> Optional[CachedBucket]:
+        """Return the cached bucket of key."""
+        with self._lock:
+            bucket = self._buckets.get(key)
+            if bucket is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self._buckets.move_to_end(key)  # type: ignore
+            return bucket
+
+    def set(self, key: Hashable, bucket: CachedBucket) -> None:
+        """Cache the bucket of key, evicting the least recently used ones."""
+        with self._lock:
+            old = self._buckets.pop(key, None)
+            if old is not None:
+                self.size -= old.size
+            if bucket.size > self.max_bytes:
+                return
+            self._buckets[key] = bucket
+            self.size += bucket.size
+            while self.size > self.max_bytes:
+                _, evicted = self._buckets.popitem(last=False)  # type: ignore
+                self.size -= evicted.size
+
+    def clear(self) -> None:
+        """Remove all cached buckets."""
+        with self._lock:
+            self._buckets.clear()
+            self.size = 0
+
+    def as_dict(self) -> Dict[str, Any]:
+        """Return the state of the cache."""
+        return {
+            "buckets": len(self._buckets),
+            "size": self.size,
+            "max_size": self.max_bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+        }
+
+
+def bucket_start(moment: datetime) -> datetime:
+    """Return the start of the bucket moment is in."""
+    timestamp = moment.timestamp()
+    return dt_util.utc_from_timestamp(
+        timestamp - timestamp % BUCKET_SIZE.total_seconds()
+    )
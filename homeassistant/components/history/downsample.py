@@ -0,0 +1,91 @@
+"""Downsample the history of numeric entities for graphs."""
+import math
+from typing import Any, List, Optional, Sequence, Tuple
+
+from homeassistant.const import ATTR_UNIT_OF_MEASUREMENT
+from homeassistant.core import State
+
+# The first, the last and at least one point in between
+MIN_POINTS = 3
+
+
+def downsample(states: List[Any], max_points: int) -> List[Any]:
+    """Reduce the states of a numeric entity to about max_points.
+
+    The states are those of an entity in a history response, a State or a
+    (state, timestamp) pair of a minimal response. Entities without a unit
+    of measurement are not graphed as numbers and are returned unchanged.
+    States that are not numeric, like unavailable, are always kept.
+    """
+    if len(states) <= max_points or not isinstance(states[0], State):
+        return states
+    if ATTR_UNIT_OF_MEASUREMENT not in states[0].attributes:
+        return states
+
+    indexes = []
+    points = []
+    for index, state in enumerate(states):
+        point = _point(state)
+        if point is not None:
+            indexes.append(index)
+            points.append(point)
+
+    keep = set(range(len(states))) - set(indexes)
+    threshold = max(max_points - len(keep), MIN_POINTS)
+    keep.update(indexes[index] for index in lttb(points, threshold))
+
+    return [states[index] for index in sorted(keep)]
+
+
+def lttb(points: Sequence[Tuple[float, float]], threshold: int) -> List[int]:
+    """Return the indexes of the points that Largest-Triangle-Three-Buckets keeps.
+
+    The points between the first and the last are divided over buckets. Of
+    every bucket the point is kept that forms the largest triangle with the
+    point kept of the previous bucket and the average of the next bucket.
+    """
+    count = len(points)
+    if threshold >= count or threshold < MIN_POINTS:
+        return list(range(count))
+
+    kept = [0]
+    every = (count - 2) / (threshold - 2)
+    previous = 0
+
+    for bucket in range(threshold - 2):
+        next_start = int((bucket + 1) * every) + 1
+        next_end = min(int((bucket + 2) * every) + 1, count)
+        next_points = points[next_start:next_end]
+        avg_x = sum(point[0] for point in next_points) / len(next_points)
+        avg_y = sum(point[1] for point in next_points) / len(next_points)
+
+        prev_x, prev_y = points[previous]
+        max_area = -1.0
+        for index in range(int(bucket * every) + 1, next_start):
+            x, y = points[index]
+            area = abs(
+                (prev_x - avg_x) * (y - prev_y) - (prev_x - x) * (avg_y - prev_y)
+            )
+            if area > max_area:
+                max_area = area
+                previous = index
+
+        kept.append(previous)
+
+    kept.append(count - 1)
+    return kept
+
+
+def _point(state: Any) -> Optional[Tuple[float, float]]:
+    """Return the time and value of a numeric state."""
+    if isinstance(state, State):
+        value, moment = state.state, state.last_changed.timestamp()
+    else:
+        value, moment = state
+
+    try:
+        number = float(value)
+    except ValueError:
+        return None
+
+    return (moment, number) if math.isfinite(number) else None
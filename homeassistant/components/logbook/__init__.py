@@ -1,6 +1,7 @@
 """Event parser and human readable log generator."""
 from datetime import timedelta
 from itertools import groupby
+import json
 import logging
 
 import voluptuous as vol
@@ -11,9 +12,11 @@ from homeassistant.components.http import HomeAssistantView
 from homeassistant.const import (
     ATTR_DOMAIN,
     ATTR_ENTITY_ID,
+    ATTR_FRIENDLY_NAME,
     ATTR_HIDDEN,
     ATTR_NAME,
     ATTR_SERVICE,
+    ATTR_UNIT_OF_MEASUREMENT,
     CONF_EXCLUDE,
     CONF_INCLUDE,
     EVENT_HOMEASSISTANT_START,
@@ -27,7 +30,13 @@ from homeassistant.const import (
     STATE_OFF,
     STATE_ON,
 )
-from homeassistant.core import DOMAIN as HA_DOMAIN, State, callback, split_entity_id
+from homeassistant.core import (
+    DOMAIN as HA_DOMAIN,
+    Context,
+    State,
+    callback,
+    split_entity_id,
+)
 from homeassistant.components.alexa.smart_home import EVENT_ALEXA_SMART_HOME
 from homeassistant.components.homekit.const import (
     ATTR_DISPLAY_NAME,
@@ -36,6 +45,7 @@ from homeassistant.components.homekit.const import (
     EVENT_HOMEKIT_CHANGED,
 )
 import homeassistant.helpers.config_validation as cv
+from homeassistant.helpers.json import JSONEncoder
 import homeassistant.util.dt as dt_util
 
 _LOGGER = logging.getLogger(__name__)
@@ -50,6 +60,13 @@ DOMAIN = "logbook"
 
 GROUP_BY_MINUTES = 15
 
+# Number of entries written to a streamed response at once
+STREAM_CHUNK_SIZE = 100
+
+EPOCH = dt_util.utc_from_timestamp(0)
+
+LIMIT_SCHEMA = vol.All(vol.Coerce(int), vol.Range(min=1))
+
 CONFIG_SCHEMA = vol.Schema(
     {
         DOMAIN: vol.Schema(
@@ -152,7 +169,13 @@ class LogbookView(HomeAssistantView):
         self.config = config
 
     async def get(self, request, datetime=None):
-        """Retrieve logbook entries."""
+        """Retrieve logbook entries.
+
+        With a limit or a cursor the entries are returned a page at a time,
+        as an object with the entries and the cursor of the next page.
+        """
+        from homeassistant.components.recorder import async_stream_read_response
+
         if datetime:
             datetime = dt_util.parse_datetime(datetime)
 
@@ -167,18 +190,37 @@ class LogbookView(HomeAssistantView):
         else:
             period = int(period)
 
+        limit = request.query.get("limit")
+        if limit is not None:
+            try:
+                limit = LIMIT_SCHEMA(limit)
+            except vol.Invalid:
+                return self.json_message("Invalid limit", HTTP_BAD_REQUEST)
+
+        cursor = request.query.get("cursor")
+        if cursor is not None:
+            cursor = _decode_cursor(cursor)
+            if cursor is None:
+                return self.json_message("Invalid cursor", HTTP_BAD_REQUEST)
+
         entity_id = request.query.get("entity")
         start_day = dt_util.as_utc(datetime) - timedelta(days=period - 1)
         end_day = start_day + timedelta(days=period)
         hass = request.app["hass"]
 
-        def json_events():
-            """Fetch events and generate JSON."""
-            return self.json(
-                _get_events(hass, self.config, start_day, end_day, entity_id)
-            )
-
-        return await hass.async_add_job(json_events)
+        return await async_stream_read_response(
+            request,
+            stream_events_json(
+                hass,
+                self.config,
+                start_day,
+                end_day,
+                entity_id,
+                limit,
+                cursor,
+                paginate=limit is not None or cursor is not None,
+            ),
+        )
 
 
 def humanify(hass, events):
@@ -228,7 +270,7 @@ def humanify(hass, events):
         for event in events_batch:
             if event.event_type == EVENT_STATE_CHANGED:
 
-                to_state = State.from_dict(event.data.get("new_state"))
+                to_state = _new_state(event)
 
                 domain = to_state.domain
 
@@ -370,40 +412,8 @@ def humanify(hass, events):
                 }
 
 
-def _get_related_entity_ids(session, entity_filter):
-    from homeassistant.components.recorder.models import States
-    from homeassistant.components.recorder.util import RETRIES, QUERY_RETRY_WAIT
-    from sqlalchemy.exc import SQLAlchemyError
-    import time
-
-    timer_start = time.perf_counter()
-
-    query = session.query(States).with_entities(States.entity_id).distinct()
-
-    for tryno in range(0, RETRIES):
-        try:
-            result = [row.entity_id for row in query if entity_filter(row.entity_id)]
-
-            if _LOGGER.isEnabledFor(logging.DEBUG):
-                elapsed = time.perf_counter() - timer_start
-                _LOGGER.debug(
-                    "fetching %d distinct domain/entity_id pairs took %fs",
-                    len(result),
-                    elapsed,
-                )
-
-            return result
-        except SQLAlchemyError as err:
-            _LOGGER.error("Error executing query: %s", err)
-
-            if tryno == RETRIES - 1:
-                raise
-            time.sleep(QUERY_RETRY_WAIT)
-
-
-def _generate_filter_from_config(config):
-    from homeassistant.helpers.entityfilter import generate_filter
-
+def _get_filter_lists(config):
+    """Return the included and excluded domains and entities of config."""
     excluded_entities = []
     excluded_domains = []
     included_entities = []
@@ -418,47 +428,323 @@ def _generate_filter_from_config(config):
         included_entities = include.get(CONF_ENTITIES, [])
         included_domains = include.get(CONF_DOMAINS, [])
 
-    return generate_filter(
-        included_domains, included_entities, excluded_domains, excluded_entities
-    )
+    return included_domains, included_entities, excluded_domains, excluded_entities
+
+
+def _generate_filter_from_config(config):
+    from homeassistant.helpers.entityfilter import generate_filter
+
+    return generate_filter(*_get_filter_lists(config))
+
+
+def _generate_filter_clause_from_config(config):
+    """Return the SQL clause on the states table matching the entity filter.
+
+    Mirrors the cases of generate_filter, None means all entities pass.
+    """
+    from homeassistant.components.recorder.models import States
+
+    include_d, include_e, exclude_d, exclude_e = _get_filter_lists(config)
+    have_include = bool(include_d or include_e)
+    have_exclude = bool(exclude_d or exclude_e)
+
+    if not have_include and not have_exclude:
+        return None
+
+    if have_include and not have_exclude:
+        return States.domain.in_(include_d) | States.entity_id.in_(include_e)
+
+    if not have_include and have_exclude:
+        return ~States.domain.in_(exclude_d) & ~States.entity_id.in_(exclude_e)
+
+    if include_d:
+        return (States.domain.in_(include_d) & ~States.entity_id.in_(exclude_e)) | (
+            ~States.domain.in_(include_d) & States.entity_id.in_(include_e)
+        )
+
+    if exclude_d:
+        return (States.domain.in_(exclude_d) & States.entity_id.in_(include_e)) | (
+            ~States.domain.in_(exclude_d) & ~States.entity_id.in_(exclude_e)
+        )
+
+    return States.entity_id.in_(include_e)
 
 
 def _get_events(hass, config, start_day, end_day, entity_id=None):
     """Get events for a period of time."""
-    from homeassistant.components.recorder.models import Events, States
     from homeassistant.components.recorder.util import session_scope
 
+    with session_scope(hass=hass, read_only=True) as session:
+        query = _get_events_query(session, config, start_day, end_day, entity_id)
+        return list(humanify(hass, _yield_events(query, config)))
+
+
+def stream_events_json(
+    hass,
+    config,
+    start_day,
+    end_day,
+    entity_id=None,
+    limit=None,
+    cursor=None,
+    paginate=False,
+):
+    """Yield the entries of a period as the parts of a JSON document.
+
+    Without paginate the document is the array of the entries. With
+    paginate it is an object with the entries after cursor and, if there
+    are more, the next_cursor to continue from. A page holds the first
+    limit events and the events in the same group as the last of them,
+    so pages are humanified the same as the whole period. The entries
+    are yielded in chunks of STREAM_CHUNK_SIZE.
+    """
+    from homeassistant.components.recorder.const import DATA_INSTANCE
+    from homeassistant.components.recorder.util import session_scope
+
+    session = hass.data[DATA_INSTANCE].get_read_session.session_factory()
+    page = {"next_cursor": None}
+
+    yield '{"entries": [' if paginate else "["
+
+    with session_scope(session=session):
+        query = _get_events_query(
+            session, config, start_day, end_day, entity_id, cursor
+        )
+        events = _yield_events(query, config)
+        if limit is not None:
+            events = _limit_events(events, limit, page)
+
+        separator = ""
+        entries = []
+        for entry in humanify(hass, events):
+            entries.append(json.dumps(entry, cls=JSONEncoder))
+            if len(entries) == STREAM_CHUNK_SIZE:
+                yield separator + ",".join(entries)
+                separator = ","
+                entries.clear()
+        if entries:
+            yield separator + ",".join(entries)
+
+    if paginate:
+        yield '], "next_cursor": {}}}'.format(json.dumps(page["next_cursor"]))
+    else:
+        yield "]"
+
+
+def _limit_events(events, limit, page):
+    """Yield the first limit events and the rest of the group of the last.
+
+    The cursor of the first event that is not yielded is stored in page.
+    """
+    group = None
+    last_event = None
+    for count, event in enumerate(events):
+        key = event.time_fired.minute // GROUP_BY_MINUTES
+        if count >= limit and key != group:
+            page["next_cursor"] = _encode_cursor(last_event)
+            return
+        group = key
+        last_event = event
+        yield event
+
+
+def _encode_cursor(event):
+    """Return the cursor pointing after an event."""
+    microseconds = (event.time_fired - EPOCH) // timedelta(microseconds=1)
+    return f"{microseconds}:{event.event_id}"
+
+
+def _decode_cursor(cursor):
+    """Return the time fired and event id of a cursor, None if invalid."""
+    try:
+        microseconds, event_id = (int(part) for part in cursor.split(":"))
+    except ValueError:
+        return None
+    return EPOCH + timedelta(microseconds=microseconds), event_id
+
+
+def _yield_events(query, config):
+    """Yield the events of the query that are not filtered away."""
     entities_filter = _generate_filter_from_config(config)
+    attributes_cache = {}
 
-    def yield_events(query):
-        """Yield Events that are not filtered away."""
-        for row in query.yield_per(500):
-            event = row.to_native()
-            if _keep_event(event, entities_filter):
+    for row in query.yield_per(500):
+        event = LazyEventPartialState(row, attributes_cache)
+        if event.event_type == EVENT_STATE_CHANGED:
+            if _keep_state_event(event):
                 yield event
+        elif _keep_event(event, entities_filter):
+            yield event
 
-    with session_scope(hass=hass) as session:
-        if entity_id is not None:
-            entity_ids = [entity_id.lower()]
-        else:
-            entity_ids = _get_related_entity_ids(session, entities_filter)
-
-        query = (
-            session.query(Events)
-            .order_by(Events.time_fired)
-            .outerjoin(States, (Events.event_id == States.event_id))
-            .filter(Events.event_type.in_(ALL_EVENT_TYPES))
-            .filter((Events.time_fired > start_day) & (Events.time_fired < end_day))
-            .filter(
-                (
-                    (States.last_updated == States.last_changed)
-                    & States.entity_id.in_(entity_ids)
-                )
-                | (States.state_id.is_(None))
-            )
+
+def _keep_state_event(event):
+    """Return whether to report a state_changed event of the query.
+
+    The query filters these events on the columns of the states table, the
+    checks of _keep_event on the old state and attributes are left.
+    """
+    if event.is_new_entity:
+        return False
+
+    attributes = event.attributes
+    if attributes.get(ATTR_HIDDEN, False):
+        return False
+    if event.domain == "group" and attributes.get("auto", False):
+        return False
+
+    # Don't show continuous sensor value changes in the logbook
+    return not (
+        event.domain in CONTINUOUS_DOMAINS and attributes.get(ATTR_UNIT_OF_MEASUREMENT)
+    )
+
+
+def _get_events_query(session, config, start_day, end_day, entity_id=None, cursor=None):
+    """Return the query of the events of a period, after cursor if passed."""
+    from homeassistant.components.recorder.models import Events, StateAttributes, States
+    from sqlalchemy import case, func
+
+    attributes = func.coalesce(StateAttributes.shared_attrs, States.attributes)
+
+    # Mirrors _keep_event for the state_changed events as far as the columns
+    # of the states table go, _keep_state_event does the rest.
+    state_clause = (
+        (States.last_updated == States.last_changed)
+        # Do not report on entity removal
+        & (States.state != "")
+    )
+    if entity_id is not None:
+        state_clause &= States.entity_id == entity_id.lower()
+    else:
+        filter_clause = _generate_filter_clause_from_config(config)
+        if filter_clause is not None:
+            state_clause &= filter_clause
+
+    query = (
+        session.query(
+            Events.event_id,
+            Events.event_type,
+            # The data of state_changed events is only used to tell whether
+            # there was an old state, so it is only selected when it may
+            # say there was none
+            case(
+                [
+                    (
+                        (Events.event_type != EVENT_STATE_CHANGED)
+                        | Events.event_data.like('%"old_state": null%')
+                        | Events.event_data.like('%"old_state":null%'),
+                        Events.event_data,
+                    )
+                ]
+            ).label("event_data"),
+            Events.time_fired,
+            Events.context_id,
+            Events.context_user_id,
+            States.entity_id,
+            States.domain,
+            States.state,
+            attributes.label("attributes"),
+        )
+        .order_by(Events.time_fired, Events.event_id)
+        .outerjoin(States, (Events.event_id == States.event_id))
+        .outerjoin(
+            StateAttributes, (States.attributes_id == StateAttributes.attributes_id)
         )
+        .filter(Events.event_type.in_(ALL_EVENT_TYPES))
+        .filter((Events.time_fired > start_day) & (Events.time_fired < end_day))
+        .filter((Events.event_type != EVENT_STATE_CHANGED) | state_clause)
+    )
+
+    if cursor is not None:
+        time_fired, event_id = cursor
+        query = query.filter(
+            (Events.time_fired > time_fired)
+            | ((Events.time_fired == time_fired) & (Events.event_id > event_id))
+        )
+
+    return query
+
 
-        return list(humanify(hass, yield_events(query)))
+class LazyEventPartialState:
+    """An event of the logbook query, decoded as far as it is used.
+
+    The event data is only decoded for events other than state_changed. For
+    those the entity and new state are read from the joined states row, so
+    the event also serves as the new state.
+    """
+
+    __slots__ = [
+        "_row",
+        "_attributes_cache",
+        "_data",
+        "event_id",
+        "event_type",
+        "time_fired",
+        "entity_id",
+        "domain",
+        "state",
+    ]
+
+    def __init__(self, row, attributes_cache):
+        """Initialize the event."""
+        from homeassistant.components.recorder.models import _process_timestamp
+
+        self._row = row
+        self._attributes_cache = attributes_cache
+        self._data = None
+        self.event_id = row.event_id
+        self.event_type = row.event_type
+        self.time_fired = _process_timestamp(row.time_fired)
+        self.entity_id = row.entity_id
+        self.domain = row.domain
+        self.state = row.state
+
+    @property
+    def data(self):
+        """Return the event data."""
+        if self._data is None:
+            if self.event_type == EVENT_STATE_CHANGED:
+                self._data = {"entity_id": self.entity_id}
+            else:
+                self._data = json.loads(self._row.event_data)
+        return self._data
+
+    @property
+    def context(self):
+        """Return the context of the event."""
+        return Context(id=self._row.context_id, user_id=self._row.context_user_id)
+
+    @property
+    def is_new_entity(self):
+        """Return whether the state_changed event has no old state."""
+        if self._row.event_data is None:
+            return False
+        data = json.loads(self._row.event_data)
+        return "old_state" in data and data["old_state"] is None
+
+    @property
+    def attributes(self):
+        """Return the attributes of the new state."""
+        shared_attrs = self._row.attributes
+        if shared_attrs is None:
+            return {}
+        attributes = self._attributes_cache.get(shared_attrs)
+        if attributes is None:
+            attributes = self._attributes_cache[shared_attrs] = json.loads(shared_attrs)
+        return attributes
+
+    @property
+    def name(self):
+        """Return the name of the new state."""
+        return self.attributes.get(ATTR_FRIENDLY_NAME) or split_entity_id(
+            self.entity_id
+        )[1].replace("_", " ")
+
+
+def _new_state(event):
+    """Return the new state of a state_changed event."""
+    if isinstance(event, LazyEventPartialState):
+        return event
+    return State.from_dict(event.data.get("new_state"))
 
 
 def _keep_event(event, entities_filter):
@@ -470,8 +756,9 @@ def _keep_event(event, entities_filter):
         if entity_id is None:
             return False
 
-        # Do not report on new entities
-        if event.data.get("old_state") is None:
+        # Do not report on new entities. Slim events only contain the
+        # old state if there was none.
+        if "old_state" in event.data and event.data["old_state"] is None:
             return False
 
         new_state = event.data.get("new_state")
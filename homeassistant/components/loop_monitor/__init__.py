@@ -0,0 +1,75 @@
+"""Monitor how responsive the event loop is."""
+import voluptuous as vol
+
+from homeassistant.components import websocket_api
+from homeassistant.const import EVENT_HOMEASSISTANT_STOP
+from homeassistant.core import callback
+
+from .monitor import LoopMonitor
+
+DOMAIN = "loop_monitor"
+
+CONF_PROBE_INTERVAL = "probe_interval"
+CONF_SLOW_CALLBACK_DURATION = "slow_callback_duration"
+CONF_WARNING_THRESHOLD = "warning_threshold"
+
+CONFIG_SCHEMA = vol.Schema(
+    {
+        vol.Optional(DOMAIN, default=dict): vol.Schema(
+            {
+                vol.Optional(CONF_PROBE_INTERVAL, default=1): vol.All(
+                    vol.Coerce(float), vol.Range(min=0.01)
+                ),
+                vol.Optional(CONF_SLOW_CALLBACK_DURATION, default=0.1): vol.All(
+                    vol.Coerce(float), vol.Range(min=0)
+                ),
+                vol.Optional(CONF_WARNING_THRESHOLD, default=1): vol.All(
+                    vol.Coerce(float), vol.Range(min=0)
+                ),
+            }
+        )
+    },
+    extra=vol.ALLOW_EXTRA,
+)
+
+
+async def async_setup(hass, config):
+    """Set up the loop monitor."""
+    conf = config[DOMAIN]
+
+    monitor = hass.data[DOMAIN] = LoopMonitor(
+        hass.loop,
+        conf[CONF_PROBE_INTERVAL],
+        conf[CONF_SLOW_CALLBACK_DURATION],
+        conf[CONF_WARNING_THRESHOLD],
+    )
+    monitor.start()
+
+    @callback
+    def async_stop_monitor(event):
+        """Stop the monitor when Home Assistant stops."""
+        monitor.stop()
+
+    hass.bus.async_listen_once(EVENT_HOMEASSISTANT_STOP, async_stop_monitor)
+
+    hass.components.websocket_api.async_register_command(websocket_info)
+    hass.components.system_health.async_register_info(DOMAIN, system_health_info)
+
+    return True
+
+
+@websocket_api.websocket_command({vol.Required("type"): "loop_monitor/info"})
+@callback
+def websocket_info(hass, connection, msg):
+    """Return the lag of the loop and the slowest callbacks."""
+    connection.send_result(msg["id"], hass.data[DOMAIN].as_dict())
+
+
+async def system_health_info(hass):
+    """Get info for the info page."""
+    info = hass.data[DOMAIN].as_dict()
+    info["slow_callbacks"] = ", ".join(
+        f"{slow['callback']} of {slow['integration']} ({slow['max']} ms)"
+        for slow in info["slow_callbacks"]
+    )
+    return info
@@ -0,0 +1,182 @@
+"""Measure how responsive the event loop is."""
+import asyncio
+from collections import deque
+import functools
+import logging
+from time import monotonic
+from typing import Any, Callable, Deque, Dict, List, Optional, Tuple
+
+from homeassistant.loader import integration_from_module
+from homeassistant.util import percentile
+
+_LOGGER = logging.getLogger(__name__)
+
+# Probes kept for the lag statistics, an hour at the default interval
+LAG_SAMPLES = 3600
+# Number of distinct slow callbacks that are kept track of
+MAX_SLOW_CALLBACKS = 500
+# Number of slow callbacks that are reported
+TOP_OFFENDERS = 10
+
+
+class LoopMonitor:
+    """Keep track of the scheduling lag and the slow callbacks of a loop.
+
+    The lag is the time a probe that is scheduled every probe_interval runs
+    late. Callbacks are timed by wrapping Handle._run, which every callback,
+    task step and timer of the loop goes through.
+    """
+
+    def __init__(
+        self,
+        loop: asyncio.AbstractEventLoop,
+        probe_interval: float,
+        slow_callback_duration: float,
+        warning_threshold: float,
+    ) -> None:
+        """Initialize the monitor."""
+        self._loop = loop
+        self._probe_interval = probe_interval
+        self._slow_callback_duration = slow_callback_duration
+        self._warning_threshold = warning_threshold
+        self._lags: Deque[float] = deque(maxlen=LAG_SAMPLES)
+        # (integration, callback) -> [count, total duration, max duration]
+        self._slow_callbacks: Dict[Tuple[str, str], List[Any]] = {}
+        self._probe: Optional[asyncio.TimerHandle] = None
+        self._original_run: Optional[Callable] = None
+        self._wrapped_run: Optional[Callable] = None
+
+    def start(self) -> None:
+        """Start probing the loop and timing its callbacks.
+
+        This method must be run in the event loop.
+        """
+        handle_class = asyncio.events.Handle
+        original_run = handle_class._run  # pylint: disable=protected-access
+        threshold = self._slow_callback_duration
+        record = self._record_slow_callback
+
+        @functools.wraps(original_run)
+        def timed_run(handle: asyncio.Handle) -> None:
+            """Run the callback of the handle and time it."""
+            start = monotonic()
+            original_run(handle)
+            duration = monotonic() - start
+            if duration >= threshold:
+                record(handle, duration)
+
+        self._original_run = original_run
+        self._wrapped_run = timed_run
+        handle_class._run = timed_run  # type: ignore
+        self._schedule_probe()
+
+    def stop(self) -> None:
+        """Stop probing and restore the callbacks of the loop.
+
+        This method must be run in the event loop.
+        """
+        if self._probe is not None:
+            self._probe.cancel()
+            self._probe = None
+
+        handle_class = asyncio.events.Handle
+        # Leave the handles alone if something else wrapped them after us
+        if (
+            self._wrapped_run is not None
+            and handle_class._run  # pylint: disable=protected-access
+            is self._wrapped_run
+        ):
+            handle_class._run = self._original_run  # type: ignore
+        self._original_run = self._wrapped_run = None
+
+    def as_dict(self) -> Dict[str, Any]:
+        """Return the lag percentiles and the slowest callbacks."""
+        lags = sorted(round(lag * 1000, 3) for lag in self._lags)
+        offenders = sorted(
+            self._slow_callbacks.items(), key=lambda item: item[1][1], reverse=True
+        )
+
+        return {
+            "lag_p50": percentile(lags, 0.5),
+            "lag_p95": percentile(lags, 0.95),
+            "lag_p99": percentile(lags, 0.99),
+            "lag_max": percentile(lags, 1),
+            "slow_callbacks": [
+                {
+                    "integration": integration,
+                    "callback": description,
+                    "count": count,
+                    "total": round(total * 1000, 3),
+                    "max": round(maximum * 1000, 3),
+                }
+                for (integration, description), (count, total, maximum) in offenders[
+                    :TOP_OFFENDERS
+                ]
+            ],
+        }
+
+    def _schedule_probe(self) -> None:
+        """Schedule the next probe."""
+        self._probe = self._loop.call_at(
+            self._loop.time() + self._probe_interval, self._run_probe
+        )
+
+    def _run_probe(self) -> None:
+        """Record how late the probe runs."""
+        lag = max(self._loop.time() - self._probe.when(), 0)  # type: ignore
+        self._lags.append(lag)
+
+        if lag >= self._warning_threshold:
+            _LOGGER.warning("The event loop was blocked for %.3f seconds", lag)
+
+        self._schedule_probe()
+
+    def _record_slow_callback(self, handle: asyncio.Handle, duration: float) -> None:
+        """Record a callback that ran for duration seconds."""
+        module, description = describe_callback(
+            handle._callback  # pylint: disable=protected-access
+        )
+        integration = integration_from_module(module)
+        key = (integration, description)
+        stats = self._slow_callbacks.get(key)
+
+        if stats is not None:
+            stats[0] += 1
+            stats[1] += duration
+            stats[2] = max(stats[2], duration)
+        elif len(self._slow_callbacks) < MAX_SLOW_CALLBACKS:
+            self._slow_callbacks[key] = [1, duration, duration]
+
+        if duration >= self._warning_threshold:
+            _LOGGER.warning(
+                "%s of %s blocked the event loop for %.3f seconds",
+                description,
+                integration,
+                duration,
+            )
+
+
+def describe_callback(target: Any) -> Tuple[str, str]:
+    """Return the module and the name of the callback of a handle.
+
+    A task runs as a step of the task, which is attributed to the coroutine
+    that the task wraps.
+    """
+    while isinstance(target, functools.partial):
+        target = target.func
+
+    owner = getattr(target, "__self__", None)
+    if isinstance(owner, asyncio.Future):
+        coro = getattr(owner, "_coro", None)
+        if coro is None:
+            return type(owner).__module__, repr(owner)
+        frame = getattr(coro, "cr_frame", None) or getattr(coro, "gi_frame", None)
+        if frame is not None:
+            module = frame.f_globals.get("__name__", "")
+        else:
+            code = getattr(coro, "cr_code", None) or getattr(coro, "gi_code", None)
+            module = code.co_filename if code is not None else ""
+        return module, getattr(coro, "__qualname__", repr(coro))
+
+    module = getattr(target, "__module__", None) or type(target).__module__
+    return module, getattr(target, "__qualname__", repr(target))
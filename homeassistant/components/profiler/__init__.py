@@ -0,0 +1,223 @@
+"""Profile Home Assistant while it is running."""
+import asyncio
+from collections import Counter
+import cProfile
+import gc
+import logging
+import time
+import tracemalloc
+
+import voluptuous as vol
+
+from homeassistant.core import callback
+from homeassistant.exceptions import HomeAssistantError
+from homeassistant.loader import integration_from_module
+
+_LOGGER = logging.getLogger(__name__)
+
+DOMAIN = "profiler"
+
+SERVICE_START = "start"
+SERVICE_START_MEMORY_TRACE = "start_memory_trace"
+SERVICE_MEMORY_SNAPSHOT = "memory_snapshot"
+SERVICE_STOP_MEMORY_TRACE = "stop_memory_trace"
+SERVICE_LOG_OBJECT_COUNTS = "log_object_counts"
+
+CONF_FRAMES = "frames"
+CONF_LIMIT = "limit"
+CONF_SECONDS = "seconds"
+
+LIMIT_SCHEMA = vol.All(vol.Coerce(int), vol.Range(min=1))
+
+SERVICE_START_SCHEMA = vol.Schema(
+    {
+        vol.Optional(CONF_SECONDS, default=60): vol.All(
+            vol.Coerce(float), vol.Range(min=0)
+        )
+    }
+)
+SERVICE_START_MEMORY_TRACE_SCHEMA = vol.Schema(
+    {vol.Optional(CONF_FRAMES, default=1): LIMIT_SCHEMA}
+)
+SERVICE_LIMIT_SCHEMA = vol.Schema({vol.Optional(CONF_LIMIT, default=25): LIMIT_SCHEMA})
+
+
+async def async_setup(hass, config):
+    """Set up the profiler services."""
+    profile_lock = asyncio.Lock()
+    previous_snapshot = None
+
+    async def async_start_profile(call):
+        """Profile the event loop for a number of seconds."""
+        if profile_lock.locked():
+            raise HomeAssistantError("A profile is already running")
+
+        async with profile_lock:
+            await _async_generate_profile(hass, call.data[CONF_SECONDS])
+
+    async def async_start_memory_trace(call):
+        """Start tracing memory allocations."""
+        if tracemalloc.is_tracing():
+            raise HomeAssistantError("Memory allocations are already traced")
+
+        tracemalloc.start(call.data[CONF_FRAMES])
+
+    async def async_memory_snapshot(call):
+        """Write the largest allocations and how they changed."""
+        nonlocal previous_snapshot
+
+        if not tracemalloc.is_tracing():
+            raise HomeAssistantError("Memory allocations are not traced")
+
+        path = hass.config.path(f"memory.{_timestamp()}.txt")
+        previous_snapshot = await hass.async_add_executor_job(
+            _write_memory_snapshot, path, previous_snapshot, call.data[CONF_LIMIT]
+        )
+        _async_notify(hass, "Memory snapshot", f"Wrote the memory snapshot to {path}")
+
+    async def async_stop_memory_trace(call):
+        """Stop tracing memory allocations."""
+        nonlocal previous_snapshot
+
+        tracemalloc.stop()
+        previous_snapshot = None
+
+    async def async_log_object_counts(call):
+        """Write the number of objects of each type."""
+        path = hass.config.path(f"objects.{_timestamp()}.txt")
+        await hass.async_add_executor_job(
+            _write_object_counts, path, call.data[CONF_LIMIT]
+        )
+        _async_notify(hass, "Object counts", f"Wrote the object counts to {path}")
+
+    hass.services.async_register(
+        DOMAIN, SERVICE_START, async_start_profile, schema=SERVICE_START_SCHEMA
+    )
+    hass.services.async_register(
+        DOMAIN,
+        SERVICE_START_MEMORY_TRACE,
+        async_start_memory_trace,
+        schema=SERVICE_START_MEMORY_TRACE_SCHEMA,
+    )
+    hass.services.async_register(
+        DOMAIN,
+        SERVICE_MEMORY_SNAPSHOT,
+        async_memory_snapshot,
+        schema=SERVICE_LIMIT_SCHEMA,
+    )
+    hass.services.async_register(
+        DOMAIN, SERVICE_STOP_MEMORY_TRACE, async_stop_memory_trace
+    )
+    hass.services.async_register(
+        DOMAIN,
+        SERVICE_LOG_OBJECT_COUNTS,
+        async_log_object_counts,
+        schema=SERVICE_LIMIT_SCHEMA,
+    )
+
+    return True
+
+
+async def _async_generate_profile(hass, seconds):
+    """Profile the event loop and write the profile."""
+    timestamp = _timestamp()
+    cprofile_path = hass.config.path(f"profile.{timestamp}.prof")
+    callgrind_path = hass.config.path(f"callgrind.out.{timestamp}")
+
+    _async_notify(
+        hass,
+        "Profile started",
+        f"Profiling for {seconds} seconds, this notification is updated when "
+        "the profile is written.",
+        notification_id=f"profile_{timestamp}",
+    )
+
+    profiler = cProfile.Profile()
+    profiler.enable()
+    try:
+        await asyncio.sleep(seconds)
+    finally:
+        profiler.disable()
+
+    await hass.async_add_executor_job(
+        _write_profile, profiler, cprofile_path, callgrind_path
+    )
+    _async_notify(
+        hass,
+        "Profile written",
+        f"Wrote the cProfile data to {cprofile_path} and the callgrind data "
+        f"to {callgrind_path}",
+        notification_id=f"profile_{timestamp}",
+    )
+
+
+def _write_profile(profiler, cprofile_path, callgrind_path):
+    """Write the profile in the cProfile and callgrind formats."""
+    from pyprof2calltree import convert
+
+    profiler.create_stats()
+    profiler.dump_stats(cprofile_path)
+    convert(profiler.getstats(), callgrind_path)
+
+
+def _write_memory_snapshot(path, previous_snapshot, limit):
+    """Write the largest allocations and return the snapshot."""
+    snapshot = tracemalloc.take_snapshot().filter_traces(
+        (
+            tracemalloc.Filter(False, tracemalloc.__file__),
+            tracemalloc.Filter(False, "<frozen importlib._bootstrap>"),
+        )
+    )
+
+    lines = ["Largest allocations:"]
+    lines.extend(str(stat) for stat in snapshot.statistics("lineno")[:limit])
+    if previous_snapshot is not None:
+        lines.append("Changes since the previous snapshot:")
+        lines.extend(
+            str(stat)
+            for stat in snapshot.compare_to(previous_snapshot, "lineno")[:limit]
+        )
+
+    _write_lines(path, lines)
+    return snapshot
+
+
+def _write_object_counts(path, limit):
+    """Write the most common types and the objects per integration."""
+    types = Counter(type(obj) for obj in gc.get_objects())
+    integrations = Counter()
+    for obj_type, count in types.items():
+        integrations[integration_from_module(obj_type.__module__)] += count
+
+    lines = ["Objects per integration:"]
+    lines.extend(
+        f"{integration}: {count}"
+        for integration, count in integrations.most_common(limit)
+    )
+    lines.append("Most common types:")
+    lines.extend(
+        f"{obj_type.__module__}.{obj_type.__qualname__}: {count}"
+        for obj_type, count in types.most_common(limit)
+    )
+
+    _write_lines(path, lines)
+
+
+def _write_lines(path, lines):
+    """Write lines to a file."""
+    with open(path, "w") as report:
+        report.write("\n".join(lines) + "\n")
+
+
+def _timestamp():
+    """Return a timestamp for the name of a file."""
+    return int(time.time() * 1000000)
+
+
+@callback
+def _async_notify(hass, title, message, notification_id=None):
+    """Let the user know where the output of a service is written."""
+    _LOGGER.info(message)
+    hass.components.persistent_notification.async_create(
+        message, title=title, notification_id=notification_id
+    )
@@ -1,36 +1,45 @@
 """Support for recording details."""
 import asyncio
-from collections import namedtuple
+from collections import OrderedDict, namedtuple
 import concurrent.futures
-from datetime import datetime, timedelta
+from datetime import date, datetime, timedelta
+import json
 import logging
 import queue
 import threading
 import time
-from typing import Any, Dict, Optional
+from typing import Any, Dict, List, Optional, Tuple
 
+from aiohttp import web
 import voluptuous as vol
 
 from homeassistant.const import (
     ATTR_ENTITY_ID,
+    ATTR_NOW,
     CONF_DOMAINS,
     CONF_ENTITIES,
     CONF_EXCLUDE,
     CONF_INCLUDE,
+    CONTENT_TYPE_JSON,
     EVENT_HOMEASSISTANT_START,
     EVENT_HOMEASSISTANT_STOP,
     EVENT_STATE_CHANGED,
     EVENT_TIME_CHANGED,
     MATCH_ALL,
 )
-from homeassistant.core import CoreState, HomeAssistant, callback
+from homeassistant.components import websocket_api
+from homeassistant.core import CoreState, Event, HomeAssistant, callback
 import homeassistant.helpers.config_validation as cv
 from homeassistant.helpers.entityfilter import generate_filter
+from homeassistant.helpers.json import JSONEncoder
 from homeassistant.helpers.typing import ConfigType
 import homeassistant.util.dt as dt_util
 
-from . import migration, purge
-from .const import DATA_INSTANCE
+from . import migration, partitions, purge
+from .const import CONF_ENTITY_GLOBS, DATA_INSTANCE
+from .metrics import RecorderMetrics
+from .snapshots import SNAPSHOT_INTERVAL, most_recent_state_ids
+from .statistics import StatisticsCompiler
 from .util import session_scope
 
 _LOGGER = logging.getLogger(__name__)
@@ -56,9 +65,19 @@ CONF_DB_URL = "db_url"
 CONF_PURGE_KEEP_DAYS = "purge_keep_days"
 CONF_PURGE_INTERVAL = "purge_interval"
 CONF_EVENT_TYPES = "event_types"
+CONF_COMMIT_INTERVAL = "commit_interval"
+CONF_MAX_BATCH_SIZE = "max_batch_size"
+CONF_SLIM_STATE_EVENTS = "slim_state_events"
+CONF_RETENTION = "retention"
+CONF_QUEUE_HIGH_WATERMARK = "queue_high_watermark"
+CONF_READ_POOL_SIZE = "read_pool_size"
+CONF_PARTITION_BY_DAY = "partition_by_day"
 
 CONNECT_RETRY_WAIT = 3
 
+# Number of recently written attributes to remember the id of
+ATTRIBUTES_CACHE_SIZE = 2048
+
 FILTER_SCHEMA = vol.Schema(
     {
         vol.Optional(CONF_EXCLUDE, default={}): vol.Schema(
@@ -77,17 +96,38 @@ FILTER_SCHEMA = vol.Schema(
     }
 )
 
+KEEP_DAYS_SCHEMA = vol.All(vol.Coerce(int), vol.Range(min=1))
+
+RETENTION_SCHEMA = vol.Schema(
+    {
+        vol.Optional(CONF_DOMAINS, default={}): {cv.string: KEEP_DAYS_SCHEMA},
+        vol.Optional(CONF_ENTITIES, default={}): {cv.entity_id: KEEP_DAYS_SCHEMA},
+        vol.Optional(CONF_ENTITY_GLOBS, default={}): {cv.string: KEEP_DAYS_SCHEMA},
+    }
+)
+
 CONFIG_SCHEMA = vol.Schema(
     {
         vol.Optional(DOMAIN, default=dict): FILTER_SCHEMA.extend(
             {
-                vol.Optional(CONF_PURGE_KEEP_DAYS, default=10): vol.All(
-                    vol.Coerce(int), vol.Range(min=1)
-                ),
+                vol.Optional(CONF_PURGE_KEEP_DAYS, default=10): KEEP_DAYS_SCHEMA,
+                vol.Optional(CONF_RETENTION, default={}): RETENTION_SCHEMA,
                 vol.Optional(CONF_PURGE_INTERVAL, default=1): vol.All(
                     vol.Coerce(int), vol.Range(min=0)
                 ),
                 vol.Optional(CONF_DB_URL): cv.string,
+                vol.Optional(CONF_COMMIT_INTERVAL, default=1): vol.All(
+                    vol.Coerce(int), vol.Range(min=0)
+                ),
+                vol.Optional(CONF_MAX_BATCH_SIZE, default=1000): vol.All(
+                    vol.Coerce(int), vol.Range(min=1)
+                ),
+                vol.Optional(CONF_SLIM_STATE_EVENTS, default=False): cv.boolean,
+                vol.Optional(CONF_QUEUE_HIGH_WATERMARK): cv.positive_int,
+                vol.Optional(CONF_READ_POOL_SIZE, default=5): vol.All(
+                    vol.Coerce(int), vol.Range(min=1)
+                ),
+                vol.Optional(CONF_PARTITION_BY_DAY, default=False): cv.boolean,
             }
         )
     },
@@ -108,7 +148,7 @@ def run_information(hass, point_in_time: Optional[datetime] = None):
     if point_in_time is None or point_in_time > ins.recording_start:
         return ins.run_info
 
-    with session_scope(hass=hass) as session:
+    with session_scope(hass=hass, read_only=True) as session:
         res = (
             session.query(recorder_runs)
             .filter(
@@ -126,7 +166,14 @@ async def async_setup(hass: HomeAssistant, config: ConfigType) -> bool:
     """Set up the recorder."""
     conf = config[DOMAIN]
     keep_days = conf.get(CONF_PURGE_KEEP_DAYS)
+    retention = conf[CONF_RETENTION]
     purge_interval = conf.get(CONF_PURGE_INTERVAL)
+    commit_interval = conf[CONF_COMMIT_INTERVAL]
+    max_batch_size = conf[CONF_MAX_BATCH_SIZE]
+    slim_state_events = conf[CONF_SLIM_STATE_EVENTS]
+    queue_high_watermark = conf.get(CONF_QUEUE_HIGH_WATERMARK)
+    read_pool_size = conf[CONF_READ_POOL_SIZE]
+    partition_by_day = conf[CONF_PARTITION_BY_DAY]
 
     db_url = conf.get(CONF_DB_URL, None)
     if not db_url:
@@ -137,7 +184,14 @@ async def async_setup(hass: HomeAssistant, config: ConfigType) -> bool:
     instance = hass.data[DATA_INSTANCE] = Recorder(
         hass=hass,
         keep_days=keep_days,
+        retention=retention,
         purge_interval=purge_interval,
+        commit_interval=commit_interval,
+        max_batch_size=max_batch_size,
+        slim_state_events=slim_state_events,
+        queue_high_watermark=queue_high_watermark,
+        read_pool_size=read_pool_size,
+        partition_by_day=partition_by_day,
         uri=db_url,
         include=include,
         exclude=exclude,
@@ -153,10 +207,77 @@ async def async_setup(hass: HomeAssistant, config: ConfigType) -> bool:
         DOMAIN, SERVICE_PURGE, async_handle_purge_service, schema=SERVICE_PURGE_SCHEMA
     )
 
+    hass.components.websocket_api.async_register_command(websocket_metrics)
+    hass.components.system_health.async_register_info(DOMAIN, system_health_info)
+
     return await instance.async_db_ready
 
 
+@callback
+def async_add_read_job(hass, target, *args):
+    """Run a job that reads the database in the executor of the recorder."""
+    return hass.loop.run_in_executor(
+        hass.data[DATA_INSTANCE].read_executor, target, *args
+    )
+
+
+async def async_stream_read_response(request, chunks):
+    """Write the JSON chunks of a generator that reads the database.
+
+    The generator is advanced in the executor of the recorder and every
+    chunk is written as soon as it is generated. The generator is closed
+    when the response ends, also when the client goes away halfway.
+    """
+    executor = request.app["hass"].data[DATA_INSTANCE].read_executor
+    response = web.StreamResponse()
+    response.content_type = CONTENT_TYPE_JSON
+    await response.prepare(request)
+
+    job = None
+    try:
+        while True:
+            job = executor.submit(next, chunks, None)
+            chunk = await asyncio.wrap_future(job)
+            if chunk is None:
+                break
+            await response.write(chunk.encode("utf-8"))
+    finally:
+        # Closing the generator has to wait for the job that advances it
+        if job is None:
+            chunks.close()
+        else:
+            job.add_done_callback(lambda job: chunks.close())
+
+    await response.write_eof()
+    return response
+
+
+@websocket_api.websocket_command({vol.Required("type"): "recorder/metrics"})
+@callback
+def websocket_metrics(hass, connection, msg):
+    """Return the metrics of the recorder."""
+    connection.send_result(msg["id"], hass.data[DATA_INSTANCE].async_get_metrics())
+
+
+async def system_health_info(hass):
+    """Get info for the info page."""
+    return hass.data[DATA_INSTANCE].async_get_metrics()
+
+
 PurgeTask = namedtuple("PurgeTask", ["keep_days", "repack"])
+CompactTask = namedtuple("CompactTask", ["start_event_id"])
+# Resolves the future once the events queued before it are committed
+CommitTask = namedtuple("CommitTask", ["future"])
+
+# Queued to commit the events that are waiting for the commit interval
+COMMIT_TASK = object()
+
+
+@callback
+def _set_committed(future):
+    """Mark the events before a commit task as committed."""
+    if not future.done():
+        future.set_result(None)
 
 
 class Recorder(threading.Thread):
@@ -166,7 +287,14 @@ class Recorder(threading.Thread):
         self,
         hass: HomeAssistant,
         keep_days: int,
+        retention: Dict[str, Dict[str, int]],
         purge_interval: int,
+        commit_interval: int,
+        max_batch_size: int,
+        slim_state_events: bool,
+        queue_high_watermark: Optional[int],
+        read_pool_size: int,
+        partition_by_day: bool,
         uri: str,
         include: Dict,
         exclude: Dict,
@@ -176,12 +304,33 @@ class Recorder(threading.Thread):
 
         self.hass = hass
         self.keep_days = keep_days
+        self.retention = retention
         self.purge_interval = purge_interval
+        self.commit_interval = commit_interval
+        self.max_batch_size = max_batch_size
+        self.slim_state_events = slim_state_events
+        self.queue_high_watermark = queue_high_watermark
+        self.read_pool_size = read_pool_size
+        self.read_executor = concurrent.futures.ThreadPoolExecutor(
+            max_workers=read_pool_size, thread_name_prefix="RecorderRead"
+        )
+        self.partition_by_day = partition_by_day
+        # Whether the states and events tables are partitioned by day
+        self.partitioned = False
+        self._partitions_day: Optional[date] = None
+        self.metrics = RecorderMetrics()
+        self._shedding = False
+        # Whether a time_changed event waits in the queue
+        self._time_changed_queued = False
+        # Time the last committed event was fired, the events fired before
+        # it are committed as well
+        self.committed_until: Optional[datetime] = None
         self.queue: Any = queue.Queue()
         self.recording_start = dt_util.utcnow()
         self.db_url = uri
         self.async_db_ready = asyncio.Future()
         self.engine: Any = None
+        self.read_engine: Any = None
         self.run_info: Any = None
 
         self.entity_filter = generate_filter(
@@ -193,6 +342,13 @@ class Recorder(threading.Thread):
         self.exclude_t = exclude.get(CONF_EVENT_TYPES, [])
 
         self.get_session = None
+        self.get_read_session = None
+        self._pending_events: List[Event] = []
+        self._batch_started = 0.0
+        self._attributes_ids: Dict[str, int] = OrderedDict()
+        self._statistics: List[StatisticsCompiler] = []
+        self._pending_statistics: List[Tuple[Any, Dict[str, Any]]] = []
+        self._next_snapshot: Optional[datetime] = None
 
     @callback
     def async_initialize(self):
@@ -208,9 +364,8 @@ class Recorder(threading.Thread):
 
     def run(self):
         """Start processing events to save."""
-        from .models import States, Events
+        from .models import Events, Statistics, StatisticsShortTerm
         from homeassistant.components import persistent_notification
-        from sqlalchemy import exc
 
         tries = 1
         connected = False
@@ -308,19 +463,69 @@ class Recorder(threading.Thread):
 
             self.hass.helpers.event.track_point_in_time(async_purge, run)
 
+        self._statistics = [
+            StatisticsCompiler(StatisticsShortTerm),
+            StatisticsCompiler(Statistics),
+        ]
+
+        self._next_snapshot = dt_util.utcnow() + SNAPSHOT_INTERVAL
+
+        # Strip the states from events stored before slim mode was enabled
+        if self.slim_state_events and not self.run_info.compact_state_events:
+            self.queue.put(CompactTask(0))
+
         while True:
-            event = self.queue.get()
+            if self._pending_events:
+                timeout = self._batch_started + self.commit_interval - time.monotonic()
+                try:
+                    event = self.queue.get(timeout=max(timeout, 0))
+                except queue.Empty:
+                    self._commit_pending_events()
+                    continue
+            else:
+                event = self.queue.get()
 
             if event is None:
+                self._commit_pending_events()
                 self._close_run()
                 self._close_connection()
+                self.read_executor.shutdown(wait=False)
                 self.queue.task_done()
                 return
+            if event is COMMIT_TASK:
+                self._commit_pending_events()
+                self.queue.task_done()
+                continue
+            if isinstance(event, CommitTask):
+                self._commit_pending_events()
+                self.hass.loop.call_soon_threadsafe(_set_committed, event.future)
+                self.queue.task_done()
+                continue
             if isinstance(event, PurgeTask):
-                purge.purge_old_data(self, event.keep_days, event.repack)
+                self._commit_pending_events()
+                if not purge.purge_old_data(self, event.keep_days, event.repack):
+                    # Let the events queued in the meantime be written first
+                    self.queue.put(event)
+                # Purged attributes can no longer be referenced
+                self._attributes_ids.clear()
+                self.queue.task_done()
+                continue
+            if isinstance(event, CompactTask):
+                self._commit_pending_events()
+                next_event_id = migration.compact_state_changed_events(
+                    self, event.start_event_id
+                )
+                if next_event_id is not None:
+                    self.queue.put(CompactTask(next_event_id))
                 self.queue.task_done()
                 continue
             if event.event_type == EVENT_TIME_CHANGED:
+                self._time_changed_queued = False
+                if not self._pending_events:
+                    self.committed_until = event.time_fired
+                self._compile_statistics(event.data[ATTR_NOW])
+                self._snapshot_states(event.data[ATTR_NOW])
+                self._create_partitions(event.data[ATTR_NOW])
                 self.queue.task_done()
                 continue
             if event.event_type in self.exclude_t:
@@ -333,62 +538,292 @@ class Recorder(threading.Thread):
                     self.queue.task_done()
                     continue
 
-            tries = 1
-            updated = False
-            while not updated and tries <= 10:
-                if tries != 1:
-                    time.sleep(CONNECT_RETRY_WAIT)
-                try:
-                    with session_scope(session=self.get_session()) as session:
+            if event.event_type == EVENT_STATE_CHANGED:
+                self._update_statistics(event)
+
+            if not self._pending_events:
+                self._batch_started = time.monotonic()
+            self._pending_events.append(event)
+
+            if (
+                len(self._pending_events) >= self.max_batch_size
+                or time.monotonic() - self._batch_started >= self.commit_interval
+            ):
+                self._commit_pending_events()
+
+            self.queue.task_done()
+
+    def _commit_pending_events(self):
+        """Save the pending events to the database in a single transaction."""
+        if not self._pending_events and not self._pending_statistics:
+            return
+
+        self._commit_events(self._pending_events, self._pending_statistics)
+        if self._pending_events:
+            self.committed_until = self._pending_events[-1].time_fired
+        self._pending_events = []
+        self._pending_statistics = []
+
+    def _commit_events(self, events, statistics):
+        """Save events and statistics rows in a single transaction.
+
+        When the transaction fails for another reason than the connection,
+        both halves of the batch are saved on their own, so only the rows
+        that cannot be saved are lost.
+        """
+        from .models import States, Events
+        from sqlalchemy import exc
+
+        tries = 1
+        while tries <= 10:
+            if tries != 1:
+                time.sleep(CONNECT_RETRY_WAIT)
+            started = time.monotonic()
+            rows = 0
+            try:
+                with session_scope(session=self.get_session()) as session:
+                    for event in events:
                         try:
-                            dbevent = Events.from_event(event)
+                            dbevent = Events.from_event(event, self.slim_state_events)
                             session.add(dbevent)
                             session.flush()
+                            rows += 1
                         except (TypeError, ValueError):
                             _LOGGER.warning("Event is not JSON serializable: %s", event)
+                            continue
 
                         if event.event_type == EVENT_STATE_CHANGED:
                             try:
                                 dbstate = States.from_event(event)
                                 dbstate.event_id = dbevent.event_id
+                                dbstate.attributes_id = self._get_attributes_id(
+                                    session, dbstate.attributes
+                                )
+                                dbstate.attributes = None
                                 session.add(dbstate)
+                                rows += 1
                             except (TypeError, ValueError):
                                 _LOGGER.warning(
                                     "State is not JSON serializable: %s",
                                     event.data.get("new_state"),
                                 )
 
-                    updated = True
+                    for table, row in statistics:
+                        row = dict(row)
+                        try:
+                            shared_attrs = json.dumps(
+                                dict(row.pop("attributes")), cls=JSONEncoder
+                            )
+                        except (TypeError, ValueError):
+                            _LOGGER.warning(
+                                "Attributes are not JSON serializable: %s", row
+                            )
+                            continue
+                        row["attributes_id"] = self._get_attributes_id(
+                            session, shared_attrs
+                        )
+                        session.add(table(**row))
+                        rows += 1
+
+                self.metrics.record_commit(time.monotonic() - started, rows)
+                return
 
-                except exc.OperationalError as err:
-                    _LOGGER.error(
-                        "Error in database connectivity: %s. "
-                        "(retrying in %s seconds)",
-                        err,
-                        CONNECT_RETRY_WAIT,
-                    )
-                    tries += 1
+            except exc.OperationalError as err:
+                _LOGGER.error(
+                    "Error in database connectivity: %s. (retrying in %s seconds)",
+                    err,
+                    CONNECT_RETRY_WAIT,
+                )
+                tries += 1
+                self.metrics.retries += 1
+                # Attributes added in the failed transaction were rolled back
+                self._attributes_ids.clear()
+
+            except exc.SQLAlchemyError:
+                self._attributes_ids.clear()
+                middle = (len(events) + len(statistics)) // 2
+                if not middle:
+                    _LOGGER.exception("Error saving %d events", len(events))
+                    return
+
+                split = max(middle - len(events), 0)
+                self._commit_events(events[:middle], statistics[:split])
+                self._commit_events(events[middle:], statistics[split:])
+                return
 
-                except exc.SQLAlchemyError:
-                    updated = True
-                    _LOGGER.exception("Error saving event: %s", event)
+        _LOGGER.error(
+            "Error in database update. Could not save after %d tries. Giving up", tries
+        )
 
-            if not updated:
-                _LOGGER.error(
-                    "Error in database update. Could not save "
-                    "after %d tries. Giving up",
-                    tries,
+    def _update_statistics(self, event):
+        """Add the new state of a state_changed event to the statistics."""
+        new_state = event.data.get("new_state")
+        now = event.time_fired if new_state is None else new_state.last_updated
+        self._compile_statistics(now)
+        for compiler in self._statistics:
+            compiler.add_state(event.data["entity_id"], new_state, now)
+
+    def _compile_statistics(self, now):
+        """Compile the statistics of the periods that ended before now."""
+        for compiler in self._statistics:
+            for row in compiler.compile(now):
+                self._pending_statistics.append((compiler.table, row))
+
+        if self._pending_statistics:
+            self._commit_pending_events()
+
+    def _snapshot_states(self, now):
+        """Store a checkpoint of the latest states when one is due."""
+        from sqlalchemy import DateTime, exc, literal
+        from .models import States, StateSnapshots
+
+        if self._next_snapshot is None or now < self._next_snapshot:
+            return
+
+        self._next_snapshot = now + SNAPSHOT_INTERVAL
+        self._commit_pending_events()
+
+        try:
+            with session_scope(session=self.get_session()) as session:
+                state_ids = most_recent_state_ids(session, self.run_info.start, now)
+                latest_states = session.query(
+                    States.entity_id,
+                    States.state_id,
+                    literal(now, type_=DateTime(timezone=True)),
+                ).join(state_ids, States.state_id == state_ids.c.max_state_id)
+                session.execute(
+                    StateSnapshots.__table__.insert().from_select(
+                        ["entity_id", "state_id", "created"], latest_states
+                    )
                 )
+        except exc.SQLAlchemyError as err:
+            _LOGGER.warning("Error storing the state snapshot: %s", err)
 
-            self.queue.task_done()
+    def _create_partitions(self, now):
+        """Create the partitions of the coming days once a day."""
+        from sqlalchemy import exc
+
+        today = dt_util.as_utc(now).date()
+        if not self.partitioned or today == self._partitions_day:
+            return
+
+        try:
+            with session_scope(session=self.get_session()) as session:
+                partitions.create_partitions(session, today)
+            self._partitions_day = today
+        except exc.SQLAlchemyError as err:
+            _LOGGER.warning("Error creating the partitions of the tables: %s", err)
+
+    def _get_attributes_id(self, session, shared_attrs):
+        """Return the id of the stored attributes, storing them if needed."""
+        from .models import StateAttributes
+
+        attributes_id = self._attributes_ids.get(shared_attrs)
+        if attributes_id is not None:
+            self._attributes_ids.move_to_end(shared_attrs)
+            return attributes_id
+
+        attributes_hash = StateAttributes.hash_shared_attrs(shared_attrs)
+        stored = (
+            session.query(StateAttributes.attributes_id)
+            .filter(StateAttributes.hash == attributes_hash)
+            .filter(StateAttributes.shared_attrs == shared_attrs)
+            .first()
+        )
+        if stored is not None:
+            attributes_id = stored.attributes_id
+        else:
+            dbattributes = StateAttributes(
+                hash=attributes_hash, shared_attrs=shared_attrs
+            )
+            session.add(dbattributes)
+            session.flush()
+            attributes_id = dbattributes.attributes_id
+
+        self._attributes_ids[shared_attrs] = attributes_id
+        if len(self._attributes_ids) > ATTRIBUTES_CACHE_SIZE:
+            self._attributes_ids.popitem(last=False)
+        return attributes_id
 
     @callback
     def event_listener(self, event):
-        """Listen for new events and put them in the process queue."""
+        """Listen for new events and put them in the process queue.
+
+        Above the high watermark a time_changed event is dropped while
+        another one waits in the queue, above twice the high watermark all
+        other events are dropped. The statistics, checkpoints and partitions
+        are kept up to date by the time_changed events that are let through.
+        """
+        depth = self.queue.qsize()
+        if depth > self.metrics.peak_queue_depth:
+            self.metrics.peak_queue_depth = depth
+
+        watermark = self.queue_high_watermark
+        if watermark is not None and depth >= watermark:
+            if event.event_type == EVENT_TIME_CHANGED:
+                if self._time_changed_queued:
+                    self.metrics.dropped_events += 1
+                    return
+            elif depth >= 2 * watermark:
+                if not self._shedding:
+                    self._shedding = True
+                    _LOGGER.warning(
+                        "The recorder queue holds %d events, dropping events "
+                        "until it is below %d",
+                        depth,
+                        watermark,
+                    )
+                self.metrics.dropped_events += 1
+                return
+        elif self._shedding:
+            self._shedding = False
+            _LOGGER.warning(
+                "The recorder queue is below %d, recording again", watermark
+            )
+
+        if event.event_type == EVENT_TIME_CHANGED:
+            self._time_changed_queued = True
         self.queue.put(event)
 
+    @callback
+    def async_get_metrics(self):
+        """Return how well the recorder keeps up with the events."""
+        with self.queue.mutex:
+            depth = len(self.queue.queue)
+            oldest = next(
+                (item for item in self.queue.queue if isinstance(item, Event)), None
+            )
+
+        # Events waiting for the commit interval are older
+        pending = self._pending_events
+        if pending:
+            oldest = pending[0]
+
+        age = 0.0
+        if oldest is not None:
+            age = (dt_util.utcnow() - oldest.time_fired).total_seconds()
+
+        metrics = self.metrics.as_dict(depth, age)
+        metrics["pending_commit"] = len(pending)
+        return metrics
+
+    async def async_wait_committed(self, timeout):
+        """Wait until the events queued so far are committed.
+
+        Returns False if they are not committed within timeout seconds.
+        """
+        future = self.hass.loop.create_future()
+        self.queue.put(CommitTask(future))
+        try:
+            await asyncio.wait_for(future, timeout)
+        except asyncio.TimeoutError:
+            return False
+        return True
+
     def block_till_done(self):
-        """Block till all events processed."""
+        """Block till all events processed and committed."""
+        if self.is_alive():
+            self.queue.put(COMMIT_TASK)
         self.queue.join()
 
     def _setup_connection(self):
@@ -415,7 +850,8 @@ class Recorder(threading.Thread):
                 cursor.close()
                 dbapi_connection.isolation_level = old_isolation
 
-        if self.db_url == "sqlite://" or ":memory:" in self.db_url:
+        in_memory = self.db_url == "sqlite://" or ":memory:" in self.db_url
+        if in_memory:
             from sqlalchemy.pool import StaticPool
 
             kwargs["connect_args"] = {"check_same_thread": False}
@@ -425,17 +861,62 @@ class Recorder(threading.Thread):
             kwargs["echo"] = False
 
         if self.engine is not None:
-            self.engine.dispose()
+            self._close_connection()
 
         self.engine = create_engine(self.db_url, **kwargs)
+        if self.partition_by_day:
+            self.partitioned = partitions.setup_schema(self.engine)
         models.Base.metadata.create_all(self.engine)
         self.get_session = scoped_session(sessionmaker(bind=self.engine))
+        self._partitions_day = None
+        self._create_partitions(dt_util.utcnow())
+
+        if in_memory:
+            # A second engine would connect to a second, empty, database
+            self.read_engine = self.engine
+        else:
+            self.read_engine = self._create_read_engine()
+        self.get_read_session = scoped_session(sessionmaker(bind=self.read_engine))
+
+    def _create_read_engine(self):
+        """Create the engine history and logbook read the database with."""
+        from sqlalchemy import create_engine, event
+        from sqlalchemy.pool import QueuePool
+        from sqlite3 import Connection
+
+        kwargs = {}
+        if self.db_url.startswith("sqlite"):
+            # The connections are shared by the threads of the read executor
+            kwargs["connect_args"] = {"check_same_thread": False}
+
+        engine = create_engine(
+            self.db_url,
+            echo=False,
+            poolclass=QueuePool,
+            pool_size=self.read_pool_size,
+            **kwargs,
+        )
+
+        # pylint: disable=unused-variable
+        @event.listens_for(engine, "connect")
+        def set_sqlite_query_only(dbapi_connection, connection_record):
+            """Make sure sqlite's read connections never write."""
+            if isinstance(dbapi_connection, Connection):
+                cursor = dbapi_connection.cursor()
+                cursor.execute("PRAGMA query_only=ON")
+                cursor.close()
+
+        return engine
 
     def _close_connection(self):
         """Close the connection."""
+        if self.read_engine is not self.engine:
+            self.read_engine.dispose()
         self.engine.dispose()
         self.engine = None
         self.get_session = None
+        self.read_engine = None
+        self.get_read_session = None
 
     def _setup_run(self):
         """Log the start of the current run."""
@@ -450,8 +931,14 @@ class Recorder(threading.Thread):
                 )
                 session.add(run)
 
+            previous_run = (
+                session.query(RecorderRuns).order_by(RecorderRuns.run_id.desc()).first()
+            )
             self.run_info = RecorderRuns(
-                start=self.recording_start, created=dt_util.utcnow()
+                start=self.recording_start,
+                created=dt_util.utcnow(),
+                compact_state_events=self.slim_state_events
+                and (previous_run is None or bool(previous_run.compact_state_events)),
             )
             session.add(self.run_info)
             session.flush()
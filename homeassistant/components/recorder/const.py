@@ -1,3 +1,8 @@
 """Recorder constants."""
 
 DATA_INSTANCE = "recorder_instance"
+
+CONF_ENTITY_GLOBS = "entity_globs"
+
+# Fired after every batch of a purge
+EVENT_RECORDER_PURGE_PROGRESS = "recorder_purge_progress"
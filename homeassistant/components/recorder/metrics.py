@@ -0,0 +1,52 @@
+"""Metrics of the recorder."""
+from collections import deque
+import time
+from typing import Any, Deque, Dict, Tuple
+
+from homeassistant.util import percentile
+
+# Number of recent commits the latency percentiles are based on
+LATENCY_SAMPLES = 100
+# Seconds of commits the rows per second are based on
+ROWS_WINDOW = 60
+
+
+class RecorderMetrics:
+    """Keep track of how the recorder keeps up with the events.
+
+    Updated by the recorder thread and read from the event loop.
+    """
+
+    def __init__(self) -> None:
+        """Initialize the metrics."""
+        self.retries = 0
+        self.dropped_events = 0
+        self.peak_queue_depth = 0
+        self._latencies: Deque[float] = deque(maxlen=LATENCY_SAMPLES)
+        self._commits: Deque[Tuple[float, int]] = deque()
+
+    def record_commit(self, duration: float, rows: int) -> None:
+        """Record a commit of rows that took duration seconds."""
+        now = time.monotonic()
+        self._latencies.append(duration)
+        self._commits.append((now, rows))
+        while self._commits[0][0] < now - ROWS_WINDOW:
+            self._commits.popleft()
+
+    def as_dict(self, queue_depth: int, oldest_event_age: float) -> Dict[str, Any]:
+        """Return the metrics."""
+        latencies = sorted(round(latency * 1000, 3) for latency in self._latencies)
+        since = time.monotonic() - ROWS_WINDOW
+        rows = sum(rows for written, rows in list(self._commits) if written >= since)
+
+        return {
+            "queue_depth": queue_depth,
+            "peak_queue_depth": max(self.peak_queue_depth, queue_depth),
+            "oldest_event_age": round(oldest_event_age, 3),
+            "commit_latency_p50": percentile(latencies, 0.5),
+            "commit_latency_p95": percentile(latencies, 0.95),
+            "commit_latency_p99": percentile(latencies, 0.99),
+            "rows_per_second": round(rows / ROWS_WINDOW, 3),
+            "retries": self.retries,
+            "dropped_events": self.dropped_events,
+        }
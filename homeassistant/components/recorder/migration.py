@@ -1,11 +1,15 @@
 """Schema migration helpers."""
+import json
 import logging
 import os
 
+from homeassistant.const import EVENT_STATE_CHANGED
+
 from .util import session_scope
 
 _LOGGER = logging.getLogger(__name__)
 PROGRESS_FILE = ".migration_progress"
+COMPACT_BATCH_SIZE = 1000
 
 
 def migrate_schema(instance):
@@ -54,6 +58,54 @@ def migrate_schema(instance):
             os.remove(instance.hass.config.path(PROGRESS_FILE))
 
 
+def compact_state_changed_events(
+    instance, start_event_id=0, batch_size=COMPACT_BATCH_SIZE
+):
+    """Strip the states from a batch of stored state_changed events.
+
+    Only events with an event_id higher than start_event_id are compacted.
+    Returns the event_id to continue from or None if all events are compact.
+    Once all events are compact, the current run is marked so later runs
+    do not look for events to compact again.
+    """
+    from .models import Events, RecorderRuns, slim_state_changed_data
+    from sqlalchemy.exc import SQLAlchemyError
+
+    try:
+        with session_scope(session=instance.get_session()) as session:
+            events = (
+                session.query(Events)
+                .filter(Events.event_type == EVENT_STATE_CHANGED)
+                .filter(Events.event_id > start_event_id)
+                .filter(Events.event_data.like('%"new_state":%'))
+                .order_by(Events.event_id)
+                .limit(batch_size)
+                .all()
+            )
+
+            for event in events:
+                try:
+                    data = json.loads(event.event_data)
+                except ValueError:
+                    continue
+                event.event_data = json.dumps(slim_state_changed_data(data))
+
+            _LOGGER.debug("Compacted %s state_changed events", len(events))
+
+            if len(events) < batch_size:
+                session.query(RecorderRuns).filter_by(
+                    run_id=instance.run_info.run_id
+                ).update({"compact_state_events": True})
+                instance.run_info.compact_state_events = True
+                return None
+
+            return events[-1].event_id
+
+    except SQLAlchemyError as err:
+        _LOGGER.warning("Error compacting state_changed events: %s.", err)
+        return None
+
+
 def _create_index(engine, table_name, index_name):
     """Create an index for the specified table.
 
@@ -256,6 +308,12 @@ def _apply_update(engine, new_version, old_version):
     elif new_version == 7:
         _create_index(engine, "states", "ix_states_entity_id")
     elif new_version == 8:
+        # The state_attributes table itself is created by create_all
+        _add_columns(engine, "states", ["attributes_id INTEGER"])
+        _create_index(engine, "states", "ix_states_attributes_id")
+    elif new_version == 9:
+        _add_columns(engine, "recorder_runs", ["compact_state_events BOOLEAN"])
+    elif new_version == 10:
         # Pending migration, want to group a few.
         pass
         # _add_columns(engine, "events", [
@@ -1,22 +1,30 @@
 """Models for SQLAlchemy."""
 import json
-from datetime import datetime
+from datetime import datetime, timedelta
 import logging
+from types import MappingProxyType
+import zlib
 
 from sqlalchemy import (
+    BigInteger,
     Boolean,
     Column,
     DateTime,
+    Float,
     ForeignKey,
     Index,
     Integer,
     String,
     Text,
     distinct,
+    func,
+    select,
 )
-from sqlalchemy.ext.declarative import declarative_base
+from sqlalchemy.ext.declarative import declarative_base, declared_attr
+from sqlalchemy.orm import relationship
 
 import homeassistant.util.dt as dt_util
+from homeassistant.const import EVENT_STATE_CHANGED
 from homeassistant.core import Context, Event, EventOrigin, State, split_entity_id
 from homeassistant.helpers.json import JSONEncoder
 
@@ -24,7 +32,10 @@ from homeassistant.helpers.json import JSONEncoder
 # pylint: disable=invalid-name
 Base = declarative_base()
 
-SCHEMA_VERSION = 7
+SCHEMA_VERSION = 9
+
+# Number of distinct attributes and contexts decode_states shares at most
+DECODE_CACHE_SIZE = 1000
 
 _LOGGER = logging.getLogger(__name__)
 
@@ -44,11 +55,19 @@ class Events(Base):  # type: ignore
     # context_parent_id = Column(String(36), index=True)
 
     @staticmethod
-    def from_event(event):
-        """Create an event database object from a native event."""
+    def from_event(event, slim=False):
+        """Create an event database object from a native event.
+
+        With slim set, state_changed events do not store the states, as they
+        are already stored in the states table.
+        """
+        data = event.data
+        if slim and event.event_type == EVENT_STATE_CHANGED:
+            data = slim_state_changed_data(data)
+
         return Events(
             event_type=event.event_type,
-            event_data=json.dumps(event.data, cls=JSONEncoder),
+            event_data=json.dumps(data, cls=JSONEncoder),
             origin=str(event.origin),
             time_fired=event.time_fired,
             context_id=event.context.id,
@@ -56,13 +75,24 @@ class Events(Base):  # type: ignore
             # context_parent_id=event.context.parent_id,
         )
 
-    def to_native(self):
-        """Convert to a natve HA Event."""
+    def to_native(self, state=None, old_state=None):
+        """Convert to a natve HA Event.
+
+        Pass the matching States row as state and the previous States row of
+        the entity as old_state to restore the states of a slim
+        state_changed event. Without them the states are left out.
+        """
         context = Context(id=self.context_id, user_id=self.context_user_id)
         try:
+            data = json.loads(self.event_data)
+            if self.event_type == EVENT_STATE_CHANGED:
+                if state is not None and "new_state" not in data:
+                    data["new_state"] = _state_dict(state)
+                if old_state is not None and "old_state" not in data:
+                    data["old_state"] = _state_dict(old_state)
             return Event(
                 self.event_type,
-                json.loads(self.event_data),
+                data,
                 EventOrigin(self.origin),
                 _process_timestamp(self.time_fired),
                 context=context,
@@ -73,6 +103,40 @@ class Events(Base):  # type: ignore
             return None
 
 
+def _state_dict(state):
+    """Return a States row as the dict of a state_changed event."""
+    # An empty state means the state got deleted
+    if not state.state:
+        return None
+    return state.to_native().as_dict()
+
+
+def slim_state_changed_data(data):
+    """Return the data of a state_changed event without the states.
+
+    The old state is only kept when there was none, so new entities can
+    still be told apart.
+    """
+    slim = {"entity_id": data["entity_id"]}
+    if data.get("old_state") is None:
+        slim["old_state"] = None
+    return slim
+
+
+class StateAttributes(Base):  # type: ignore
+    """Attributes shared by the states that have the same attributes."""
+
+    __tablename__ = "state_attributes"
+    attributes_id = Column(Integer, primary_key=True)
+    hash = Column(BigInteger, index=True)
+    shared_attrs = Column(Text)
+
+    @staticmethod
+    def hash_shared_attrs(shared_attrs):
+        """Return the hash of the JSON encoded attributes."""
+        return zlib.crc32(shared_attrs.encode("utf-8"))
+
+
 class States(Base):  # type: ignore
     """State change history."""
 
@@ -83,6 +147,9 @@ class States(Base):  # type: ignore
     state = Column(String(255))
     attributes = Column(Text)
     event_id = Column(Integer, ForeignKey("events.event_id"), index=True)
+    attributes_id = Column(
+        Integer, ForeignKey("state_attributes.attributes_id"), index=True
+    )
     last_changed = Column(DateTime(timezone=True), default=datetime.utcnow)
     last_updated = Column(DateTime(timezone=True), default=datetime.utcnow, index=True)
     created = Column(DateTime(timezone=True), default=datetime.utcnow)
@@ -96,6 +163,10 @@ class States(Base):  # type: ignore
         Index("ix_states_entity_id_last_updated", "entity_id", "last_updated"),
     )
 
+    # States written since schema version 8 keep their attributes in the
+    # state_attributes table, which is joined in whenever states are queried.
+    state_attributes = relationship(StateAttributes, lazy="joined")
+
     @staticmethod
     def from_event(event):
         """Create object from a state_changed event."""
@@ -128,11 +199,15 @@ class States(Base):  # type: ignore
     def to_native(self):
         """Convert to an HA state object."""
         context = Context(id=self.context_id, user_id=self.context_user_id)
+        if self.state_attributes is not None:
+            attributes = self.state_attributes.shared_attrs
+        else:
+            attributes = self.attributes
         try:
             return State(
                 self.entity_id,
                 self.state,
-                json.loads(self.attributes),
+                json.loads(attributes),
                 _process_timestamp(self.last_changed),
                 _process_timestamp(self.last_updated),
                 context=context,
@@ -146,6 +221,140 @@ class States(Base):  # type: ignore
             return None
 
 
+# The columns of the states table decode_states decodes states from
+STATE_COLUMNS = (
+    States.entity_id,
+    States.state,
+    func.coalesce(
+        select([StateAttributes.shared_attrs])
+        .where(StateAttributes.attributes_id == States.attributes_id)
+        .as_scalar(),
+        States.attributes,
+    ).label("attributes"),
+    States.last_changed,
+    States.last_updated,
+    States.context_id,
+    States.context_user_id,
+)
+
+
+def decode_states(rows):
+    """Yield the native states of rows of STATE_COLUMNS.
+
+    The rows were written by the recorder, so the entity ids and states are
+    not validated again like States.to_native does. States with the same
+    attributes or context share the decoded objects.
+    """
+    attributes_cache = {}
+    contexts = {}
+
+    for row in rows:
+        entity_id, state, shared_attrs, last_changed, last_updated = row[:5]
+
+        attributes = attributes_cache.get(shared_attrs)
+        if attributes is None:
+            try:
+                attributes = MappingProxyType(json.loads(shared_attrs))
+            except ValueError:
+                # When json.loads fails
+                _LOGGER.exception("Error converting row to state: %s", row)
+                continue
+            if len(attributes_cache) == DECODE_CACHE_SIZE:
+                attributes_cache.clear()
+            attributes_cache[shared_attrs] = attributes
+
+        context_key = row[5:]
+        context = contexts.get(context_key)
+        if context is None:
+            context = Context(id=context_key[0], user_id=context_key[1])
+            if len(contexts) == DECODE_CACHE_SIZE:
+                contexts.clear()
+            contexts[context_key] = context
+
+        native = State.__new__(State)
+        native.entity_id = entity_id
+        native.state = state
+        native.attributes = attributes
+        native.last_updated = _process_timestamp_fast(last_updated)
+        if last_changed == last_updated:
+            native.last_changed = native.last_updated
+        else:
+            native.last_changed = _process_timestamp_fast(last_changed)
+        native.context = context
+        yield native
+
+
+class StatisticsBase:
+    """Aggregate of a numeric entity over a fixed period."""
+
+    # The length of the periods of the table
+    period = timedelta()
+
+    id = Column(Integer, primary_key=True)
+    domain = Column(String(64))
+    entity_id = Column(String(255))
+    start = Column(DateTime(timezone=True))
+    mean = Column(Float)
+    min = Column(Float)
+    max = Column(Float)
+    last = Column(Float)
+    created = Column(DateTime(timezone=True), default=datetime.utcnow)
+
+    @declared_attr
+    def attributes_id(cls):  # pylint: disable=no-self-argument
+        """Attributes of the entity at the end of the period."""
+        return Column(Integer, ForeignKey("state_attributes.attributes_id"))
+
+    @declared_attr
+    def state_attributes(cls):  # pylint: disable=no-self-argument
+        """Attributes of the entity at the end of the period."""
+        return relationship(StateAttributes, lazy="joined")
+
+    @declared_attr
+    def __table_args__(cls):  # pylint: disable=no-self-argument
+        """Index used for fetching the statistics of a period."""
+        return (Index(f"ix_{cls.__tablename__}_entity_id_start", "entity_id", "start"),)
+
+    def to_native(self):
+        """Convert to an HA state object with the mean as state."""
+        try:
+            return State(
+                self.entity_id,
+                str(round(self.mean, 3)),
+                json.loads(self.state_attributes.shared_attrs),
+                _process_timestamp(self.start),
+                _process_timestamp(self.start),
+            )
+        except ValueError:
+            # When json.loads fails
+            _LOGGER.exception("Error converting row to state: %s", self)
+            return None
+
+
+class StatisticsShortTerm(Base, StatisticsBase):  # type: ignore
+    """Five minute statistics of numeric entities."""
+
+    __tablename__ = "statistics_short_term"
+    period = timedelta(minutes=5)
+
+
+class Statistics(Base, StatisticsBase):  # type: ignore
+    """Hourly statistics of numeric entities."""
+
+    __tablename__ = "statistics"
+    period = timedelta(hours=1)
+
+
+class StateSnapshots(Base):  # type: ignore
+    """The latest state of every entity at a checkpoint of a recorder run."""
+
+    __tablename__ = "state_snapshots"
+    snapshot_id = Column(Integer, primary_key=True)
+    created = Column(DateTime(timezone=True), index=True)
+    entity_id = Column(String(255))
+    state_id = Column(Integer, ForeignKey("states.state_id"), index=True)
+
+
 class RecorderRuns(Base):  # type: ignore
     """Representation of recorder run."""
 
@@ -155,6 +364,8 @@ class RecorderRuns(Base):  # type: ignore
     end = Column(DateTime(timezone=True))
     closed_incorrect = Column(Boolean, default=False)
     created = Column(DateTime(timezone=True), default=datetime.utcnow)
+    # Whether all state_changed events stored up to this run are slim
+    compact_state_events = Column(Boolean, default=False)
 
     __table_args__ = (Index("ix_recorder_runs_start_end", "start", "end"),)
 
@@ -203,3 +414,16 @@ def _process_timestamp(ts):
         return dt_util.UTC.localize(ts)
 
     return dt_util.as_utc(ts)
+
+
+def _process_timestamp_fast(ts):
+    """Process a timestamp of the database into a UTC datetime object.
+
+    The naive timestamps of SQLite are UTC, so the time zone is only set.
+    """
+    if ts is None:
+        return None
+    if ts.tzinfo is None:
+        return ts.replace(tzinfo=dt_util.UTC)
+
+    return dt_util.as_utc(ts)
@@ -0,0 +1,200 @@
+"""Partitioning of the states and events tables by day."""
+from datetime import date, datetime, timedelta
+import logging
+import re
+from typing import Any, List, Optional, Set, Tuple
+
+import homeassistant.util.dt as dt_util
+
+_LOGGER = logging.getLogger(__name__)
+
+# The partitioned tables and the column they are partitioned by
+PARTITION_COLUMNS = {"events": "time_fired", "states": "last_updated"}
+# Days after today that partitions are created for in advance
+PARTITION_DAYS_AHEAD = 2
+# PostgreSQL version with primary keys and indexes on partitioned tables
+MIN_POSTGRESQL_VERSION = (11,)
+
+PARTITION_NAME = re.compile(r"^(?P<table>[a-z_]+)_p(?P<day>\d{8})$")
+
+
+def setup_schema(engine: Any) -> bool:
+    """Create the schema with the tables partitioned by day if possible.
+
+    Returns whether the states and events tables are partitioned. Only new
+    PostgreSQL databases are created partitioned, the tables of an existing
+    database are kept as they are.
+    """
+    version = None
+    if engine.dialect.name == "postgresql":
+        with engine.connect() as connection:
+            version = connection.dialect.server_version_info
+
+    if version is None or version < MIN_POSTGRESQL_VERSION:
+        _LOGGER.warning(
+            "Partitioning by day requires PostgreSQL 11 or later, "
+            "the tables are not partitioned"
+        )
+        return False
+
+    if _is_partitioned(engine, "events"):
+        return True
+
+    if engine.dialect.has_table(engine, "events"):
+        _LOGGER.warning(
+            "Partitioning by day only applies to new databases, "
+            "the tables of the existing database are not partitioned"
+        )
+        return False
+
+    partitioned_metadata().create_all(engine)
+    return True
+
+
+def partitioned_metadata() -> Any:
+    """Return the schema with the states and events tables partitioned by day.
+
+    The partition column is part of the primary key of a partitioned table.
+    As no other column can be a key on its own, nothing can refer to the
+    rows of a partitioned table and those foreign keys are left out.
+    """
+    from sqlalchemy import Column, ForeignKey, Index, MetaData, Table
+    from .models import Base
+
+    metadata = MetaData()
+
+    for table in Base.metadata.sorted_tables:
+        partition_column = PARTITION_COLUMNS.get(table.name)
+        columns = [
+            Column(
+                column.name,
+                column.type,
+                *(
+                    ForeignKey(foreign_key.target_fullname)
+                    for foreign_key in column.foreign_keys
+                    if foreign_key.column.table.name not in PARTITION_COLUMNS
+                ),
+                primary_key=column.primary_key or column.name == partition_column,
+                autoincrement=column.primary_key,
+            )
+            for column in table.columns
+        ]
+        indexes = [
+            Index(index.name, *(column.name for column in index.columns))
+            for index in table.indexes
+        ]
+        kwargs = {}
+        if partition_column is not None:
+            kwargs["postgresql_partition_by"] = f"RANGE ({partition_column})"
+
+        Table(table.name, metadata, *columns, *indexes, **kwargs)
+
+    return metadata
+
+
+def create_partitions(session: Any, today: date) -> None:
+    """Create the partitions of today and the days ahead, if they do not exist.
+
+    Rows outside of the partitions, like those with a clock that is far off,
+    end up in the default partition.
+    """
+    from sqlalchemy import text
+
+    for table in PARTITION_COLUMNS:
+        session.execute(
+            text(
+                f"CREATE TABLE IF NOT EXISTS {table}_default "
+                f"PARTITION OF {table} DEFAULT"
+            )
+        )
+        for days in range(PARTITION_DAYS_AHEAD + 1):
+            session.execute(
+                text(create_partition_statement(table, today + timedelta(days)))
+            )
+
+
+def drop_partitions(session: Any, purge_before: datetime) -> Tuple[List[str], Set[int]]:
+    """Drop the partitions that only hold rows from before purge_before.
+
+    The checkpoints referring to the dropped states are deleted with them.
+    Returns the names of the dropped partitions and the attributes ids the
+    dropped states referred to.
+    """
+    from sqlalchemy import text
+
+    dropped = []
+    attributes_ids: Set[int] = set()
+
+    for table in PARTITION_COLUMNS:
+        for (name,) in session.execute(
+            text(
+                "SELECT child.relname FROM pg_inherits "
+                "JOIN pg_class parent ON pg_inherits.inhparent = parent.oid "
+                "JOIN pg_class child ON pg_inherits.inhrelid = child.oid "
+                "WHERE parent.relname = :table"
+            ),
+            {"table": table},
+        ).fetchall():
+            day = partition_day(name)
+            if day is None or _day_start(day + timedelta(days=1)) > purge_before:
+                continue
+
+            if table == "states":
+                attributes_ids.update(
+                    attributes_id
+                    for (attributes_id,) in session.execute(
+                        text(
+                            f"SELECT DISTINCT attributes_id FROM {name} "
+                            "WHERE attributes_id IS NOT NULL"
+                        )
+                    )
+                )
+                session.execute(
+                    text(
+                        "DELETE FROM state_snapshots WHERE state_id IN "
+                        f"(SELECT state_id FROM {name})"
+                    )
+                )
+            session.execute(text(f"DROP TABLE {name}"))
+            dropped.append(name)
+
+    return dropped, attributes_ids
+
+
+def create_partition_statement(table: str, day: date) -> str:
+    """Return the statement creating the partition of a table for a day."""
+    return (
+        f"CREATE TABLE IF NOT EXISTS {table}_p{day:%Y%m%d} PARTITION OF {table} "
+        f"FOR VALUES FROM ('{_day_start(day).isoformat()}') "
+        f"TO ('{_day_start(day + timedelta(days=1)).isoformat()}')"
+    )
+
+
+def partition_day(name: str) -> Optional[date]:
+    """Return the day of a partition, None if it is not the partition of a day."""
+    match = PARTITION_NAME.match(name)
+    if match is None or match.group("table") not in PARTITION_COLUMNS:
+        return None
+    return datetime.strptime(match.group("day"), "%Y%m%d").date()
+
+
+def _day_start(day: date) -> datetime:
+    """Return the start of a day in UTC."""
+    return datetime(day.year, day.month, day.day, tzinfo=dt_util.UTC)
+
+
+def _is_partitioned(engine: Any, table: str) -> bool:
+    """Return whether a table is partitioned."""
+    from sqlalchemy import text
+
+    return (
+        engine.execute(
+            text(
+                "SELECT 1 FROM pg_partitioned_table "
+                "JOIN pg_class ON pg_partitioned_table.partrelid = pg_class.oid "
+                "WHERE pg_class.relname = :table"
+            ),
+            table=table,
+        ).first()
+        is not None
+    )
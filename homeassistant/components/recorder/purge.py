@@ -1,42 +1,249 @@
 """Purge old data helper."""
+from collections import defaultdict
 from datetime import timedelta
 import logging
 
+from homeassistant.const import CONF_DOMAINS, CONF_ENTITIES, EVENT_STATE_CHANGED
 import homeassistant.util.dt as dt_util
 
+from . import partitions
+from .const import CONF_ENTITY_GLOBS, EVENT_RECORDER_PURGE_PROGRESS
 from .util import session_scope
 
 _LOGGER = logging.getLogger(__name__)
 
+# Rows deleted per table and batch, below the SQLite bound parameter limit
+PURGE_BATCH_SIZE = 990
 
-def purge_old_data(instance, purge_days, repack):
-    """Purge events and states older than purge_days ago."""
-    from .models import States, Events
+
+def purge_old_data(instance, purge_days, repack, batch_size=PURGE_BATCH_SIZE):
+    """Purge a batch of events and states older than purge_days ago.
+
+    States of entities with a retention policy are kept for the days of
+    their policy instead. Short term statistics are purged with the events,
+    long term statistics are kept. Returns True when all old data is purged,
+    False when there is more to purge. Repacking happens only after the last
+    batch.
+    """
+    from .models import (
+        Events,
+        StateAttributes,
+        States,
+        StateSnapshots,
+        Statistics,
+        StatisticsShortTerm,
+    )
+    from sqlalchemy import exists
     from sqlalchemy.exc import SQLAlchemyError
 
-    purge_before = dt_util.utcnow() - timedelta(days=purge_days)
+    now = dt_util.utcnow()
+    purge_before = now - timedelta(days=purge_days)
     _LOGGER.debug("Purging events before %s", purge_before)
 
+    policies = _retention_policies(instance.retention, purge_before, now)
+    more_states = False
+    event_ids = []
+    statistics = []
+    # Attributes that may no longer be referred to once the batch is deleted
+    attributes_ids = set()
+    deleted_states = deleted_events = deleted_attributes = 0
+
     try:
         with session_scope(session=instance.get_session()) as session:
-            deleted_rows = (
-                session.query(States)
-                .filter((States.last_updated < purge_before))
-                .delete(synchronize_session=False)
-            )
-            _LOGGER.debug("Deleted %s states", deleted_rows)
+            # Checkpoints before the default retention are not worth keeping
+            session.query(StateSnapshots).filter(
+                StateSnapshots.created < purge_before
+            ).delete(synchronize_session=False)
+
+            # Whole days beyond every retention policy go with their partition
+            if instance.partitioned:
+                dropped, dropped_attributes_ids = partitions.drop_partitions(
+                    session, min(before for _, before in policies)
+                )
+                attributes_ids.update(dropped_attributes_ids)
+                _LOGGER.debug("Dropped partitions %s", dropped)
 
-            deleted_rows = (
-                session.query(Events)
-                .filter((Events.time_fired < purge_before))
-                .delete(synchronize_session=False)
+            # States refer to events and attributes, so they go first
+            for criterion, policy_purge_before in policies:
+                query = session.query(
+                    States.state_id, States.event_id, States.attributes_id
+                ).filter(States.last_updated < policy_purge_before)
+                if criterion is not None:
+                    query = query.filter(criterion)
+                states = query.limit(batch_size).all()
+                more_states |= len(states) == batch_size
+                state_ids = [state.state_id for state in states]
+                attributes_ids.update(
+                    state.attributes_id
+                    for state in states
+                    if state.attributes_id is not None
+                )
+
+                # Checkpoints refer to states
+                if state_ids:
+                    session.query(StateSnapshots).filter(
+                        StateSnapshots.state_id.in_(state_ids)
+                    ).delete(synchronize_session=False)
+                deleted_states += _delete_ids(session, States.state_id, state_ids)
+                # The state_changed events of the states go with them
+                deleted_events += _delete_ids(
+                    session,
+                    Events.event_id,
+                    [state.event_id for state in states if state.event_id is not None],
+                )
+            _LOGGER.debug("Deleted %s states", deleted_states)
+
+            # Other events can only go once no old state refers to them
+            if not more_states:
+                oldest_purge_before = min(before for _, before in policies)
+                event_ids = [
+                    event.event_id
+                    for event in session.query(Events.event_id)
+                    .filter(
+                        (Events.time_fired < oldest_purge_before)
+                        | (
+                            (Events.time_fired < purge_before)
+                            & (Events.event_type != EVENT_STATE_CHANGED)
+                        )
+                    )
+                    .limit(batch_size)
+                ]
+                deleted_events += _delete_ids(session, Events.event_id, event_ids)
+            _LOGGER.debug("Deleted %s events", deleted_events)
+
+            statistics = (
+                session.query(StatisticsShortTerm.id, StatisticsShortTerm.attributes_id)
+                .filter(StatisticsShortTerm.start < purge_before)
+                .limit(batch_size)
+                .all()
+            )
+            attributes_ids.update(
+                row.attributes_id for row in statistics if row.attributes_id is not None
             )
-            _LOGGER.debug("Deleted %s events", deleted_rows)
+            deleted_statistics = _delete_ids(
+                session, StatisticsShortTerm.id, [row.id for row in statistics]
+            )
+            _LOGGER.debug("Deleted %s short term statistics", deleted_statistics)
 
-        # Execute sqlite vacuum command to free up space on disk
-        if repack and instance.engine.driver == "pysqlite":
-            _LOGGER.debug("Vacuuming SQLite to free space")
-            instance.engine.execute("VACUUM")
+            # Only the attributes of the deleted rows can have become orphans
+            candidates = sorted(attributes_ids)
+            for start in range(0, len(candidates), batch_size):
+                orphan_ids = [
+                    attributes.attributes_id
+                    for attributes in session.query(StateAttributes.attributes_id)
+                    .filter(
+                        StateAttributes.attributes_id.in_(
+                            candidates[start : start + batch_size]
+                        )
+                    )
+                    .filter(
+                        *(
+                            ~exists().where(
+                                table.attributes_id == StateAttributes.attributes_id
+                            )
+                            for table in (States, StatisticsShortTerm, Statistics)
+                        )
+                    )
+                ]
+                deleted_attributes += _delete_ids(
+                    session, StateAttributes.attributes_id, orphan_ids
+                )
+            _LOGGER.debug("Deleted %s state attributes", deleted_attributes)
 
     except SQLAlchemyError as err:
         _LOGGER.warning("Error purging history: %s.", err)
+        return True
+
+    done = not more_states and max(len(event_ids), len(statistics)) < batch_size
+
+    instance.hass.bus.fire(
+        EVENT_RECORDER_PURGE_PROGRESS,
+        {
+            "deleted_states": deleted_states,
+            "deleted_events": deleted_events,
+            "deleted_attributes": deleted_attributes,
+            "done": done,
+        },
+    )
+
+    if done and repack:
+        repack_database(instance)
+
+    return done
+
+
+def repack_database(instance):
+    """Free up the space left behind by purged rows."""
+    from sqlalchemy.exc import SQLAlchemyError
+
+    # Execute sqlite vacuum command to free up space on disk
+    if instance.engine.driver == "pysqlite":
+        _LOGGER.debug("Vacuuming SQLite to free space")
+        try:
+            instance.engine.execute("VACUUM")
+        except SQLAlchemyError as err:
+            _LOGGER.warning("Error repacking database: %s.", err)
+
+
+def _retention_policies(retention, purge_before, now):
+    """Return the criterion on states and purge_before of every policy.
+
+    Policies for entities take precedence over those for globs, which take
+    precedence over those for domains. States that no policy applies to are
+    purged before purge_before.
+    """
+    from .models import States
+    from sqlalchemy import and_
+
+    policies = []
+    covered = []
+
+    def add_policy(criterion, keep_days):
+        """Add a policy for the states not covered by a previous one."""
+        policies.append(
+            (
+                and_(criterion, *(~other for other in covered)),
+                now - timedelta(days=keep_days),
+            )
+        )
+        covered.append(criterion)
+
+    entities_by_days = defaultdict(list)
+    for entity_id, keep_days in retention.get(CONF_ENTITIES, {}).items():
+        entities_by_days[keep_days].append(entity_id)
+    for keep_days, entity_ids in entities_by_days.items():
+        add_policy(States.entity_id.in_(entity_ids), keep_days)
+
+    for entity_glob, keep_days in retention.get(CONF_ENTITY_GLOBS, {}).items():
+        add_policy(
+            States.entity_id.like(_glob_to_like(entity_glob), escape="\\"), keep_days
+        )
+
+    for domain, keep_days in retention.get(CONF_DOMAINS, {}).items():
+        add_policy(States.domain == domain, keep_days)
+
+    if covered:
+        policies.append((and_(*(~other for other in covered)), purge_before))
+    else:
+        policies.append((None, purge_before))
+
+    return policies
+
+
+def _glob_to_like(entity_glob):
+    """Convert a glob with * and ? wildcards to a LIKE pattern."""
+    for char in ("\\", "%", "_"):
+        entity_glob = entity_glob.replace(char, "\\" + char)
+    return entity_glob.replace("*", "%").replace("?", "_")
+
+
+def _delete_ids(session, column, ids):
+    """Delete the rows with the given primary keys."""
+    if not ids:
+        return 0
+
+    return (
+        session.query(column.class_)
+        .filter(column.in_(ids))
+        .delete(synchronize_session=False)
+    )
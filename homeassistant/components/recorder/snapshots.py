@@ -0,0 +1,79 @@
+"""Checkpoints of the latest state of every entity."""
+from datetime import datetime, timedelta
+from typing import Any, Iterable, Optional
+
+# Time between the checkpoints of a recorder run
+SNAPSHOT_INTERVAL = timedelta(hours=1)
+
+
+def most_recent_state_ids(
+    session: Any,
+    run_start: datetime,
+    utc_point_in_time: datetime,
+    entity_ids: Optional[Iterable[str]] = None,
+) -> Any:
+    """Return a subquery of the ids of the latest states before a point in time.
+
+    Only states of the run that started at run_start count. The search starts
+    at the latest checkpoint of the run before utc_point_in_time, so only the
+    states stored after that checkpoint are scanned.
+    """
+    from sqlalchemy import and_, func, union_all
+    from .models import States, StateSnapshots
+
+    checkpoint = (
+        session.query(func.max(StateSnapshots.created))
+        .filter(StateSnapshots.created >= run_start)
+        .filter(StateSnapshots.created <= utc_point_in_time)
+        .scalar()
+    )
+    start = run_start if checkpoint is None else checkpoint
+
+    most_recent_states_by_date = session.query(
+        States.entity_id.label("max_entity_id"),
+        func.max(States.last_updated).label("max_last_updated"),
+    ).filter((States.last_updated >= start) & (States.last_updated < utc_point_in_time))
+
+    if entity_ids:
+        most_recent_states_by_date = most_recent_states_by_date.filter(
+            States.entity_id.in_(entity_ids)
+        )
+
+    most_recent_states_by_date = most_recent_states_by_date.group_by(
+        States.entity_id
+    ).subquery()
+
+    most_recent_state_ids = (
+        session.query(func.max(States.state_id).label("max_state_id"))
+        .join(
+            most_recent_states_by_date,
+            and_(
+                States.entity_id == most_recent_states_by_date.c.max_entity_id,
+                States.last_updated == most_recent_states_by_date.c.max_last_updated,
+            ),
+        )
+        .group_by(States.entity_id)
+    )
+
+    if checkpoint is None:
+        return most_recent_state_ids.subquery()
+
+    # Entities without a state since the checkpoint keep their checkpoint state
+    snapshot_state_ids = (
+        session.query(StateSnapshots.state_id.label("max_state_id"))
+        .filter(StateSnapshots.created == checkpoint)
+        .filter(
+            ~StateSnapshots.entity_id.in_(
+                session.query(most_recent_states_by_date.c.max_entity_id)
+            )
+        )
+    )
+
+    if entity_ids:
+        snapshot_state_ids = snapshot_state_ids.filter(
+            StateSnapshots.entity_id.in_(entity_ids)
+        )
+
+    return union_all(
+        most_recent_state_ids.statement, snapshot_state_ids.statement
+    ).alias()
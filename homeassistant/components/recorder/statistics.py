@@ -0,0 +1,138 @@
+"""Compile statistics of numeric states over fixed periods."""
+from datetime import datetime
+import math
+from typing import Any, Dict, List, Mapping, Optional
+
+from homeassistant.const import ATTR_UNIT_OF_MEASUREMENT
+from homeassistant.core import State, split_entity_id
+import homeassistant.util.dt as dt_util
+
+
+def numeric_value(state: Optional[State]) -> Optional[float]:
+    """Return the value of a state with a unit of measurement, if numeric."""
+    if state is None or ATTR_UNIT_OF_MEASUREMENT not in state.attributes:
+        return None
+
+    try:
+        value = float(state.state)
+    except ValueError:
+        return None
+
+    return value if math.isfinite(value) else None
+
+
+class _EntityPeriod:
+    """Running aggregate of an entity within the current period."""
+
+    __slots__ = ("value", "since", "min", "max", "last", "total", "covered", "attrs")
+
+    def __init__(self, since: datetime) -> None:
+        """Initialize the aggregate."""
+        self.value: Optional[float] = None
+        self.since = since
+        self.min: Optional[float] = None
+        self.max: Optional[float] = None
+        self.last: Optional[float] = None
+        self.total = 0.0
+        self.covered = 0.0
+        self.attrs: Mapping[str, Any] = {}
+
+    def accumulate(self, moment: datetime) -> None:
+        """Weigh the current value by the time it has been valid."""
+        if self.value is not None:
+            seconds = max((moment - self.since).total_seconds(), 0)
+            self.total += self.value * seconds
+            self.covered += seconds
+        self.since = moment
+
+    def set_value(self, value: Optional[float]) -> None:
+        """Make value the current value."""
+        self.value = value
+        if value is None:
+            return
+        self.min = value if self.min is None else min(self.min, value)
+        self.max = value if self.max is None else max(self.max, value)
+        self.last = value
+
+
+class StatisticsCompiler:
+    """Aggregate the numeric states of entities into periods of a table.
+
+    The periods are aligned to multiples of the table period, so they end at
+    the same moment for all entities. The mean is weighted by time.
+    """
+
+    def __init__(self, table: Any) -> None:
+        """Initialize the compiler."""
+        self.table = table
+        self._seconds = table.period.total_seconds()
+        self._start: Optional[datetime] = None
+        self._entities: Dict[str, _EntityPeriod] = {}
+
+    def add_state(self, entity_id: str, state: Optional[State], now: datetime) -> None:
+        """Add a new state of an entity."""
+        value = numeric_value(state)
+        entity = self._entities.get(entity_id)
+
+        if entity is None:
+            if value is None:
+                return
+            entity = self._entities[entity_id] = _EntityPeriod(now)
+        else:
+            entity.accumulate(now)
+
+        entity.set_value(value)
+        if state is not None and value is not None:
+            entity.attrs = state.attributes
+
+    def compile(self, now: datetime) -> List[Dict[str, Any]]:
+        """Return the rows of the period that ended before now."""
+        if self._start is None:
+            self._start = self._period_start(now)
+
+        end = self._start + self.table.period
+        if now < end:
+            return []
+
+        rows = []
+        # Periods skipped when no time passed for the recorder are not
+        # compiled, the next period starts at the period of now.
+        next_start = self._period_start(now)
+
+        for entity_id, entity in list(self._entities.items()):
+            entity.accumulate(end)
+
+            if entity.last is not None:
+                rows.append(
+                    {
+                        "domain": split_entity_id(entity_id)[0],
+                        "entity_id": entity_id,
+                        "start": self._start,
+                        "mean": (
+                            entity.total / entity.covered
+                            if entity.covered
+                            else entity.last
+                        ),
+                        "min": entity.min,
+                        "max": entity.max,
+                        "last": entity.last,
+                        "attributes": entity.attrs,
+                    }
+                )
+
+            if entity.value is None:
+                del self._entities[entity_id]
+                continue
+
+            # The current value carries over into the next period
+            entity.min = entity.max = entity.last = entity.value
+            entity.total = entity.covered = 0.0
+            entity.since = next_start
+
+        self._start = next_start
+        return rows
+
+    def _period_start(self, moment: datetime) -> datetime:
+        """Return the start of the period moment is in."""
+        timestamp = moment.timestamp()
+        return dt_util.utc_from_timestamp(timestamp - timestamp % self._seconds)
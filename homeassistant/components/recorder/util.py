@@ -12,24 +12,31 @@ QUERY_RETRY_WAIT = 0.1
 
 
 @contextmanager
-def session_scope(*, hass=None, session=None):
-    """Provide a transactional scope around a series of operations."""
+def session_scope(*, hass=None, session=None, read_only=False):
+    """Provide a transactional scope around a series of operations.
+
+    With read_only set, the session of hass uses the read connection pool,
+    which does not compete with the recorder for connections.
+    """
     if session is None and hass is not None:
-        session = hass.data[DATA_INSTANCE].get_session()
+        instance = hass.data[DATA_INSTANCE]
+        if read_only and instance.get_read_session is not None:
+            session = instance.get_read_session()
+        else:
+            session = instance.get_session()
 
     if session is None:
         raise RuntimeError("Session required")
 
-    need_rollback = False
     try:
         yield session
         if session.transaction:
-            need_rollback = True
             session.commit()
     except Exception as err:  # pylint: disable=broad-except
         _LOGGER.error("Error executing query: %s", err)
-        if need_rollback:
-            session.rollback()
+        # Rows flushed in the body are not rolled back when the session is
+        # closed, the in memory SQLite pool does not reset its connection
+        session.rollback()
         raise
     finally:
         session.close()
@@ -59,14 +66,28 @@ def execute(qry):
 
     This method also retries a few times in the case of stale connections.
     """
+    return _execute(qry, lambda rows: (row.to_native() for row in rows))
+
+
+def execute_states(qry):
+    """Query the states of a query of States with the bulk decoding path.
+
+    Only the columns of STATE_COLUMNS are selected and decoded, which is a
+    lot faster than converting the States objects.
+    """
+    from .models import STATE_COLUMNS, decode_states
+
+    return _execute(qry.with_entities(*STATE_COLUMNS), decode_states)
+
+
+def _execute(qry, to_native):
+    """Query the database and convert the rows with to_native, with retries."""
     from sqlalchemy.exc import SQLAlchemyError
 
     for tryno in range(0, RETRIES):
         try:
             timer_start = time.perf_counter()
-            result = [
-                row for row in (row.to_native() for row in qry) if row is not None
-            ]
+            result = [row for row in to_native(qry) if row is not None]
 
             if _LOGGER.isEnabledFor(logging.DEBUG):
                 elapsed = time.perf_counter() - timer_start
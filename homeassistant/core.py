@@ -29,6 +29,7 @@ from typing import (
     TYPE_CHECKING,
     Awaitable,
     Mapping,
+    Tuple,
 )
 
 from async_timeout import timeout
@@ -146,6 +147,51 @@ def async_loop_exception_handler(_: Any, context: Dict) -> None:
     )
 
 
+class HassJobType(enum.Enum):
+    """Represent a job type."""
+
+    Coroutinefunction = 1
+    Callback = 2
+    Executor = 3
+
+
+class HassJob:
+    """Represent a job to be run later.
+
+    We check the callable type in advance
+    so we can avoid checking it every time
+    we run the job.
+    """
+
+    __slots__ = ("job_type", "target")
+
+    def __init__(self, target: Callable) -> None:
+        """Create a job object."""
+        if asyncio.iscoroutine(target):
+            raise ValueError("Coroutine not allowed to be passed to HassJob")
+
+        self.target = target
+        self.job_type = _get_callable_job_type(target)
+
+    def __repr__(self) -> str:
+        """Return the job."""
+        return f"<Job {self.job_type} {self.target}>"
+
+
+def _get_callable_job_type(target: Callable) -> HassJobType:
+    """Determine the job type from the callable."""
+    # Check for partials to properly determine if coroutine function
+    check_target = target
+    while isinstance(check_target, functools.partial):
+        check_target = check_target.func
+
+    if is_callback(check_target):
+        return HassJobType.Callback
+    if asyncio.iscoroutinefunction(check_target):
+        return HassJobType.Coroutinefunction
+    return HassJobType.Executor
+
+
 class CoreState(enum.Enum):
     """Represent the current state of Home Assistant."""
 
@@ -319,6 +365,34 @@ class HomeAssistant:
 
         return task
 
+    @callback
+    def async_add_hass_job(
+        self, hassjob: HassJob, *args: Any
+    ) -> Optional[asyncio.Future]:
+        """Add a HassJob from within the event loop.
+
+        This method must be run in the event loop.
+
+        hassjob: HassJob to call.
+        args: parameters for method to call.
+        """
+        task = None
+
+        if hassjob.job_type == HassJobType.Callback:
+            self.loop.call_soon(hassjob.target, *args)
+        elif hassjob.job_type == HassJobType.Coroutinefunction:
+            task = self.loop.create_task(hassjob.target(*args))
+        else:
+            task = self.loop.run_in_executor(  # type: ignore
+                None, hassjob.target, *args
+            )
+
+        # If a task is scheduled
+        if self._track_task and task is not None:
+            self._pending_tasks.append(task)
+
+        return task
+
     @callback
     def async_create_task(self, target: Coroutine) -> asyncio.tasks.Task:
         """Create a task from within the eventloop.
@@ -357,6 +431,20 @@ class HomeAssistant:
         """Stop track tasks so you can't wait for all tasks to be done."""
         self._track_task = False
 
+    @callback
+    def async_run_hass_job(self, hassjob: HassJob, *args: Any) -> None:
+        """Run a HassJob from within the event loop.
+
+        This method must be run in the event loop.
+
+        hassjob: HassJob to call.
+        args: parameters for method to call.
+        """
+        if hassjob.job_type == HassJobType.Callback:
+            hassjob.target(*args)
+        else:
+            self.async_add_hass_job(hassjob, *args)
+
     @callback
     def async_run_job(self, target: Callable[..., None], *args: Any) -> None:
         """Run a job from within the event loop.
@@ -516,12 +604,18 @@ class Event:
         )
 
 
+# A listener job with its event filter and whether it runs immediately
+_FilterableJob = Tuple[HassJob, Optional[Callable[[Event], bool]], bool]
+
+
 class EventBus:
     """Allow the firing of and listening for events."""
 
     def __init__(self, hass: HomeAssistant) -> None:
         """Initialize a new event bus."""
-        self._listeners: Dict[str, List[Callable]] = {}
+        # The lists are replaced rather than modified, so that firing an
+        # event can walk them while listeners are added or removed.
+        self._listeners: Dict[str, List[_FilterableJob]] = {}
         self._hass = hass
 
     @callback
@@ -563,23 +657,47 @@ class EventBus:
 
         This method must be run in the event loop.
         """
-        listeners = self._listeners.get(event_type, [])
+        listeners = self._listeners.get(event_type)
 
         # EVENT_HOMEASSISTANT_CLOSE should go only to his listeners
         match_all_listeners = self._listeners.get(MATCH_ALL)
-        if match_all_listeners is not None and event_type != EVENT_HOMEASSISTANT_CLOSE:
-            listeners = match_all_listeners + listeners
+        if event_type == EVENT_HOMEASSISTANT_CLOSE:
+            match_all_listeners = None
 
         event = Event(event_type, event_data, origin, None, context)
 
         if event_type != EVENT_TIME_CHANGED:
             _LOGGER.debug("Bus:Handling %s", event)
 
-        if not listeners:
-            return
+        if match_all_listeners is not None:
+            self._async_fire_listeners(match_all_listeners, event)
+        if listeners is not None:
+            self._async_fire_listeners(listeners, event)
 
-        for func in listeners:
-            self._hass.async_add_job(func, event)
+    @callback
+    def _async_fire_listeners(
+        self, listeners: List[_FilterableJob], event: Event
+    ) -> None:
+        """Run or schedule the listeners of which the filter passes the event.
+
+        This method must be run in the event loop.
+        """
+        for job, event_filter, run_immediately in listeners:
+            if event_filter is not None:
+                try:
+                    if not event_filter(event):
+                        continue
+                except Exception:  # pylint: disable=broad-except
+                    _LOGGER.exception("Error in event filter")
+                    continue
+
+            if run_immediately:
+                try:
+                    job.target(event)
+                except Exception:  # pylint: disable=broad-except
+                    _LOGGER.exception("Error running listener %s", job)
+            else:
+                self._hass.async_add_hass_job(job, event)
 
     def listen(self, event_type: str, listener: Callable) -> CALLBACK_TYPE:
         """Listen for all events or events of a specific type.
@@ -598,22 +716,45 @@ class EventBus:
         return remove_listener
 
     @callback
-    def async_listen(self, event_type: str, listener: Callable) -> CALLBACK_TYPE:
+    def async_listen(
+        self,
+        event_type: str,
+        listener: Callable,
+        event_filter: Optional[Callable[[Event], bool]] = None,
+        run_immediately: bool = False,
+    ) -> CALLBACK_TYPE:
         """Listen for all events or events of a specific type.
 
         To listen to all events specify the constant ``MATCH_ALL``
         as event_type.
 
+        An event_filter is a callback that is called with the event before the
+        listener is scheduled. The listener is only scheduled when it returns
+        True. With run_immediately the listener, which has to be a callback,
+        is called while the event is fired instead of being scheduled.
+
         This method must be run in the event loop.
         """
-        if event_type in self._listeners:
-            self._listeners[event_type].append(listener)
-        else:
-            self._listeners[event_type] = [listener]
+        if run_immediately and not is_callback(listener):
+            raise HomeAssistantError(f"Event listener {listener} is not a callback")
+
+        return self._async_listen_filterable(
+            event_type, (HassJob(listener), event_filter, run_immediately)
+        )
+
+    @callback
+    def _async_listen_filterable(
+        self, event_type: str, filterable: _FilterableJob
+    ) -> CALLBACK_TYPE:
+        """Add a listener job with its filter.
+
+        This method must be run in the event loop.
+        """
+        self._listeners[event_type] = [*self._listeners.get(event_type, ()), filterable]
 
         def remove_listener() -> None:
             """Remove the listener."""
-            self._async_remove_listener(event_type, listener)
+            self._async_remove_listener(event_type, filterable)
 
         return remove_listener
 
@@ -646,6 +787,7 @@ class EventBus:
 
         This method must be run in the event loop.
         """
+        filterable: _FilterableJob
 
         @callback
         def onetime_listener(event: Event) -> None:
@@ -658,27 +800,35 @@ class EventBus:
             # multiple times as well.
             # This will make sure the second time it does nothing.
             setattr(onetime_listener, "run", True)
-            self._async_remove_listener(event_type, onetime_listener)
+            self._async_remove_listener(event_type, filterable)
             self._hass.async_run_job(listener, event)
 
-        return self.async_listen(event_type, onetime_listener)
+        filterable = (HassJob(onetime_listener), None, False)
+        return self._async_listen_filterable(event_type, filterable)
 
     @callback
-    def _async_remove_listener(self, event_type: str, listener: Callable) -> None:
+    def _async_remove_listener(
+        self, event_type: str, filterable: _FilterableJob
+    ) -> None:
         """Remove a listener of a specific event_type.
 
         This method must be run in the event loop.
         """
         try:
-            self._listeners[event_type].remove(listener)
+            listeners = list(self._listeners[event_type])
+            listeners.remove(filterable)
 
             # delete event_type list if empty
-            if not self._listeners[event_type]:
+            if listeners:
+                self._listeners[event_type] = listeners
+            else:
                 self._listeners.pop(event_type)
         except (KeyError, ValueError):
             # KeyError is key event_type listener did not exist
             # ValueError if listener did not exist within event_type
-            _LOGGER.warning("Unable to remove unknown listener %s", listener)
+            _LOGGER.warning(
+                "Unable to remove unknown listener %s", filterable[0].target
+            )
 
 
 class State:
@@ -837,6 +987,8 @@ class StateMachine:
     def __init__(self, bus: EventBus, loop: asyncio.events.AbstractEventLoop) -> None:
         """Initialize state machine."""
         self._states: Dict[str, State] = {}
+        # The states of each domain, kept in sync with _states
+        self._domain_index: Dict[str, Dict[str, State]] = {}
         self._bus = bus
         self._loop = loop
 
@@ -856,27 +1008,25 @@ class StateMachine:
         if domain_filter is None:
             return list(self._states.keys())
 
-        domain_filter = domain_filter.lower()
+        return list(self._domain_index.get(domain_filter.lower(), ()))
 
-        return [
-            state.entity_id
-            for state in self._states.values()
-            if state.domain == domain_filter
-        ]
-
-    def all(self) -> List[State]:
+    def all(self, domain_filter: Optional[str] = None) -> List[State]:
         """Create a list of all states."""
         return run_callback_threadsafe(  # type: ignore
-            self._loop, self.async_all
+            self._loop, self.async_all, domain_filter
         ).result()
 
     @callback
-    def async_all(self) -> List[State]:
-        """Create a list of all states.
+    def async_all(self, domain_filter: Optional[str] = None) -> List[State]:
+        """Create a list of all states, or of the states of a domain.
 
         This method must be run in the event loop.
         """
-        return list(self._states.values())
+        if domain_filter is None:
+            return list(self._states.values())
+
+        states = self._domain_index.get(domain_filter.lower())
+        return [] if states is None else list(states.values())
 
     def get(self, entity_id: str) -> Optional[State]:
         """Retrieve state of entity_id or None if not found.
@@ -916,6 +1066,12 @@ class StateMachine:
         if old_state is None:
             return False
 
+        domain = old_state.domain
+        domain_states = self._domain_index[domain]
+        del domain_states[entity_id]
+        if not domain_states:
+            del self._domain_index[domain]
+
         self._bus.async_fire(
             EVENT_STATE_CHANGED,
             {"entity_id": entity_id, "old_state": old_state, "new_state": None},
@@ -986,6 +1142,10 @@ class StateMachine:
 
         state = State(entity_id, new_state, attributes, last_changed, None, context)
         self._states[entity_id] = state
+        if old_state is None:
+            self._domain_index.setdefault(state.domain, {})[entity_id] = state
+        else:
+            self._domain_index[state.domain][entity_id] = state
         self._bus.async_fire(
             EVENT_STATE_CHANGED,
             {"entity_id": entity_id, "old_state": old_state, "new_state": state},
@@ -1,17 +1,22 @@
 """Helpers for listening to events."""
+import asyncio
 from datetime import datetime, timedelta
 import functools as ft
-from typing import Callable
+import heapq
+import itertools
+import logging
+from typing import Callable, Dict, List, Optional
 
 import attr
 
 from homeassistant.loader import bind_hass
 from homeassistant.helpers.sun import get_astral_event_next
-from homeassistant.core import HomeAssistant, callback, CALLBACK_TYPE
+from homeassistant.core import CALLBACK_TYPE, Event, HassJob, HomeAssistant, callback
 from homeassistant.const import (
     ATTR_NOW,
     EVENT_STATE_CHANGED,
     EVENT_TIME_CHANGED,
+    EVENT_TIMER_OUT_OF_SYNC,
     MATCH_ALL,
     SUN_EVENT_SUNRISE,
     SUN_EVENT_SUNSET,
@@ -21,6 +26,14 @@ from homeassistant.util import dt as dt_util
 from homeassistant.util.async_ import run_callback_threadsafe
 
 
+_LOGGER = logging.getLogger(__name__)
+
+DATA_POINT_IN_TIME_SCHEDULER = "point_in_time_scheduler"
+DATA_STATE_CHANGE_DISPATCHER = "state_change_dispatcher"
+
+# Compact the heap once this many cancelled entries are waiting in it
+SCHEDULER_COMPACT_THRESHOLD = 64
+
 # mypy: allow-untyped-calls, allow-untyped-defs, no-check-untyped-defs
 # PyLint does not like the use of threaded_listener_factory
 # pylint: disable=invalid-name
@@ -73,12 +86,11 @@ def async_track_state_change(hass, entity_ids, action, from_state=None, to_state
     else:
         entity_ids = tuple(entity_id.lower() for entity_id in entity_ids)
 
+    job = HassJob(action)
+
     @callback
     def state_change_listener(event):
         """Handle specific state changes."""
-        if entity_ids != MATCH_ALL and event.data.get("entity_id") not in entity_ids:
-            return
-
         old_state = event.data.get("old_state")
         if old_state is not None:
             old_state = old_state.state
@@ -88,14 +100,21 @@ def async_track_state_change(hass, entity_ids, action, from_state=None, to_state
             new_state = new_state.state
 
         if match_from_state(old_state) and match_to_state(new_state):
-            hass.async_run_job(
-                action,
+            hass.async_run_hass_job(
+                job,
                 event.data.get("entity_id"),
                 event.data.get("old_state"),
                 event.data.get("new_state"),
             )
 
-    return hass.bus.async_listen(EVENT_STATE_CHANGED, state_change_listener)
+    dispatcher = hass.data.get(DATA_STATE_CHANGE_DISPATCHER)
+
+    if dispatcher is None:
+        dispatcher = hass.data[DATA_STATE_CHANGE_DISPATCHER] = StateChangeDispatcher(
+            hass
+        )
+
+    return dispatcher.async_listen(entity_ids, state_change_listener)
 
 
 track_state_change = threaded_listener_factory(async_track_state_change)
@@ -109,6 +128,7 @@ def async_track_template(hass, template, action, variables=None):
 
     # Local variable to keep track of if the action has already been triggered
     already_triggered = False
+    job = HassJob(action)
 
     @callback
     def template_condition_listener(entity_id, from_s, to_s):
@@ -119,7 +139,7 @@ def async_track_template(hass, template, action, variables=None):
         # Check to see if template returns true
         if template_result and not already_triggered:
             already_triggered = True
-            hass.async_run_job(action, entity_id, from_s, to_s)
+            hass.async_run_hass_job(job, entity_id, from_s, to_s)
         elif not template_result:
             already_triggered = False
 
@@ -143,6 +163,7 @@ def async_track_same_state(
     """
     async_remove_state_for_cancel = None
     async_remove_state_for_listener = None
+    job = HassJob(action)
 
     @callback
     def clear_listener():
@@ -162,7 +183,7 @@ def async_track_same_state(
         nonlocal async_remove_state_for_listener
         async_remove_state_for_listener = None
         clear_listener()
-        hass.async_run_job(action)
+        hass.async_run_hass_job(job)
 
     @callback
     def state_for_cancel_listener(entity, from_state, to_state):
@@ -191,11 +212,12 @@ def async_track_point_in_time(
 ) -> CALLBACK_TYPE:
     """Add a listener that fires once after a specific point in time."""
     utc_point_in_time = dt_util.as_utc(point_in_time)
+    job = HassJob(action)
 
     @callback
     def utc_converter(utc_now):
         """Convert passed in UTC now to local now."""
-        hass.async_run_job(action, dt_util.as_local(utc_now))
+        hass.async_run_hass_job(job, dt_util.as_local(utc_now))
 
     return async_track_point_in_utc_time(hass, utc_converter, utc_point_in_time)
 
@@ -209,30 +231,12 @@ def async_track_point_in_utc_time(
     hass: HomeAssistant, action: Callable[..., None], point_in_time: datetime
 ) -> CALLBACK_TYPE:
     """Add a listener that fires once after a specific point in UTC time."""
-    # Ensure point_in_time is UTC
-    point_in_time = dt_util.as_utc(point_in_time)
+    scheduler = hass.data.get(DATA_POINT_IN_TIME_SCHEDULER)
 
-    @callback
-    def point_in_time_listener(event):
-        """Listen for matching time_changed events."""
-        now = event.data[ATTR_NOW]
-
-        if now < point_in_time or hasattr(point_in_time_listener, "run"):
-            return
-
-        # Set variable so that we will never run twice.
-        # Because the event bus might have to wait till a thread comes
-        # available to execute this listener it might occur that the
-        # listener gets lined up twice to be executed. This will make
-        # sure the second time it does nothing.
-        point_in_time_listener.run = True
-        async_unsub()
+    if scheduler is None:
+        scheduler = hass.data[DATA_POINT_IN_TIME_SCHEDULER] = PointInTimeScheduler(hass)
 
-        hass.async_run_job(action, now)
-
-    async_unsub = hass.bus.async_listen(EVENT_TIME_CHANGED, point_in_time_listener)
-
-    return async_unsub
+    return scheduler.async_schedule(action, point_in_time)
 
 
 track_point_in_utc_time = threaded_listener_factory(async_track_point_in_utc_time)
@@ -255,6 +259,7 @@ call_later = threaded_listener_factory(async_call_later)
 def async_track_time_interval(hass, action, interval):
     """Add a listener that fires repetitively at every timedelta interval."""
     remove = None
+    job = HassJob(action)
 
     def next_interval():
         """Return the next interval."""
@@ -265,7 +270,7 @@ def async_track_time_interval(hass, action, interval):
         """Handle elapsed intervals."""
         nonlocal remove
         remove = async_track_point_in_utc_time(hass, interval_listener, next_interval())
-        hass.async_run_job(action, now)
+        hass.async_run_hass_job(job, now)
 
     remove = async_track_point_in_utc_time(hass, interval_listener, next_interval())
 
@@ -279,6 +284,275 @@ def async_track_time_interval(hass, action, interval):
 track_time_interval = threaded_listener_factory(async_track_time_interval)
 
 
+class StateChangeDispatcher:
+    """Route state changed events to the listeners of the changed entity.
+
+    All state change trackers share a single state changed listener on
+    the bus, so a state change only costs the listeners of that entity
+    and the listeners that track all entities.
+    """
+
+    def __init__(self, hass: HomeAssistant) -> None:
+        """Initialize the dispatcher."""
+        self._hass = hass
+        self._listeners: Dict[str, List[Callable]] = {}
+        self._match_all_listeners: List[Callable] = []
+        self._unsub: Optional[CALLBACK_TYPE] = None
+
+    @callback
+    def async_listeners(self) -> Dict[str, int]:
+        """Return dictionary with entity ids and the number of listeners."""
+        listeners = {key: len(value) for key, value in self._listeners.items()}
+        if self._match_all_listeners:
+            listeners[MATCH_ALL] = len(self._match_all_listeners)
+        return listeners
+
+    @callback
+    def async_listen(self, entity_ids, listener: Callable) -> CALLBACK_TYPE:
+        """Listen for state changes of entity_ids.
+
+        Entity ids should be lowercase or MATCH_ALL to listen to all
+        state changes.
+        """
+        if entity_ids == MATCH_ALL:
+            self._match_all_listeners.append(listener)
+        else:
+            entity_ids = set(entity_ids)
+            for entity_id in entity_ids:
+                self._listeners.setdefault(entity_id, []).append(listener)
+
+        if self._unsub is None:
+            self._unsub = self._hass.bus.async_listen(
+                EVENT_STATE_CHANGED, self._async_state_changed
+            )
+
+        @callback
+        def remove_listener() -> None:
+            """Remove the listener."""
+            self._async_remove_listener(entity_ids, listener)
+
+        return remove_listener
+
+    @callback
+    def _async_remove_listener(self, entity_ids, listener: Callable) -> None:
+        """Remove a listener for entity_ids."""
+        try:
+            if entity_ids == MATCH_ALL:
+                self._match_all_listeners.remove(listener)
+            else:
+                for entity_id in entity_ids:
+                    listeners = self._listeners[entity_id]
+                    listeners.remove(listener)
+                    if not listeners:
+                        self._listeners.pop(entity_id)
+        except (KeyError, ValueError):
+            _LOGGER.warning("Unable to remove unknown state change listener")
+            return
+
+        if not self._listeners and not self._match_all_listeners:
+            self._unsub()
+            self._unsub = None
+
+    @callback
+    def _async_state_changed(self, event: Event) -> None:
+        """Call the listeners for the entity that changed."""
+        listeners = self._listeners.get(event.data.get("entity_id"))
+
+        if listeners:
+            if self._match_all_listeners:
+                listeners = self._match_all_listeners + listeners
+            else:
+                listeners = listeners.copy()
+        elif self._match_all_listeners:
+            listeners = self._match_all_listeners.copy()
+        else:
+            return
+
+        for listener in listeners:
+            try:
+                listener(event)
+            except Exception:  # pylint: disable=broad-except
+                _LOGGER.exception("Error running state change listener %s", listener)
+
+
+class PointInTimeScheduler:
+    """Fire point in time callbacks from a single heap ordered by deadline.
+
+    The scheduler arms one loop timer for the earliest deadline. While
+    callbacks are pending it also listens for time changed events, which
+    only requires a peek at the head of the heap, so that jumps of the
+    system clock and the time changed events fired by tests are honored.
+    """
+
+    def __init__(self, hass: HomeAssistant) -> None:
+        """Initialize the scheduler."""
+        self._hass = hass
+        # Entries are [timestamp, sequence, job], job is None if cancelled
+        # and sequence is None once the entry left the heap to be run
+        self._heap: List[list] = []
+        self._sequence = itertools.count()
+        self._pending = 0
+        self._cancelled = 0
+        self._timer: Optional[asyncio.TimerHandle] = None
+        self._timer_deadline: Optional[float] = None
+        self._unsub_time_changed: Optional[CALLBACK_TYPE] = None
+        self._unsub_out_of_sync: Optional[CALLBACK_TYPE] = None
+
+    @callback
+    def async_schedule(
+        self, action: Callable[..., None], point_in_time: datetime
+    ) -> CALLBACK_TYPE:
+        """Schedule action to be called once at point_in_time."""
+        entry = [
+            dt_util.as_utc(point_in_time).timestamp(),
+            next(self._sequence),
+            HassJob(action),
+        ]
+        heapq.heappush(self._heap, entry)
+        self._pending += 1
+
+        if self._unsub_time_changed is None:
+            self._unsub_time_changed = self._hass.bus.async_listen(
+                EVENT_TIME_CHANGED, self._async_time_changed
+            )
+            self._unsub_out_of_sync = self._hass.bus.async_listen(
+                EVENT_TIMER_OUT_OF_SYNC, self._async_out_of_sync
+            )
+
+        if self._heap[0] is entry:
+            self._async_arm_timer()
+
+        @callback
+        def async_unsub() -> None:
+            """Cancel the scheduled action."""
+            if entry[2] is None:
+                return
+            entry[2] = None
+            # Only cancelled entries that are still in the heap are counted
+            if entry[1] is not None:
+                self._cancelled += 1
+            self._async_entry_done()
+
+        return async_unsub
+
+    @callback
+    def _async_entry_done(self) -> None:
+        """Update bookkeeping after an entry was run or cancelled."""
+        self._pending -= 1
+
+        if self._pending == 0:
+            self._async_stop()
+        elif (
+            self._cancelled > SCHEDULER_COMPACT_THRESHOLD
+            and self._cancelled > self._pending
+        ):
+            self._heap = [entry for entry in self._heap if entry[2] is not None]
+            heapq.heapify(self._heap)
+            self._cancelled = 0
+
+    @callback
+    def _async_stop(self) -> None:
+        """Release the loop timer and listeners when nothing is pending."""
+        self._heap.clear()
+        self._cancelled = 0
+
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+            self._timer_deadline = None
+
+        if self._unsub_time_changed is not None:
+            self._unsub_time_changed()
+            self._unsub_time_changed = None
+        if self._unsub_out_of_sync is not None:
+            self._unsub_out_of_sync()
+            self._unsub_out_of_sync = None
+
+    @callback
+    def _async_arm_timer(self) -> None:
+        """Make sure the loop timer fires at the earliest deadline."""
+        heap = self._heap
+        while heap and heap[0][2] is None:
+            heapq.heappop(heap)
+            self._cancelled -= 1
+
+        if not heap:
+            return
+
+        deadline = heap[0][0]
+
+        if self._timer is not None:
+            if self._timer_deadline is not None and self._timer_deadline <= deadline:
+                return
+            self._timer.cancel()
+            self._timer = None
+            self._timer_deadline = None
+
+        delay = deadline - dt_util.utcnow().timestamp()
+
+        # Deadlines that already passed are run by the next time changed
+        # event, the same moment a point in time listener used to fire.
+        if delay <= 0:
+            return
+
+        self._timer = self._hass.loop.call_later(delay, self._async_timer_fired)
+        self._timer_deadline = deadline
+
+    @callback
+    def _async_run_due(self, now: datetime) -> None:
+        """Run all actions with a deadline at or before now."""
+        timestamp = now.timestamp()
+        heap = self._heap
+        due = []
+
+        # Collect first so actions that reschedule themselves with a
+        # deadline before now are not run again for the same moment.
+        while heap and heap[0][0] <= timestamp:
+            entry = heapq.heappop(heap)
+            if entry[2] is None:
+                self._cancelled -= 1
+            else:
+                entry[1] = None
+                due.append(entry)
+
+        for entry in due:
+            job = entry[2]
+            # The action might have been cancelled by an earlier action
+            if job is None:
+                continue
+            entry[2] = None
+            self._async_entry_done()
+            try:
+                self._hass.async_run_hass_job(job, now)
+            except Exception:  # pylint: disable=broad-except
+                _LOGGER.exception("Error running point in time action %s", job)
+
+    @callback
+    def _async_timer_fired(self) -> None:
+        """Handle the loop timer for the earliest deadline."""
+        self._timer = None
+        self._timer_deadline = None
+        self._async_run_due(dt_util.utcnow())
+        self._async_arm_timer()
+
+    @callback
+    def _async_time_changed(self, event: Event) -> None:
+        """Run actions that are due according to the wall clock."""
+        heap = self._heap
+        if heap and heap[0][0] <= event.data[ATTR_NOW].timestamp():
+            self._async_run_due(event.data[ATTR_NOW])
+            self._async_arm_timer()
+
+    @callback
+    def _async_out_of_sync(self, _event: Event) -> None:
+        """Re-arm the loop timer after the event loop was blocked."""
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+            self._timer_deadline = None
+        self._async_arm_timer()
+
+
 @attr.s
 class SunListener:
     """Helper class to help listen to sun events."""
@@ -289,6 +563,11 @@ class SunListener:
     offset = attr.ib(type=timedelta)
     _unsub_sun: CALLBACK_TYPE = attr.ib(default=None)
     _unsub_config: CALLBACK_TYPE = attr.ib(default=None)
+    _job: HassJob = attr.ib(init=False)
+
+    def __attrs_post_init__(self):
+        """Classify the action once."""
+        self._job = HassJob(self.action)
 
     @callback
     def async_attach(self):
@@ -328,7 +607,7 @@ class SunListener:
         """Handle solar event."""
         self._unsub_sun = None
         self._listen_next_sun_event()
-        self.hass.async_run_job(self.action)
+        self.hass.async_run_hass_job(self._job)
 
     @callback
     def _handle_config_event(self, _event):
@@ -371,12 +650,14 @@ def async_track_utc_time_change(
     """Add a listener that will fire if time matches a pattern."""
     # We do not have to wrap the function with time pattern matching logic
     # if no pattern given
+    job = HassJob(action)
+
     if all(val is None for val in (hour, minute, second)):
 
         @callback
         def time_change_listener(event):
             """Fire every time event that comes in."""
-            hass.async_run_job(action, event.data[ATTR_NOW])
+            hass.async_run_hass_job(job, event.data[ATTR_NOW])
 
         return hass.bus.async_listen(EVENT_TIME_CHANGED, time_change_listener)
 
@@ -413,7 +694,7 @@ def async_track_utc_time_change(
         last_now = now
 
         if next_time <= now:
-            hass.async_run_job(action, dt_util.as_local(now) if local else now)
+            hass.async_run_hass_job(job, dt_util.as_local(now) if local else now)
             calculate_next(now + timedelta(seconds=1))
 
     # We can't use async_track_point_in_utc_time here because it would
@@ -10,6 +10,7 @@ import importlib
 import json
 import logging
 import pathlib
+import re
 import sys
 from types import ModuleType
 from typing import (
@@ -49,6 +50,12 @@ CUSTOM_WARNING = (
     "do experience issues with Home Assistant."
 )
 _UNDEF = object()
+_INTEGRATION_MODULE = re.compile(
+    r"^(?:homeassistant\.components|custom_components)\.(\w+)"
+)
+_INTEGRATION_PATH = re.compile(
+    r"[/\\](?:homeassistant[/\\]components|custom_components)[/\\](\w+)"
+)
 
 
 def manifest_from_legacy_module(domain: str, module: ModuleType) -> Dict:
@@ -446,6 +453,14 @@ class Helpers:
         return wrapped
 
 
+def integration_from_module(module: str) -> str:
+    """Return the integration of a module or the file of a module."""
+    match = _INTEGRATION_MODULE.match(module) or _INTEGRATION_PATH.search(module)
+    if match is not None:
+        return match.group(1)
+    return module
+
+
 def bind_hass(func: CALLABLE_T) -> CALLABLE_T:
     """Decorate function to indicate that first argument is hass."""
     setattr(func, "__bind_hass", True)
@@ -2,7 +2,7 @@
 import argparse
 import asyncio
 from contextlib import suppress
-from datetime import datetime
+from datetime import datetime, timedelta
 import logging
 from timeit import default_timer as timer
 from typing import Callable, Dict
@@ -53,6 +53,38 @@ def benchmark(func):
 @benchmark
 async def async_million_events(hass):
     """Run a million events."""
+    return await _async_million_events(hass)
+
+
+@benchmark
+async def async_million_events_run_immediately(hass):
+    """Run a million events with a listener that runs immediately."""
+    return await _async_million_events(hass, run_immediately=True)
+
+
+@benchmark
+async def async_million_events_filtered(hass):
+    """Run a million events with ten listeners that filter them out."""
+
+    @core.callback
+    def unrelated_listener(_):
+        """Handle event."""
+
+    @core.callback
+    def event_filter(_):
+        """Filter out all events."""
+        return False
+
+    for _ in range(10):
+        hass.bus.async_listen(
+            "benchmark_event", unrelated_listener, event_filter=event_filter
+        )
+
+    return await _async_million_events(hass)
+
+
+async def _async_million_events(hass, **listen_kwargs):
+    """Run a million events, including the time to fire them."""
     count = 0
     event_name = "benchmark_event"
     event = asyncio.Event()
@@ -66,13 +98,13 @@ async def async_million_events(hass):
         if count == 10 ** 6:
             event.set()
 
-    hass.bus.async_listen(event_name, listener)
+    hass.bus.async_listen(event_name, listener, **listen_kwargs)
+
+    start = timer()
 
     for _ in range(10 ** 6):
         hass.bus.async_fire(event_name)
 
-    start = timer()
-
     await event.wait()
 
     return timer() - start
@@ -106,8 +138,75 @@ async def async_million_time_changed_helper(hass):
     return timer() - start
 
 
+@benchmark
+async def async_time_changed_pending_timers(hass):
+    """Fire time changed events with a growing number of pending timers."""
+    ticks = 10 ** 4
+    total = 0
+    now = dt_util.utcnow()
+    event_data = {ATTR_NOW: now}
+
+    for pending in (0, 10, 100, 1000, 10000):
+        count = 0
+        event = asyncio.Event()
+        unsubs = []
+
+        @core.callback
+        def tick_listener(_):
+            """Count time changed events."""
+            nonlocal count
+            count += 1
+
+            if count == ticks:
+                event.set()
+
+        @core.callback
+        def timer_listener(_):
+            """Handle a timer that should not fire."""
+
+        for _ in range(pending):
+            unsubs.append(
+                hass.helpers.event.async_track_point_in_utc_time(
+                    timer_listener, now + timedelta(days=1)
+                )
+            )
+
+        unsub_tick = hass.bus.async_listen(EVENT_TIME_CHANGED, tick_listener)
+
+        start = timer()
+
+        for _ in range(ticks):
+            hass.bus.async_fire(EVENT_TIME_CHANGED, event_data)
+
+        await event.wait()
+
+        runtime = timer() - start
+        total += runtime
+        print(
+            f"{pending} pending timers: {runtime / ticks * 10 ** 6:.1f}us "
+            "overhead per second"
+        )
+
+        unsub_tick()
+        for unsub in unsubs:
+            unsub()
+
+    return total
+
+
 @benchmark
 async def async_million_state_changed_helper(hass):
+    """Run a million events through state changed helper."""
+    return await _async_state_changed_helper(hass, 0)
+
+
+@benchmark
+async def async_million_state_changed_helper_unrelated(hass):
+    """Run a million events through state changed helper with 5000 trackers."""
+    return await _async_state_changed_helper(hass, 5000)
+
+
+async def _async_state_changed_helper(hass, unrelated_trackers):
     """Run a million events through state changed helper."""
     count = 0
     entity_id = "light.kitchen"
@@ -122,6 +221,15 @@ async def async_million_state_changed_helper(hass):
         if count == 10 ** 6:
             event.set()
 
+    @core.callback
+    def unrelated_listener(*args):
+        """Handle event of an unrelated entity."""
+
+    for idx in range(unrelated_trackers):
+        hass.helpers.event.async_track_state_change(
+            f"light.unrelated_{idx}", unrelated_listener
+        )
+
     hass.helpers.event.async_track_state_change(entity_id, listener, "off", "on")
     event_data = {
         "entity_id": entity_id,
@@ -186,3 +294,31 @@ def _logbook_filtering(hass, last_changed, last_updated):
     list(logbook.humanify(None, yield_events(event)))
 
     return timer() - start
+
+
+@benchmark
+@asyncio.coroutine
+def recorder_decode_states(hass):
+    """Decode a million rows of the states table."""
+    from homeassistant.components.recorder.models import decode_states
+
+    moment = datetime(2019, 10, 1, 12, 0)
+    rows = [
+        (
+            f"sensor.power_{index % 100}",
+            str(index % 1000),
+            '{"unit_of_measurement": "W", "friendly_name": "Power %d"}' % (index % 100),
+            moment,
+            moment + timedelta(seconds=index),
+            f"context_{index // 10}",
+            None,
+        )
+        for index in range(10 ** 6)
+    ]
+
+    start = timer()
+
+    for _ in decode_states(rows):
+        pass
+
+    return timer() - start
@@ -18,6 +18,7 @@ from typing import (
     Union,  # noqa
     Iterable,
     Coroutine,
+    Sequence,
 )
 
 import slugify as unicode_slug
@@ -119,6 +120,13 @@ def get_random_string(length: int = 10) -> str:
     return "".join(generator.choice(source_chars) for _ in range(length))
 
 
+def percentile(values: Sequence[T], fraction: float) -> Optional[T]:
+    """Return the nearest rank percentile of sorted values, None if empty."""
+    if not values:
+        return None
+    return values[round((len(values) - 1) * fraction)]
+
+
 class OrderedEnum(enum.Enum):
     """Taken from Python 3.4.0 docs."""
 
@@ -18,6 +18,7 @@ from homeassistant.const import (
     ATTR_FRIENDLY_NAME,
 )
 import homeassistant.components.group as group
+from homeassistant.helpers.event import DATA_STATE_CHANGE_DISPATCHER
 
 from tests.common import get_test_home_assistant, assert_setup_component
 from tests.components.group import common
@@ -416,7 +417,13 @@ class TestComponentsGroup(unittest.TestCase):
             "group.second_group",
             "group.test_group",
         ]
-        assert self.hass.bus.listeners["state_changed"] == 3
+        assert self.hass.data[DATA_STATE_CHANGE_DISPATCHER].async_listeners() == {
+            "light.bowl": 1,
+            "hello.world": 1,
+            "sensor.happy": 1,
+            "test.one": 1,
+            "test.two": 1,
+        }
 
         with patch(
             "homeassistant.config.load_yaml_config_file",
@@ -438,7 +445,11 @@ class TestComponentsGroup(unittest.TestCase):
             "group.all_tests",
             "group.hello",
         ]
-        assert self.hass.bus.listeners["state_changed"] == 2
+        assert self.hass.data[DATA_STATE_CHANGE_DISPATCHER].async_listeners() == {
+            "light.bowl": 1,
+            "test.one": 1,
+            "test.two": 1,
+        }
 
     def test_changing_group_visibility(self):
         """Test that a group can be hidden and shown."""
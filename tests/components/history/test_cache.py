@@ -0,0 +1,67 @@
+"""The tests for the history cache."""
+from datetime import datetime, timedelta
+
+from homeassistant.components.history.cache import (
+    CachedBucket,
+    HistoryCache,
+    bucket_start,
+)
+import homeassistant.util.dt as dt_util
+
+START = datetime(2019, 10, 1, 12, 0, tzinfo=dt_util.UTC)
+
+
+def test_bucket_start():
+    """Test buckets start on the hour."""
+    assert bucket_start(START) == START
+    assert bucket_start(START + timedelta(minutes=59, seconds=59)) == START
+
+
+def test_extend_bucket():
+    """Test extending a bucket leaves the cached bucket alone."""
+    bucket = CachedBucket(START + timedelta(minutes=10), {"light.kitchen": ["ab"]})
+    extended = bucket.extend(
+        START + timedelta(minutes=20), {"light.kitchen": ["cd"], "light.hall": ["e"]}
+    )
+
+    assert bucket.fragments == {"light.kitchen": ["ab"]}
+    assert bucket.size == 2
+    assert extended.until == START + timedelta(minutes=20)
+    assert extended.fragments == {"light.kitchen": ["ab", "cd"], "light.hall": ["e"]}
+    assert extended.size == 5
+
+
+def test_cache_evicts_least_recently_used():
+    """Test the cache stays within its size."""
+    cache = HistoryCache(10)
+
+    def bucket(size):
+        """Return a bucket of size bytes."""
+        return CachedBucket(START, {"light.kitchen": ["x" * size]})
+
+    assert cache.get("a") is None
+    cache.set("a", bucket(4))
+    cache.set("b", bucket(4))
+    assert cache.get("a") is not None
+    cache.set("c", bucket(4))
+
+    assert cache.get("b") is None
+    assert cache.get("a") is not None
+    assert cache.get("c") is not None
+    assert cache.size == 8
+
+    # Buckets that do not fit are not cached
+    cache.set("d", bucket(11))
+    assert cache.get("d") is None
+
+    assert cache.as_dict() == {
+        "buckets": 2,
+        "size": 8,
+        "max_size": 10,
+        "hits": 3,
+        "misses": 3,
+    }
+
+    cache.clear()
+    assert cache.get("a") is None
+    assert cache.size == 0
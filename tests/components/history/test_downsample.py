@@ -0,0 +1,75 @@
+"""The tests for the downsampling of history."""
+from datetime import datetime, timedelta
+
+from homeassistant.components.history.downsample import downsample, lttb
+from homeassistant.const import ATTR_UNIT_OF_MEASUREMENT
+import homeassistant.core as ha
+import homeassistant.util.dt as dt_util
+
+START = datetime(2019, 10, 1, 12, 0, tzinfo=dt_util.UTC)
+ATTRIBUTES = {ATTR_UNIT_OF_MEASUREMENT: "W"}
+
+
+def _state(state, seconds, attributes=ATTRIBUTES):
+    """Return a state of the test sensor."""
+    moment = START + timedelta(seconds=seconds)
+    return ha.State("sensor.power", state, attributes, moment, moment)
+
+
+def test_lttb_keeps_peaks():
+    """Test the points that stand out are kept."""
+    points = [(float(x), 0.0) for x in range(100)]
+    points[30] = (30.0, 50.0)
+    points[70] = (70.0, -50.0)
+
+    kept = lttb(points, 10)
+    assert len(kept) == 10
+    assert kept[0] == 0
+    assert kept[-1] == 99
+    assert 30 in kept
+    assert 70 in kept
+    assert kept == sorted(kept)
+
+
+def test_lttb_below_threshold():
+    """Test all points are kept when there are not more than the threshold."""
+    points = [(float(x), float(x)) for x in range(5)]
+    assert lttb(points, 5) == [0, 1, 2, 3, 4]
+    assert lttb(points, 2) == [0, 1, 2, 3, 4]
+
+
+def test_downsample_numeric():
+    """Test numeric states are reduced and other states are kept."""
+    states = [_state(str(seconds % 7), seconds) for seconds in range(1000)]
+    states[500] = _state("unavailable", 500)
+
+    result = downsample(states, 50)
+    assert len(result) == 50
+    assert result[0] is states[0]
+    assert result[-1] is states[-1]
+    assert states[500] in result
+    assert [state.last_changed for state in result] == sorted(
+        state.last_changed for state in result
+    )
+
+
+def test_downsample_minimal():
+    """Test the pairs of a minimal response are reduced."""
+    states = [_state("1", 0)] + [
+        (str(seconds % 7), (START + timedelta(seconds=seconds)).timestamp())
+        for seconds in range(1, 1000)
+    ]
+
+    result = downsample(states, 20)
+    assert len(result) == 20
+    assert result[0] is states[0]
+    assert result[-1] is states[-1]
+
+
+def test_downsample_passes_through():
+    """Test entities that are not graphed as numbers are not reduced."""
+    states = [_state("on", seconds, {}) for seconds in range(100)]
+    assert downsample(states, 10) is states
+
+    states = [_state("1", seconds) for seconds in range(10)]
+    assert downsample(states, 10) is states
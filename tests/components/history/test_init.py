@@ -6,6 +6,7 @@ from unittest.mock import patch, sentinel
 
 from homeassistant.setup import setup_component, async_setup_component
 import homeassistant.core as ha
+from homeassistant.const import EVENT_STATE_CHANGED, EVENT_TIME_CHANGED
 import homeassistant.util.dt as dt_util
 from homeassistant.components import history, recorder
 
@@ -107,6 +108,68 @@ class TestComponentHistory(unittest.TestCase):
         # Test get_state here because we have a DB setup
         assert states[0] == history.get_state(self.hass, future, states[0].entity_id)
 
+    def test_get_states_from_snapshot(self):
+        """Test getting states starts at the latest checkpoint of the run."""
+        from homeassistant.components.recorder.models import StateSnapshots
+        from homeassistant.components.recorder.util import session_scope
+
+        self.init_recorder()
+        start = dt_util.utcnow()
+        checkpoint = start + timedelta(hours=1)
+
+        with patch(
+            "homeassistant.components.recorder.dt_util.utcnow",
+            return_value=start + timedelta(seconds=1),
+        ):
+            for entity_id in ("test.a", "test.b", "test.c"):
+                self.hass.states.set(entity_id, "1")
+            self.wait_recording_done()
+
+        self.hass.bus.fire(EVENT_TIME_CHANGED, {"now": checkpoint})
+        self.wait_recording_done()
+
+        with session_scope(hass=self.hass) as session:
+            assert {
+                snapshot.entity_id
+                for snapshot in session.query(StateSnapshots).filter(
+                    StateSnapshots.created == checkpoint
+                )
+            } == {"test.a", "test.b", "test.c"}
+
+        with patch(
+            "homeassistant.components.recorder.dt_util.utcnow",
+            return_value=checkpoint + timedelta(minutes=1),
+        ):
+            self.hass.states.set("test.b", "2")
+            self.wait_recording_done()
+
+        def get_states(point_in_time, entity_ids=None):
+            """Return the states at point_in_time by entity id."""
+            return {
+                state.entity_id: state.state
+                for state in history.get_states(self.hass, point_in_time, entity_ids)
+            }
+
+        assert get_states(checkpoint - timedelta(seconds=1)) == {
+            "test.a": "1",
+            "test.b": "1",
+            "test.c": "1",
+        }
+        assert get_states(checkpoint + timedelta(seconds=30)) == {
+            "test.a": "1",
+            "test.b": "1",
+            "test.c": "1",
+        }
+        assert get_states(checkpoint + timedelta(minutes=2)) == {
+            "test.a": "1",
+            "test.b": "2",
+            "test.c": "1",
+        }
+        assert get_states(checkpoint + timedelta(minutes=2), ["test.b", "test.c"]) == {
+            "test.b": "2",
+            "test.c": "1",
+        }
+
     def test_state_changes_during_period(self):
         """Test state change during period."""
         self.init_recorder()
@@ -196,6 +259,40 @@ class TestComponentHistory(unittest.TestCase):
         )
         assert states == hist
 
+    def test_get_significant_states_minimal_response(self):
+        """Test only the first state of an entity is a full state."""
+        zero, four, states = self.record_states()
+        hist = history.get_significant_states(
+            self.hass, zero, four, filters=history.Filters(), minimal_response=True
+        )
+
+        def change(state):
+            """Return the minimal form of a state change."""
+            return (state.state, state.last_changed.timestamp())
+
+        mp = "media_player.test"
+        therm = "thermostat.test"
+        assert hist[mp] == [states[mp][0], change(states[mp][1]), change(states[mp][2])]
+        # Changes of only the attributes are left out
+        assert hist[therm][:2] == [states[therm][0], change(states[therm][1])]
+        assert hist["media_player.test2"] == states["media_player.test2"]
+        assert hist["thermostat.test2"] == states["thermostat.test2"]
+        assert (
+            hist["script.can_cancel_this_one"] == states["script.can_cancel_this_one"]
+        )
+        assert "script.cannot_cancel_this_one" not in hist
+
+        # With a state at the start time all changes are minimal
+        hist = history.get_significant_states(
+            self.hass,
+            zero + timedelta(seconds=1, milliseconds=500),
+            four,
+            [mp],
+            minimal_response=True,
+        )
+        assert hist[mp][0].state == "YouTube"
+        assert hist[mp][1:] == [change(states[mp][2])]
+
     def test_get_significant_states_with_initial(self):
         """Test that only significant states are returned.
 
@@ -526,6 +623,83 @@ class TestComponentHistory(unittest.TestCase):
         )
         assert list(hist.keys()) == entity_ids
 
+    def test_get_significant_states_statistics(self):
+        """Test long periods use the statistics of numeric entities."""
+        from homeassistant.components.recorder.models import (
+            StateAttributes,
+            States,
+            Statistics,
+            StatisticsShortTerm,
+        )
+
+        self.init_recorder()
+        now = dt_util.utcnow()
+        self.hass.states.set("sensor.power", "12", {"unit_of_measurement": "W"})
+        self.hass.states.set("light.kitchen", "on")
+        self.wait_recording_done()
+
+        with recorder.session_scope(hass=self.hass) as session:
+            attributes = StateAttributes(
+                hash=0, shared_attrs='{"unit_of_measurement": "W"}'
+            )
+            for table, mean in ((StatisticsShortTerm, 10.0), (Statistics, 11.0)):
+                session.add(
+                    table(
+                        domain="sensor",
+                        entity_id="sensor.power",
+                        start=now - timedelta(hours=1),
+                        mean=mean,
+                        min=mean,
+                        max=mean,
+                        last=mean,
+                        state_attributes=attributes,
+                    )
+                )
+            # Raw states from before the statistics and within their hour
+            for state, age in (("8", timedelta(hours=2)), ("9", timedelta(minutes=30))):
+                session.add(
+                    States(
+                        domain="sensor",
+                        entity_id="sensor.power",
+                        state=state,
+                        last_changed=now - age,
+                        last_updated=now - age,
+                        state_attributes=attributes,
+                    )
+                )
+
+        def significant_states(days, **kwargs):
+            """Return the significant states of the last days."""
+            hist = history.get_significant_states(
+                self.hass,
+                now - timedelta(days=days),
+                now + timedelta(seconds=1),
+                filters=history.Filters(),
+                **kwargs,
+            )
+            return {
+                entity_id: [
+                    state.state if isinstance(state, ha.State) else state[0]
+                    for state in states
+                ]
+                for entity_id, states in hist.items()
+            }
+
+        expected = {"light.kitchen": ["on"]}
+        assert significant_states(1) == dict(
+            expected, **{"sensor.power": ["8", "9", "12"]}
+        )
+        # Only the raw states within the span of the statistics are left out
+        assert significant_states(4) == dict(
+            expected, **{"sensor.power": ["8", "10.0", "9", "12"]}
+        )
+        assert significant_states(40) == dict(
+            expected, **{"sensor.power": ["8", "11.0", "12"]}
+        )
+        assert significant_states(40, minimal_response=True) == dict(
+            expected, **{"sensor.power": ["8", "11.0", "12"]}
+        )
+
     def check_significant_states(self, zero, four, states, config):
         """Check if significant states are retrieved."""
         filters = history.Filters()
@@ -650,3 +824,280 @@ async def test_fetch_period_api_with_include_order(hass, hass_client):
         params={"filter_entity_id": "non.existing,something.else"},
     )
     assert response.status == 200
+
+
+async def test_fetch_period_api_stream(hass, hass_client):
+    """Test the fetch period view streams the same history."""
+    await hass.async_add_job(init_recorder_component, hass)
+    await async_setup_component(hass, "history", {})
+    instance = hass.data[recorder.DATA_INSTANCE]
+
+    hass.states.async_set("light.kitchen", "on")
+    hass.states.async_set("sensor.unchanged", "1")
+    await hass.async_block_till_done()
+    await hass.async_add_job(instance.block_till_done)
+
+    start = dt_util.utcnow()
+    hass.states.async_set("light.kitchen", "off")
+    hass.states.async_set("light.hall", "on")
+    hass.states.async_set("light.kitchen", "on")
+    await hass.async_block_till_done()
+    await hass.async_add_job(instance.block_till_done)
+
+    client = await hass_client()
+    url = "/api/history/period/{}".format(start.isoformat())
+    response = await client.get(url)
+    assert response.status == 200
+    expected = await response.json()
+
+    response = await client.get(url, params={"stream": ""})
+    assert response.status == 200
+    assert response.content_type == "application/json"
+    result = await response.json()
+
+    assert len(result) == len(expected) == 3
+    assert sorted(result, key=lambda states: states[0]["entity_id"]) == sorted(
+        expected, key=lambda states: states[0]["entity_id"]
+    )
+    assert [
+        state["state"]
+        for states in result
+        for state in states
+        if state["entity_id"] == "light.kitchen"
+    ] == ["on", "off", "on"]
+
+    response = await client.get(
+        url, params={"stream": "", "filter_entity_id": "non.existing"}
+    )
+    assert response.status == 200
+    assert await response.json() == []
+
+
+async def test_ws_get_history_period(hass, hass_ws_client):
+    """Test the history period websocket command."""
+    await hass.async_add_job(init_recorder_component, hass)
+    await async_setup_component(hass, "history", {})
+    start = dt_util.utcnow()
+    hass.states.async_set("light.kitchen", "on", {"brightness": 100})
+    hass.states.async_set("light.kitchen", "off")
+    await hass.async_block_till_done()
+    await hass.async_add_job(hass.data[recorder.DATA_INSTANCE].block_till_done)
+
+    client = await hass_ws_client(hass)
+    await client.send_json(
+        {
+            "id": 5,
+            "type": "history/period",
+            "start_time": start.isoformat(),
+            "entity_ids": ["light.kitchen"],
+            "minimal_response": True,
+        }
+    )
+    msg = await client.receive_json()
+
+    assert msg["success"]
+    first, change = msg["result"]["light.kitchen"]
+    assert first["state"] == "on"
+    assert first["attributes"] == {"brightness": 100}
+    assert change == ["off", hass.states.get("light.kitchen").last_changed.timestamp()]
+
+
+async def test_fetch_period_api_max_points(hass, hass_client):
+    """Test the fetch period view downsamples numeric entities."""
+    await hass.async_add_job(init_recorder_component, hass)
+    await async_setup_component(hass, "history", {})
+    start = dt_util.utcnow()
+    for value in range(20):
+        hass.states.async_set("sensor.power", value, {"unit_of_measurement": "W"})
+        hass.states.async_set("light.kitchen", "on" if value % 2 else "off")
+    await hass.async_block_till_done()
+    await hass.async_add_job(hass.data[recorder.DATA_INSTANCE].block_till_done)
+
+    client = await hass_client()
+    url = "/api/history/period/{}".format(start.isoformat())
+    for params in ({"max_points": "5"}, {"max_points": "5", "stream": ""}):
+        response = await client.get(url, params=params)
+        assert response.status == 200
+        result = {states[0]["entity_id"]: states for states in await response.json()}
+        assert len(result["sensor.power"]) == 5
+        assert len(result["light.kitchen"]) == 20
+
+    response = await client.get(url, params={"max_points": "2"})
+    assert response.status == 400
+
+
+async def test_fetch_period_api_cache(hass, hass_client):
+    """Test the fetch period view caches settled buckets."""
+    await hass.async_add_job(init_recorder_component, hass)
+    await async_setup_component(hass, "history", {})
+    instance = hass.data[recorder.DATA_INSTANCE]
+    now = dt_util.utcnow()
+
+    async def set_state(state, moment):
+        """Set the state of the light at moment."""
+        with patch("homeassistant.core.dt_util.utcnow", return_value=moment):
+            hass.states.async_set("light.kitchen", state)
+        await hass.async_block_till_done()
+        await hass.async_add_job(instance.block_till_done)
+
+    await set_state("on", now - timedelta(hours=3))
+    await set_state("off", now - timedelta(hours=2))
+
+    client = await hass_client()
+    url = "/api/history/period/{}".format((now - timedelta(hours=4)).isoformat())
+    # A + in the query string is a space
+    params = {"end_time": now.isoformat().replace("+00:00", "Z")}
+    response = await client.get(url, params=params)
+    assert response.status == 200
+    expected = await response.json()
+    assert [state["state"] for state in expected[0]] == ["on", "off"]
+
+    # Buckets are cached until shortly before the last committed state, so
+    # the states committed later are read and cached buckets are not read again
+    assert instance.committed_until == now - timedelta(hours=2)
+    await set_state("unavailable", now - timedelta(hours=2, minutes=30))
+    await set_state("idle", now - timedelta(hours=1, minutes=59))
+    await set_state("on", now - timedelta(seconds=10))
+    response = await client.get(url, params=params)
+    result = await response.json()
+    assert [state["state"] for state in result[0]] == ["on", "off", "idle", "on"]
+
+    info = hass.data[history.DATA_CACHE].as_dict()
+    assert info["hits"] > 0
+    assert info["misses"] > 0
+    assert info["size"] > 0
+
+    # A purge may remove cached states
+    hass.bus.async_fire("recorder_purge_progress", {"done": True})
+    await hass.async_block_till_done()
+    response = await client.get(url, params=params)
+    result = await response.json()
+    assert [state["state"] for state in result[0]] == [
+        "on",
+        "unavailable",
+        "off",
+        "idle",
+        "on",
+    ]
+
+
+async def test_ws_get_cache_info(hass, hass_ws_client):
+    """Test the history cache info websocket command."""
+    await hass.async_add_job(init_recorder_component, hass)
+    await async_setup_component(hass, "history", {})
+
+    client = await hass_ws_client(hass)
+    await client.send_json({"id": 5, "type": "history/cache_info"})
+    msg = await client.receive_json()
+
+    assert msg["success"]
+    assert msg["result"] == {
+        "buckets": 0,
+        "size": 0,
+        "max_size": 16 * 1024 * 1024,
+        "hits": 0,
+        "misses": 0,
+    }
+
+
+async def test_ws_stream_history(hass, hass_ws_client):
+    """Test the history stream sends the history and then new states."""
+    await hass.async_add_job(init_recorder_component, hass)
+    await async_setup_component(hass, "history", {})
+    start = dt_util.utcnow()
+    hass.states.async_set("light.kitchen", "on", {"brightness": 100})
+    hass.states.async_set("light.hall", "on")
+    await hass.async_block_till_done()
+
+    client = await hass_ws_client(hass)
+    await client.send_json(
+        {
+            "id": 5,
+            "type": "history/stream",
+            "start_time": start.isoformat(),
+            "entity_ids": ["light.kitchen"],
+            "minimal_response": True,
+        }
+    )
+    msg = await client.receive_json()
+    assert msg["success"]
+
+    msg = await client.receive_json()
+    assert msg["type"] == "event"
+    history = msg["event"]["states"]
+    assert list(history) == ["light.kitchen"]
+    assert history["light.kitchen"][0]["state"] == "on"
+
+    # Changes of only the attributes are not sent with a minimal response
+    hass.states.async_set("light.kitchen", "on", {"brightness": 50})
+    hass.states.async_set("light.hall", "off")
+    hass.states.async_set("light.kitchen", "off")
+
+    msg = await client.receive_json()
+    assert msg["event"]["states"] == {
+        "light.kitchen": [
+            ["off", hass.states.get("light.kitchen").last_changed.timestamp()]
+        ]
+    }
+
+    await client.send_json({"id": 6, "type": "unsubscribe_events", "subscription": 5})
+    msg = await client.receive_json()
+    assert msg["id"] == 6
+    assert msg["success"]
+
+
+async def test_ws_stream_history_read_error(hass, hass_ws_client):
+    """Test the history stream stops when the history cannot be read."""
+    await hass.async_add_job(init_recorder_component, hass)
+    await async_setup_component(hass, "history", {})
+    start = dt_util.utcnow()
+    listeners = hass.bus.async_listeners().get(EVENT_STATE_CHANGED, 0)
+
+    client = await hass_ws_client(hass)
+    with patch(
+        "homeassistant.components.history.get_significant_states",
+        side_effect=ValueError("broken"),
+    ):
+        await client.send_json(
+            {"id": 5, "type": "history/stream", "start_time": start.isoformat()}
+        )
+        msg = await client.receive_json()
+        assert msg["success"]
+
+        msg = await client.receive_json()
+        assert msg["id"] == 5
+        assert not msg["success"]
+        assert msg["error"]["code"] == "unknown_error"
+
+    # The subscription is gone, so new states are no longer kept
+    assert hass.bus.async_listeners().get(EVENT_STATE_CHANGED, 0) == listeners
+    await client.send_json({"id": 6, "type": "unsubscribe_events", "subscription": 5})
+    msg = await client.receive_json()
+    assert msg["id"] == 6
+    assert not msg["success"]
+
+
+async def test_ws_stream_history_filters(hass, hass_ws_client):
+    """Test the history stream applies the filters of history."""
+    await hass.async_add_job(init_recorder_component, hass)
+    await async_setup_component(
+        hass, "history", {"history": {"exclude": {"domains": ["sensor"]}}}
+    )
+    start = dt_util.utcnow()
+
+    client = await hass_ws_client(hass)
+    await client.send_json(
+        {"id": 5, "type": "history/stream", "start_time": start.isoformat()}
+    )
+    msg = await client.receive_json()
+    assert msg["success"]
+    msg = await client.receive_json()
+    assert msg["event"]["states"] == {}
+
+    hass.states.async_set("sensor.power", "10")
+    hass.states.async_set("zone.home", "zoning")
+    hass.states.async_set("light.kitchen", "on")
+
+    msg = await client.receive_json()
+    assert list(msg["event"]["states"]) == ["light.kitchen"]
+    assert msg["event"]["states"]["light.kitchen"][0]["state"] == "on"
@@ -25,6 +25,8 @@ from homeassistant.const import (
 )
 import homeassistant.util.dt as dt_util
 from homeassistant.components import logbook, recorder
+from homeassistant.components.recorder.models import Events, States
+from homeassistant.components.recorder.util import session_scope
 from homeassistant.components.alexa.smart_home import EVENT_ALEXA_SMART_HOME
 from homeassistant.components.homekit.const import (
     ATTR_DISPLAY_NAME,
@@ -1251,6 +1253,34 @@ async def test_logbook_view(hass, hass_client):
     assert response.status == 200
 
 
+async def test_logbook_view_slim_state_events(hass, hass_client):
+    """Test the logbook view with slim state_changed events."""
+    await hass.async_add_job(
+        init_recorder_component, hass, {recorder.CONF_SLIM_STATE_EVENTS: True}
+    )
+    await async_setup_component(hass, "logbook", {})
+    await hass.async_add_job(hass.data[recorder.DATA_INSTANCE].block_till_done)
+
+    entity_id_test = "switch.test"
+    hass.states.async_set(entity_id_test, STATE_OFF)
+    hass.states.async_set(entity_id_test, STATE_ON)
+    hass.states.async_set(entity_id_test, STATE_ON, {"attr": "changed"})
+    hass.states.async_remove(entity_id_test)
+    await hass.async_block_till_done()
+    await hass.async_add_job(hass.data[recorder.DATA_INSTANCE].block_till_done)
+
+    client = await hass_client()
+    start = dt_util.utcnow().date()
+    start_date = datetime(start.year, start.month, start.day)
+
+    response = await client.get("/api/logbook/{}".format(start_date.isoformat()))
+    assert response.status == 200
+    json = await response.json()
+    assert len(json) == 1
+    assert json[0]["entity_id"] == entity_id_test
+    assert json[0]["message"] == "turned on"
+
+
 async def test_logbook_view_period_entity(hass, hass_client):
     """Test the logbook view with period and entity."""
     await hass.async_add_job(init_recorder_component, hass)
@@ -1487,3 +1517,144 @@ async def test_humanify_script_started_event(hass):
     assert event2["domain"] == "script"
     assert event2["message"] == "started"
     assert event2["entity_id"] == "script.bye"
+
+
+async def test_get_events_filtered_in_query(hass):
+    """Test the states are filtered by the query like _keep_event does."""
+    await hass.async_add_job(init_recorder_component, hass)
+    await async_setup_component(hass, "logbook", {})
+    await hass.async_add_job(hass.data[recorder.DATA_INSTANCE].block_till_done)
+    start = dt_util.utcnow()
+
+    for entity_id, attributes in (
+        ("switch.shown", {"friendly_name": "Shown switch"}),
+        ("switch.hidden", {ATTR_HIDDEN: True}),
+        ("switch.excluded", {}),
+        ("light.excluded_domain", {}),
+        ("sensor.power", {"unit_of_measurement": "W"}),
+        ("group.all_switches", {"auto": True}),
+    ):
+        hass.states.async_set(entity_id, STATE_OFF, attributes)
+        hass.states.async_set(entity_id, STATE_ON, attributes)
+    hass.states.async_set("switch.shown", STATE_ON, {"brightness": 10})
+    logbook.async_log_entry(hass, "Alarm", "is armed", entity_id="light.excluded")
+    logbook.async_log_entry(hass, "Alarm", "is armed", entity_id="alarm.home")
+    await hass.async_block_till_done()
+    await hass.async_add_job(hass.data[recorder.DATA_INSTANCE].block_till_done)
+
+    config = logbook.CONFIG_SCHEMA(
+        {
+            logbook.DOMAIN: {
+                logbook.CONF_EXCLUDE: {
+                    logbook.CONF_ENTITIES: ["switch.excluded"],
+                    logbook.CONF_DOMAINS: ["light"],
+                }
+            }
+        }
+    )
+    entries = await hass.async_add_job(
+        logbook._get_events,
+        hass,
+        config[logbook.DOMAIN],
+        start,
+        start + timedelta(hours=1),
+    )
+
+    assert [(entry["entity_id"], entry["message"]) for entry in entries] == [
+        ("switch.shown", "turned on"),
+        ("alarm.home", "is armed"),
+    ]
+    assert entries[0]["name"] == "Shown switch"
+    assert entries[0]["domain"] == "switch"
+    assert entries[0]["context_id"] is not None
+
+
+async def test_get_events_nested_and_missing_attributes(hass):
+    """Test only the top level keys of the data and attributes filter states."""
+    await hass.async_add_job(init_recorder_component, hass)
+    await async_setup_component(hass, "logbook", {})
+    await hass.async_add_job(hass.data[recorder.DATA_INSTANCE].block_till_done)
+    start = dt_util.utcnow()
+
+    nested = {
+        "details": {
+            ATTR_HIDDEN: True,
+            "auto": True,
+            "unit_of_measurement": "W",
+            "old_state": None,
+        }
+    }
+    for entity_id in ("sensor.nested", "group.nested", "switch.no_attributes"):
+        hass.states.async_set(entity_id, STATE_OFF, nested)
+        hass.states.async_set(entity_id, STATE_ON, nested)
+    await hass.async_block_till_done()
+    await hass.async_add_job(hass.data[recorder.DATA_INSTANCE].block_till_done)
+
+    def remove_attributes():
+        """Remove the attributes of the states of switch.no_attributes."""
+        with session_scope(hass=hass) as session:
+            session.query(States).filter_by(entity_id="switch.no_attributes").update(
+                {"attributes": None, "attributes_id": None}
+            )
+
+    await hass.async_add_job(remove_attributes)
+
+    entries = await hass.async_add_job(
+        logbook._get_events, hass, {}, start, start + timedelta(hours=1)
+    )
+
+    assert [(entry["entity_id"], entry["message"]) for entry in entries] == [
+        ("sensor.nested", "turned on"),
+        ("group.nested", "turned on"),
+        ("switch.no_attributes", "turned on"),
+    ]
+    assert entries[2]["name"] == "no attributes"
+
+
+async def test_logbook_view_pagination(hass, hass_client):
+    """Test the logbook view returns pages that continue from a cursor."""
+    await hass.async_add_job(init_recorder_component, hass)
+    await async_setup_component(hass, "logbook", {})
+    await hass.async_add_job(hass.data[recorder.DATA_INSTANCE].block_till_done)
+
+    start = datetime(2019, 10, 1, 12, 0, tzinfo=dt_util.UTC)
+
+    def add_entries():
+        """Add logbook entries to the database."""
+        with session_scope(hass=hass) as session:
+            for index, minutes in enumerate((1, 2, 20, 40, 61)):
+                event = ha.Event(
+                    logbook.EVENT_LOGBOOK_ENTRY,
+                    {ATTR_NAME: f"entry {index}", logbook.ATTR_MESSAGE: "logged"},
+                    time_fired=start + timedelta(minutes=minutes),
+                )
+                session.add(Events.from_event(event))
+
+    await hass.async_add_job(add_entries)
+    client = await hass_client()
+    url = "/api/logbook/{}".format(start.isoformat().replace("+00:00", "Z"))
+
+    response = await client.get(url)
+    assert response.status == 200
+    assert [entry["name"] for entry in await response.json()] == [
+        f"entry {index}" for index in range(5)
+    ]
+
+    # The entries in the group of the last one are on the same page
+    pages = []
+    params = {"limit": 1}
+    while True:
+        response = await client.get(url, params=params)
+        assert response.status == 200
+        page = await response.json()
+        pages.append([entry["name"] for entry in page["entries"]])
+        if page["next_cursor"] is None:
+            break
+        params["cursor"] = page["next_cursor"]
+
+    assert pages == [["entry 0", "entry 1"], ["entry 2"], ["entry 3"], ["entry 4"]]
+
+    response = await client.get(url, params={"limit": 0})
+    assert response.status == 400
+    response = await client.get(url, params={"cursor": "invalid"})
+    assert response.status == 400
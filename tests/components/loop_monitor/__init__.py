@@ -0,0 +1 @@
+"""Tests for the loop monitor integration."""
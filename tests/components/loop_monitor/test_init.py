@@ -0,0 +1,83 @@
+"""Tests for the loop monitor integration."""
+import asyncio
+import time
+
+from homeassistant.components.loop_monitor import DOMAIN
+from homeassistant.components.loop_monitor.monitor import describe_callback
+from homeassistant.const import EVENT_HOMEASSISTANT_STOP
+from homeassistant.core import callback
+from homeassistant.setup import async_setup_component
+
+
+def _block_loop():
+    """Block the event loop."""
+    time.sleep(0.05)
+
+
+async def _block_loop_async():
+    """Block the event loop from a task."""
+    time.sleep(0.05)
+
+
+async def test_slow_callbacks(hass, hass_ws_client):
+    """Test the slow callbacks and the lag of the loop are reported."""
+    assert await async_setup_component(
+        hass, DOMAIN, {DOMAIN: {"probe_interval": 0.01, "slow_callback_duration": 0.04}}
+    )
+    client = await hass_ws_client(hass)
+
+    hass.loop.call_soon(_block_loop)
+    hass.loop.call_soon(_block_loop)
+    await hass.async_create_task(_block_loop_async())
+    await asyncio.sleep(0.05)
+
+    await client.send_json({"id": 5, "type": "loop_monitor/info"})
+    response = await client.receive_json()
+    assert response["success"]
+    info = response["result"]
+
+    assert info["lag_max"] >= 40
+    slow_callbacks = {slow["callback"]: slow for slow in info["slow_callbacks"]}
+    assert slow_callbacks["_block_loop"]["count"] == 2
+    assert slow_callbacks["_block_loop"]["max"] >= 40
+    assert slow_callbacks["_block_loop_async"]["count"] == 1
+    assert slow_callbacks["_block_loop"]["integration"] == __name__
+
+
+async def test_warning_threshold(hass, caplog):
+    """Test callbacks above the threshold are logged."""
+    assert await async_setup_component(
+        hass,
+        DOMAIN,
+        {DOMAIN: {"slow_callback_duration": 0.01, "warning_threshold": 0.04}},
+    )
+
+    hass.loop.call_soon(_block_loop)
+    await asyncio.sleep(0)
+
+    assert "_block_loop of" in caplog.text
+    assert "blocked the event loop" in caplog.text
+
+
+async def test_stop_restores_handles(hass):
+    """Test the callbacks of the loop are no longer timed after stopping."""
+    original_run = asyncio.events.Handle._run
+    assert await async_setup_component(hass, DOMAIN, {})
+    assert asyncio.events.Handle._run is not original_run
+
+    hass.bus.async_fire(EVENT_HOMEASSISTANT_STOP)
+    await hass.async_block_till_done()
+    assert asyncio.events.Handle._run is original_run
+
+
+def test_describe_callback():
+    """Test the module and name of a callback."""
+
+    @callback
+    def listener():
+        """Mock listener."""
+
+    assert describe_callback(listener) == (
+        __name__,
+        "test_describe_callback.<locals>.listener",
+    )
@@ -0,0 +1,80 @@
+"""Tests for the profiler integration."""
+import os
+import tracemalloc
+
+import pytest
+
+from homeassistant.components.profiler import (
+    DOMAIN,
+    SERVICE_LOG_OBJECT_COUNTS,
+    SERVICE_MEMORY_SNAPSHOT,
+    SERVICE_START,
+    SERVICE_START_MEMORY_TRACE,
+    SERVICE_STOP_MEMORY_TRACE,
+)
+from homeassistant.exceptions import HomeAssistantError
+from homeassistant.setup import async_setup_component
+
+
+@pytest.fixture
+def config_dir(hass, tmpdir):
+    """Write the output of the services to a temporary directory."""
+    hass.config.config_dir = str(tmpdir)
+    return tmpdir
+
+
+def _files(config_dir, prefix):
+    """Return the files in the config dir that start with prefix."""
+    return [name for name in os.listdir(str(config_dir)) if name.startswith(prefix)]
+
+
+async def test_profile(hass, config_dir):
+    """Test profiling writes cProfile and callgrind files."""
+    assert await async_setup_component(hass, DOMAIN, {})
+
+    await hass.services.async_call(DOMAIN, SERVICE_START, {"seconds": 0.01}, True)
+
+    profiles = _files(config_dir, "profile.")
+    assert len(profiles) == 1
+    assert profiles[0].endswith(".prof")
+    assert len(_files(config_dir, "callgrind.out.")) == 1
+
+
+async def test_memory_snapshots(hass, config_dir):
+    """Test memory snapshots while memory is traced."""
+    assert await async_setup_component(hass, DOMAIN, {})
+
+    with pytest.raises(HomeAssistantError):
+        await hass.services.async_call(DOMAIN, SERVICE_MEMORY_SNAPSHOT, {}, True)
+
+    await hass.services.async_call(DOMAIN, SERVICE_START_MEMORY_TRACE, {}, True)
+    try:
+        assert tracemalloc.is_tracing()
+        await hass.services.async_call(DOMAIN, SERVICE_MEMORY_SNAPSHOT, {}, True)
+        await hass.services.async_call(
+            DOMAIN, SERVICE_MEMORY_SNAPSHOT, {"limit": 5}, True
+        )
+    finally:
+        await hass.services.async_call(DOMAIN, SERVICE_STOP_MEMORY_TRACE, {}, True)
+
+    assert not tracemalloc.is_tracing()
+    snapshots = sorted(_files(config_dir, "memory."))
+    assert len(snapshots) == 2
+    assert (
+        "Changes since the previous snapshot"
+        not in config_dir.join(snapshots[0]).read()
+    )
+    assert "Changes since the previous snapshot" in config_dir.join(snapshots[1]).read()
+
+
+async def test_object_counts(hass, config_dir):
+    """Test the object counts are written per integration."""
+    assert await async_setup_component(hass, DOMAIN, {})
+
+    await hass.services.async_call(DOMAIN, SERVICE_LOG_OBJECT_COUNTS, {}, True)
+
+    counts = _files(config_dir, "objects.")
+    assert len(counts) == 1
+    report = config_dir.join(counts[0]).read()
+    assert "Objects per integration:" in report
+    assert "builtins.dict: " in report
@@ -1,17 +1,30 @@
 """The tests for the Recorder component."""
 # pylint: disable=protected-access
+import json
+import threading
 import unittest
 from unittest.mock import patch
 
 import pytest
-
-from homeassistant.core import callback
-from homeassistant.const import MATCH_ALL
-from homeassistant.setup import async_setup_component
-from homeassistant.components.recorder import Recorder
+from sqlalchemy import exc
+
+from homeassistant.core import Event, callback
+from homeassistant.const import EVENT_STATE_CHANGED, EVENT_TIME_CHANGED, MATCH_ALL
+from homeassistant.setup import async_setup_component, setup_component
+from homeassistant.components.recorder import (
+    COMMIT_TASK,
+    Recorder,
+    migration,
+    run_information,
+)
 from homeassistant.components.recorder.const import DATA_INSTANCE
 from homeassistant.components.recorder.util import session_scope
-from homeassistant.components.recorder.models import States, Events
+from homeassistant.components.recorder.models import (
+    Events,
+    RecorderRuns,
+    States,
+    StateAttributes,
+)
 
 from tests.common import get_test_home_assistant, init_recorder_component
 
@@ -189,6 +202,201 @@ def test_saving_state_include_domain_exclude_entity(hass_recorder):
     assert hass.states.get("test.ok").state == "state2"
 
 
+def test_saving_state_batched(hass_recorder):
+    """Test states are committed once the batch is full or on demand."""
+    hass = hass_recorder({"commit_interval": 3600, "max_batch_size": 2})
+    instance = hass.data[DATA_INSTANCE]
+
+    for idx in range(3):
+        hass.states.set(f"test.recorder_{idx}", "on")
+        hass.block_till_done()
+
+    # Wait for the recorder thread without requesting a commit
+    instance.queue.join()
+
+    with session_scope(hass=hass) as session:
+        assert session.query(States).count() == 2
+
+    instance.block_till_done()
+
+    with session_scope(hass=hass) as session:
+        assert session.query(States).count() == 3
+
+
+def test_saving_batch_skips_unserializable_event(hass_recorder):
+    """Test a state is not saved when its event cannot be serialized."""
+    hass = hass_recorder({"commit_interval": 3600})
+    instance = hass.data[DATA_INSTANCE]
+    from_event = Events.from_event
+
+    def failing_from_event(event, slim=False):
+        """Fail to serialize the events of test.bad."""
+        if event.data.get("entity_id") == "test.bad":
+            raise TypeError
+        return from_event(event, slim)
+
+    with patch(
+        "homeassistant.components.recorder.models.Events.from_event",
+        side_effect=failing_from_event,
+    ):
+        # The failing event is the first of the batch
+        for entity_id in ("test.bad", "test.good"):
+            hass.states.set(entity_id, "on")
+            hass.block_till_done()
+        instance.block_till_done()
+
+    with session_scope(hass=hass) as session:
+        db_states = list(session.query(States))
+        assert [state.entity_id for state in db_states] == ["test.good"]
+        event = session.query(Events).get(db_states[0].event_id)
+        assert json.loads(event.event_data)["entity_id"] == "test.good"
+
+
+def test_saving_batch_bisects_failing_rows(hass_recorder):
+    """Test only the events that fail to save are lost from a batch."""
+    hass = hass_recorder({"commit_interval": 3600})
+    instance = hass.data[DATA_INSTANCE]
+    from_event = Events.from_event
+
+    def failing_from_event(event, slim=False):
+        """Fail to save the bad events."""
+        if event.event_type == "bad_event":
+            raise exc.SQLAlchemyError("bad event")
+        return from_event(event, slim)
+
+    with patch(
+        "homeassistant.components.recorder.models.Events.from_event",
+        side_effect=failing_from_event,
+    ):
+        for event_type in ("good_event", "bad_event", "good_event", "good_event"):
+            hass.bus.fire(event_type)
+            hass.block_till_done()
+        instance.block_till_done()
+
+    with session_scope(hass=hass) as session:
+        assert session.query(Events).filter_by(event_type="good_event").count() == 3
+        assert session.query(Events).filter_by(event_type="bad_event").count() == 0
+
+
+def test_saving_state_shared_attributes(hass_recorder):
+    """Test states with the same attributes share the stored attributes."""
+    hass = hass_recorder()
+    instance = hass.data[DATA_INSTANCE]
+
+    for idx in range(3):
+        hass.states.set("test.recorder", f"state{idx}", {"test_attr": 5})
+        hass.block_till_done()
+    hass.states.set("test.recorder", "state3", {"test_attr": 6})
+    hass.block_till_done()
+    instance.block_till_done()
+
+    # Attributes that are no longer cached are looked up in the database
+    instance._attributes_ids.clear()
+    hass.states.set("test.recorder", "state4", {"test_attr": 5})
+    hass.block_till_done()
+    instance.block_till_done()
+
+    with session_scope(hass=hass) as session:
+        assert session.query(StateAttributes).count() == 2
+        db_states = list(session.query(States).order_by(States.state_id))
+        assert len({state.attributes_id for state in db_states}) == 2
+        assert all(state.attributes is None for state in db_states)
+        states = [state.to_native() for state in db_states]
+
+    assert [state.attributes["test_attr"] for state in states] == [5, 5, 5, 6, 5]
+    assert states[-1] == hass.states.get("test.recorder")
+
+
+def test_saving_state_slim(hass_recorder):
+    """Test slim state_changed events are restored from the states table."""
+    hass = hass_recorder({"slim_state_events": True})
+
+    hass.states.set("test.recorder", "on", {"test_attr": 5})
+    hass.block_till_done()
+    old_state = hass.states.get("test.recorder")
+    hass.states.set("test.recorder", "off", {"test_attr": 5})
+    hass.block_till_done()
+    hass.data[DATA_INSTANCE].block_till_done()
+
+    with session_scope(hass=hass) as session:
+        rows = list(
+            session.query(Events, States)
+            .join(States, Events.event_id == States.event_id)
+            .order_by(Events.event_id)
+        )
+        assert [json.loads(row.Events.event_data) for row in rows] == [
+            {"entity_id": "test.recorder", "old_state": None},
+            {"entity_id": "test.recorder"},
+        ]
+        event = rows[1].Events.to_native(rows[1].States)
+        restored = rows[1].Events.to_native(rows[1].States, rows[0].States)
+
+    assert event.data["new_state"] == hass.states.get("test.recorder").as_dict()
+    assert "old_state" not in event.data
+    assert restored.data["new_state"] == event.data["new_state"]
+    assert restored.data["old_state"] == old_state.as_dict()
+
+
+def test_compact_state_changed_events(hass_recorder):
+    """Test compacting stored state_changed events in batches."""
+    hass = hass_recorder()
+    instance = hass.data[DATA_INSTANCE]
+
+    for idx in range(3):
+        hass.states.set("test.recorder", f"state{idx}")
+        hass.block_till_done()
+    hass.bus.fire("test_event", {"new_state": "kept"})
+    hass.block_till_done()
+    instance.block_till_done()
+
+    start_event_id = 0
+    batches = 0
+    while start_event_id is not None:
+        start_event_id = migration.compact_state_changed_events(
+            instance, start_event_id, batch_size=2
+        )
+        batches += 1
+    assert batches == 2
+
+    with session_scope(hass=hass) as session:
+        events = session.query(Events).order_by(Events.event_id)
+        state_changed = [
+            json.loads(event.event_data)
+            for event in events.filter_by(event_type=EVENT_STATE_CHANGED)
+        ]
+        other = events.filter_by(event_type="test_event").one()
+        assert json.loads(other.event_data) == {"new_state": "kept"}
+
+    assert state_changed == [
+        {"entity_id": "test.recorder", "old_state": None},
+        {"entity_id": "test.recorder"},
+        {"entity_id": "test.recorder"},
+    ]
+    assert instance.run_info.compact_state_events
+
+
+def test_compact_state_changed_events_once(hass_recorder):
+    """Test state_changed events are not compacted again once compact."""
+    hass = hass_recorder()
+    instance = hass.data[DATA_INSTANCE]
+    assert not instance.run_info.compact_state_events
+
+    # Events of runs without slim events need compacting
+    instance.slim_state_events = True
+    instance._close_run()
+    instance._setup_run()
+    assert not instance.run_info.compact_state_events
+
+    assert migration.compact_state_changed_events(instance) is None
+    instance._close_run()
+    instance._setup_run()
+    assert instance.run_info.compact_state_events
+
+    with session_scope(hass=hass) as session:
+        runs = session.query(RecorderRuns).order_by(RecorderRuns.run_id)
+        assert [run.compact_state_events for run in runs] == [False, True, True]
+
+
 def test_recorder_setup_failure():
     """Test some exceptions."""
     hass = get_test_home_assistant()
@@ -198,7 +406,19 @@ def test_recorder_setup_failure():
     ):
         setup.side_effect = ImportError("driver not found")
         rec = Recorder(
-            hass, keep_days=7, purge_interval=2, uri="sqlite://", include={}, exclude={}
+            hass,
+            keep_days=7,
+            retention={},
+            purge_interval=2,
+            commit_interval=1,
+            max_batch_size=1000,
+            slim_state_events=False,
+            queue_high_watermark=None,
+            read_pool_size=1,
+            partition_by_day=False,
+            uri="sqlite://",
+            include={},
+            exclude={},
         )
         rec.start()
         rec.join()
@@ -206,6 +426,156 @@ def test_recorder_setup_failure():
     hass.stop()
 
 
+def test_read_engine(tmpdir):
+    """Test reads use a separate, read only, engine for file databases."""
+    hass = get_test_home_assistant()
+    db_url = "sqlite:///{}".format(tmpdir.join("test.db"))
+    assert setup_component(
+        hass, "recorder", {"recorder": {"db_url": db_url, "read_pool_size": 2}}
+    )
+    hass.start()
+    hass.states.set("test.recorder", "on")
+    hass.block_till_done()
+    instance = hass.data[DATA_INSTANCE]
+    instance.block_till_done()
+
+    assert instance.read_engine is not instance.engine
+    assert instance.read_engine.pool.size() == 2
+
+    with session_scope(hass=hass, read_only=True) as session:
+        assert session.bind is instance.read_engine
+        assert [state.state for state in session.query(States)] == ["on"]
+        with pytest.raises(exc.OperationalError):
+            session.execute("DELETE FROM states")
+
+    with session_scope(hass=hass) as session:
+        assert session.bind is instance.engine
+
+    assert run_information(hass).run_id == instance.run_info.run_id
+    hass.stop()
+
+
+def test_queue_high_watermark(caplog):
+    """Test events are dropped when the queue is above the high watermark."""
+    hass = get_test_home_assistant()
+    rec = Recorder(
+        hass,
+        keep_days=7,
+        retention={},
+        purge_interval=2,
+        commit_interval=1,
+        max_batch_size=1000,
+        slim_state_events=False,
+        queue_high_watermark=2,
+        read_pool_size=1,
+        partition_by_day=False,
+        uri="sqlite://",
+        include={},
+        exclude={},
+    )
+    time_changed = Event(EVENT_TIME_CHANGED, {"now": None})
+    other = Event("test_event")
+
+    for event in (other, other, time_changed, other, other, other, time_changed):
+        rec.event_listener(event)
+
+    metrics = rec.async_get_metrics()
+    assert metrics["queue_depth"] == 4
+    assert metrics["peak_queue_depth"] == 4
+    assert metrics["dropped_events"] == 3
+    assert metrics["oldest_event_age"] >= 0
+    assert "dropping events until it is below 2" in caplog.text
+
+    # Once the recorder took the waiting time_changed event from the queue,
+    # the next one is let through even above twice the high watermark
+    rec._time_changed_queued = False
+    rec.event_listener(time_changed)
+    rec.event_listener(other)
+    metrics = rec.async_get_metrics()
+    assert metrics["queue_depth"] == 5
+    assert metrics["dropped_events"] == 4
+
+    while not rec.queue.empty():
+        rec.queue.get_nowait()
+    rec.event_listener(other)
+    assert rec.async_get_metrics()["queue_depth"] == 1
+    assert "The recorder queue is below 2, recording again" in caplog.text
+
+    hass.stop()
+
+
+async def test_wait_committed(hass):
+    """Test waiting until the queued events are committed."""
+    await hass.async_add_job(init_recorder_component, hass)
+    instance = hass.data[DATA_INSTANCE]
+    hass.states.async_set("test.recorder", "on")
+    await hass.async_block_till_done()
+
+    assert await instance.async_wait_committed(10)
+
+    with session_scope(hass=hass) as session:
+        assert session.query(States).count() == 1
+
+    # Nothing commits the events of a recorder that is not running
+    rec = Recorder(
+        hass,
+        keep_days=7,
+        retention={},
+        purge_interval=2,
+        commit_interval=1,
+        max_batch_size=1000,
+        slim_state_events=False,
+        queue_high_watermark=None,
+        read_pool_size=1,
+        partition_by_day=False,
+        uri="sqlite://",
+        include={},
+        exclude={},
+    )
+    assert not await rec.async_wait_committed(0.01)
+
+
+async def test_websocket_metrics(hass, hass_ws_client):
+    """Test the recorder metrics websocket command."""
+    await hass.async_add_job(init_recorder_component, hass)
+    hass.states.async_set("test.recorder", "on")
+    await hass.async_block_till_done()
+    await hass.async_add_job(hass.data[DATA_INSTANCE].block_till_done)
+
+    instance = hass.data[DATA_INSTANCE]
+    blocked = threading.Event()
+    release = threading.Event()
+
+    def block_commit():
+        """Keep the recorder thread from taking events from the queue."""
+        blocked.set()
+        release.wait()
+
+    client = await hass_ws_client(hass)
+    with patch.object(instance, "_commit_pending_events", side_effect=block_commit):
+        instance.queue.put(COMMIT_TASK)
+        await hass.async_add_executor_job(blocked.wait)
+        instance.queue_high_watermark = 2
+        instance.metrics.peak_queue_depth = 0
+        try:
+            # The listeners of the events run before the command is handled
+            for _ in range(5):
+                hass.bus.async_fire("test_event")
+            await client.send_json({"id": 5, "type": "recorder/metrics"})
+            msg = await client.receive_json()
+        finally:
+            release.set()
+
+    assert msg["success"]
+    # The fifth event is dropped at twice the high watermark
+    assert msg["result"]["queue_depth"] == 4
+    assert msg["result"]["peak_queue_depth"] == 4
+    assert msg["result"]["dropped_events"] == 1
+    assert msg["result"]["retries"] == 0
+    assert msg["result"]["rows_per_second"] > 0
+    assert msg["result"]["commit_latency_p50"] is not None
+
+
 async def test_defaults_set(hass):
     """Test the config defaults are set."""
     recorder_config = None
@@ -222,3 +592,12 @@ async def test_defaults_set(hass):
     assert recorder_config is not None
     assert recorder_config["purge_keep_days"] == 10
     assert recorder_config["purge_interval"] == 1
+    assert recorder_config["commit_interval"] == 1
+    assert recorder_config["max_batch_size"] == 1000
+    assert recorder_config["slim_state_events"] is False
+    assert recorder_config["read_pool_size"] == 5
+    assert recorder_config["retention"] == {
+        "domains": {},
+        "entities": {},
+        "entity_globs": {},
+    }
@@ -1,6 +1,6 @@
 """The tests for the Recorder component."""
 import unittest
-from datetime import datetime
+from datetime import datetime, timedelta
 
 from sqlalchemy import create_engine
 from sqlalchemy.orm import scoped_session, sessionmaker
@@ -8,7 +8,15 @@ from sqlalchemy.orm import scoped_session, sessionmaker
 import homeassistant.core as ha
 from homeassistant.const import EVENT_STATE_CHANGED
 from homeassistant.util import dt
-from homeassistant.components.recorder.models import Base, Events, States, RecorderRuns
+from homeassistant.components.recorder.models import (
+    STATE_COLUMNS,
+    Base,
+    Events,
+    RecorderRuns,
+    StateAttributes,
+    States,
+    decode_states,
+)
 
 ENGINE = None
 SESSION = None
@@ -44,6 +52,29 @@ class TestEvents(unittest.TestCase):
         event = ha.Event("test_event", {"some_data": 15})
         assert event == Events.from_event(event).to_native()
 
+    def test_from_event_slim(self):
+        """Test converting a state_changed event to a slim db event."""
+        state = ha.State("sensor.temperature", "18")
+        event = ha.Event(
+            EVENT_STATE_CHANGED,
+            {"entity_id": "sensor.temperature", "old_state": state, "new_state": state},
+            context=state.context,
+        )
+        db_event = Events.from_event(event, slim=True)
+        assert db_event.to_native().data == {"entity_id": "sensor.temperature"}
+
+        native = db_event.to_native(States.from_event(event))
+        assert native.data["new_state"] == state.as_dict()
+
+        event = ha.Event(
+            EVENT_STATE_CHANGED,
+            {"entity_id": "sensor.temperature", "old_state": None, "new_state": state},
+        )
+        assert Events.from_event(event, slim=True).to_native().data == {
+            "entity_id": "sensor.temperature",
+            "old_state": None,
+        }
+
 
 class TestStates(unittest.TestCase):
     """Test States model."""
@@ -159,3 +190,52 @@ def test_states_from_native_invalid_entity_id():
     event.attributes = "{}"
     state = event.to_native()
     assert state.entity_id == "test.invalid__id"
+
+
+def test_decode_states():
+    """Test states decoded from columns equal the converted States objects."""
+    session = SESSION()
+    shared_attrs = '{"unit_of_measurement": "W"}'
+    attributes = StateAttributes(
+        hash=StateAttributes.hash_shared_attrs(shared_attrs), shared_attrs=shared_attrs
+    )
+    session.add(attributes)
+    session.flush()
+
+    moment = datetime(2019, 10, 1, 12, 0)
+    context = ha.Context(user_id="user")
+    for index in range(3):
+        session.add(
+            States(
+                entity_id="sensor.power",
+                state=str(index),
+                attributes_id=attributes.attributes_id,
+                last_changed=moment,
+                last_updated=moment + timedelta(seconds=index),
+                context_id=context.id,
+                context_user_id=context.user_id,
+            )
+        )
+    session.add(
+        States(
+            entity_id="light.kitchen",
+            state="on",
+            attributes='{"brightness": 100}',
+            last_changed=moment,
+            last_updated=moment,
+        )
+    )
+    session.add(States(entity_id="light.broken", state="on", attributes="{"))
+    session.flush()
+
+    query = session.query(States).order_by(States.state_id)
+    expected = [state.to_native() for state in query][:-1]
+    decoded = list(decode_states(query.with_entities(*STATE_COLUMNS)))
+    session.rollback()
+
+    assert decoded == expected
+    assert decoded[0].last_changed.tzinfo is dt.UTC
+    assert decoded[0].context == context
+    assert decoded[0].attributes is decoded[1].attributes
+    assert decoded[0].context is decoded[2].context
+    assert decoded[3].last_changed is decoded[3].last_updated
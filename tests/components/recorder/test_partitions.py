@@ -0,0 +1,78 @@
+"""Test the partitioning of the recorder tables by day."""
+from datetime import date
+from unittest.mock import patch
+
+import pytest
+from sqlalchemy.dialects import postgresql
+from sqlalchemy.schema import CreateTable
+
+from homeassistant.components.recorder import partitions
+from homeassistant.components.recorder.const import DATA_INSTANCE
+from homeassistant.components.recorder.models import Base
+from tests.common import get_test_home_assistant, init_recorder_component
+
+
+@pytest.fixture
+def hass_recorder():
+    """HASS fixture with in-memory recorder."""
+    hass = get_test_home_assistant()
+
+    def setup_recorder(config=None):
+        """Set up with params."""
+        init_recorder_component(hass, config)
+        hass.start()
+        hass.block_till_done()
+        hass.data[DATA_INSTANCE].block_till_done()
+        return hass
+
+    yield setup_recorder
+    hass.stop()
+
+
+def _create_table(metadata, name):
+    """Return the PostgreSQL statement creating a table."""
+    return str(CreateTable(metadata.tables[name]).compile(dialect=postgresql.dialect()))
+
+
+def test_partitioned_metadata():
+    """Test the states and events tables are partitioned by day."""
+    metadata = partitions.partitioned_metadata()
+
+    states = _create_table(metadata, "states")
+    assert "PARTITION BY RANGE (last_updated)" in states
+    assert "PRIMARY KEY (state_id, last_updated)" in states
+    assert "REFERENCES events" not in states
+    assert "REFERENCES state_attributes" in states
+
+    events = _create_table(metadata, "events")
+    assert "PARTITION BY RANGE (time_fired)" in events
+    assert "PRIMARY KEY (event_id, time_fired)" in events
+
+    snapshots = _create_table(metadata, "state_snapshots")
+    assert "PARTITION BY" not in snapshots
+    assert "REFERENCES states" not in snapshots
+
+    assert {index.name for index in metadata.tables["states"].indexes} == {
+        index.name for index in Base.metadata.tables["states"].indexes
+    }
+
+
+def test_partition_names():
+    """Test the name and range of the partition of a day."""
+    assert partitions.create_partition_statement("states", date(2019, 10, 31)) == (
+        "CREATE TABLE IF NOT EXISTS states_p20191031 PARTITION OF states "
+        "FOR VALUES FROM ('2019-10-31T00:00:00+00:00') "
+        "TO ('2019-11-01T00:00:00+00:00')"
+    )
+    assert partitions.partition_day("events_p20191031") == date(2019, 10, 31)
+    assert partitions.partition_day("events_default") is None
+    assert partitions.partition_day("statistics_p20191031") is None
+
+
+def test_partition_by_day_requires_postgresql(hass_recorder):
+    """Test the tables are not partitioned on SQLite."""
+    with patch.object(partitions._LOGGER, "warning") as mock_warning:
+        hass = hass_recorder({"partition_by_day": True})
+
+    assert mock_warning.called
+    assert hass.data[DATA_INSTANCE].partitioned is False
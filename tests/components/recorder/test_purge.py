@@ -1,13 +1,24 @@
 """Test data purging."""
+from collections import defaultdict
 import json
 from datetime import datetime, timedelta
 import unittest
 from unittest.mock import patch
 
 from homeassistant.components import recorder
-from homeassistant.components.recorder.const import DATA_INSTANCE
+import homeassistant.util.dt as dt_util
+from homeassistant.components.recorder.const import (
+    DATA_INSTANCE,
+    EVENT_RECORDER_PURGE_PROGRESS,
+)
 from homeassistant.components.recorder.purge import purge_old_data
-from homeassistant.components.recorder.models import States, Events
+from homeassistant.components.recorder.models import (
+    Events,
+    StateAttributes,
+    States,
+    Statistics,
+    StatisticsShortTerm,
+)
 from homeassistant.components.recorder.util import session_scope
 from tests.common import get_test_home_assistant, init_recorder_component
 
@@ -106,6 +117,215 @@ class TestRecorderPurge(unittest.TestCase):
             # we should only have 2 states left after purging
             assert states.count() == 2
 
+    def test_purge_old_state_attributes(self):
+        """Test deleting attributes no state refers to anymore."""
+        now = datetime.now()
+        eleven_days_ago = now - timedelta(days=11)
+
+        self.hass.block_till_done()
+        self.hass.data[DATA_INSTANCE].block_till_done()
+
+        with session_scope(hass=self.hass) as session:
+            for timestamp, shared_attrs in (
+                (eleven_days_ago, '{"old": true}'),
+                (eleven_days_ago, "{}"),
+                (now, "{}"),
+            ):
+                session.add(
+                    States(
+                        entity_id="test.recorder2",
+                        domain="sensor",
+                        state="on",
+                        last_changed=timestamp,
+                        last_updated=timestamp,
+                        created=timestamp,
+                        state_attributes=session.query(StateAttributes)
+                        .filter_by(shared_attrs=shared_attrs)
+                        .first()
+                        or StateAttributes(hash=0, shared_attrs=shared_attrs),
+                    )
+                )
+                session.flush()
+
+        with session_scope(hass=self.hass) as session:
+            attributes = session.query(StateAttributes)
+            assert attributes.count() == 2
+
+            purge_old_data(self.hass.data[DATA_INSTANCE], 4, repack=False)
+
+            assert [attrs.shared_attrs for attrs in attributes] == ["{}"]
+
+    def test_purge_state_attributes_statistics_without_attributes(self):
+        """Test statistics without attributes do not keep orphans from purging."""
+        now = datetime.now()
+        eleven_days_ago = now - timedelta(days=11)
+
+        self.hass.block_till_done()
+        self.hass.data[DATA_INSTANCE].block_till_done()
+
+        with session_scope(hass=self.hass) as session:
+            session.add(
+                Statistics(entity_id="sensor.other", start=now, attributes_id=None)
+            )
+            session.add(
+                StatisticsShortTerm(
+                    entity_id="sensor.other", start=now, attributes_id=None
+                )
+            )
+            session.add(
+                States(
+                    entity_id="test.recorder2",
+                    domain="sensor",
+                    state="on",
+                    last_changed=eleven_days_ago,
+                    last_updated=eleven_days_ago,
+                    created=eleven_days_ago,
+                    state_attributes=StateAttributes(
+                        hash=0, shared_attrs='{"old": true}'
+                    ),
+                )
+            )
+
+        with session_scope(hass=self.hass) as session:
+            attributes = session.query(StateAttributes).filter_by(
+                shared_attrs='{"old": true}'
+            )
+            assert attributes.count() == 1
+
+            purge_old_data(self.hass.data[DATA_INSTANCE], 4, repack=False)
+
+            assert attributes.count() == 0
+
+    def test_purge_old_short_term_statistics(self):
+        """Test deleting old short term statistics and keeping long term ones."""
+        now = dt_util.utcnow()
+        eleven_days_ago = now - timedelta(days=11)
+
+        self.hass.block_till_done()
+        self.hass.data[DATA_INSTANCE].block_till_done()
+
+        with session_scope(hass=self.hass) as session:
+            old_attributes = StateAttributes(hash=0, shared_attrs='{"old": true}')
+            for table in (StatisticsShortTerm, Statistics):
+                for start, attributes in (
+                    (eleven_days_ago, old_attributes),
+                    (now, StateAttributes(hash=0, shared_attrs="{}")),
+                ):
+                    session.add(
+                        table(
+                            entity_id="sensor.power",
+                            start=start,
+                            state_attributes=attributes,
+                        )
+                    )
+
+        with session_scope(hass=self.hass) as session:
+            purge_old_data(self.hass.data[DATA_INSTANCE], 4, repack=False)
+
+            assert session.query(StatisticsShortTerm).count() == 1
+            assert session.query(Statistics).count() == 2
+            # The attributes are still used by the long term statistics
+            assert (
+                session.query(StateAttributes)
+                .filter_by(shared_attrs='{"old": true}')
+                .count()
+                == 1
+            )
+
+    def test_purge_old_data_batches(self):
+        """Test purging old data one batch at a time."""
+        self._add_test_events()
+        self._add_test_states()
+        progress = []
+        self.hass.bus.listen(
+            EVENT_RECORDER_PURGE_PROGRESS, lambda event: progress.append(event.data)
+        )
+
+        with session_scope(hass=self.hass) as session:
+            states = session.query(States)
+            events = session.query(Events).filter(Events.event_type.like("EVENT_TEST%"))
+
+            instance = self.hass.data[DATA_INSTANCE]
+            assert not purge_old_data(instance, 4, repack=False, batch_size=3)
+            assert states.count() == 3
+            # Events wait until no old state can refer to them anymore
+            assert events.count() == 6
+
+            assert not purge_old_data(instance, 4, repack=False, batch_size=3)
+            assert states.count() == 2
+            assert events.count() == 3
+
+            assert purge_old_data(instance, 4, repack=False, batch_size=3)
+            assert events.count() == 2
+
+        self.hass.block_till_done()
+        assert [
+            (data["deleted_states"], data["deleted_events"], data["done"])
+            for data in progress
+        ] == [(3, 0, False), (1, 3, False), (0, 1, True)]
+
+    def test_purge_retention_policies(self):
+        """Test purging states with retention policies."""
+        instance = self.hass.data[DATA_INSTANCE]
+        instance.retention = {
+            "domains": {"sensor": 1, "light": 6},
+            "entities": {"sensor.kept": 20},
+            "entity_globs": {"sensor.*_power": 3},
+        }
+        now = dt_util.utcnow()
+
+        self.hass.block_till_done()
+        instance.block_till_done()
+
+        with session_scope(hass=self.hass) as session:
+            for entity_id in (
+                "sensor.kept",
+                "sensor.house_power",
+                "sensor.other",
+                "light.kitchen",
+                "switch.other",
+                "switch.other_power",
+            ):
+                for days in (2, 5, 12):
+                    timestamp = now - timedelta(days=days)
+                    event = Events(
+                        event_type="state_changed",
+                        event_data="{}",
+                        origin="LOCAL",
+                        time_fired=timestamp,
+                    )
+                    session.add(event)
+                    session.flush()
+                    session.add(
+                        States(
+                            entity_id=entity_id,
+                            domain=entity_id.split(".")[0],
+                            state=str(days),
+                            attributes="{}",
+                            last_changed=timestamp,
+                            last_updated=timestamp,
+                            event_id=event.event_id,
+                        )
+                    )
+
+        assert purge_old_data(instance, 4, repack=False)
+
+        with session_scope(hass=self.hass) as session:
+            kept = defaultdict(list)
+            for state in session.query(States):
+                kept[state.entity_id].append(state.state)
+
+            assert kept == {
+                "sensor.kept": ["2", "5", "12"],
+                "sensor.house_power": ["2"],
+                "light.kitchen": ["2", "5"],
+                "switch.other": ["2"],
+                "switch.other_power": ["2"],
+            }
+            assert (
+                session.query(Events).filter_by(event_type="state_changed").count() == 8
+            )
+
     def test_purge_old_events(self):
         """Test deleting old events."""
         self._add_test_events()
@@ -173,6 +393,6 @@ class TestRecorderPurge(unittest.TestCase):
                 self.hass.block_till_done()
                 self.hass.data[DATA_INSTANCE].block_till_done()
                 assert (
-                    mock_logger.debug.mock_calls[3][1][0]
+                    mock_logger.debug.mock_calls[5][1][0]
                     == "Vacuuming SQLite to free space"
                 )
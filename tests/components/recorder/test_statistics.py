@@ -0,0 +1,132 @@
+"""The tests for the recorder statistics."""
+# pylint: disable=protected-access
+from datetime import datetime, timedelta
+from unittest.mock import patch
+
+import pytest
+
+import homeassistant.core as ha
+from homeassistant.const import ATTR_UNIT_OF_MEASUREMENT, EVENT_TIME_CHANGED
+from homeassistant.components.recorder.const import DATA_INSTANCE
+from homeassistant.components.recorder.models import Statistics, StatisticsShortTerm
+from homeassistant.components.recorder.statistics import StatisticsCompiler
+from homeassistant.components.recorder.util import session_scope
+import homeassistant.util.dt as dt_util
+
+from tests.common import get_test_home_assistant, init_recorder_component
+
+START = datetime(2019, 10, 1, 12, 0, tzinfo=dt_util.UTC)
+ATTRIBUTES = {ATTR_UNIT_OF_MEASUREMENT: "W"}
+
+
+@pytest.fixture
+def hass_recorder():
+    """HASS fixture with in-memory recorder."""
+    hass = get_test_home_assistant()
+    init_recorder_component(hass)
+    hass.start()
+    hass.block_till_done()
+    hass.data[DATA_INSTANCE].block_till_done()
+    yield hass
+    hass.stop()
+
+
+def _state(state, attributes=ATTRIBUTES):
+    """Return a state of the test sensor."""
+    return ha.State("sensor.power", state, attributes)
+
+
+def test_compile_time_weighted_mean():
+    """Test the mean is weighted by the time a value was valid."""
+    compiler = StatisticsCompiler(StatisticsShortTerm)
+    assert compiler.compile(START) == []
+
+    compiler.add_state("sensor.power", _state("10"), START)
+    compiler.add_state("sensor.power", _state("40"), START + timedelta(minutes=4))
+    assert compiler.compile(START + timedelta(minutes=4, seconds=59)) == []
+
+    rows = compiler.compile(START + timedelta(minutes=5))
+    assert rows == [
+        {
+            "domain": "sensor",
+            "entity_id": "sensor.power",
+            "start": START,
+            "mean": 16,
+            "min": 10,
+            "max": 40,
+            "last": 40,
+            "attributes": ATTRIBUTES,
+        }
+    ]
+
+    # The last value carries over into the next period
+    rows = compiler.compile(START + timedelta(minutes=10))
+    assert [(row["start"], row["mean"]) for row in rows] == [
+        (START + timedelta(minutes=5), 40)
+    ]
+
+
+def test_compile_non_numeric_states():
+    """Test only states with a unit and a numeric state are compiled."""
+    compiler = StatisticsCompiler(Statistics)
+    compiler.compile(START)
+
+    compiler.add_state("sensor.power", _state("on", {}), START)
+    compiler.add_state("sensor.other", _state("12", {}), START)
+    assert compiler.compile(START + timedelta(hours=1)) == []
+
+    compiler.add_state("sensor.power", _state("10"), START + timedelta(hours=1))
+    compiler.add_state(
+        "sensor.power", _state("unavailable"), START + timedelta(minutes=90)
+    )
+    rows = compiler.compile(START + timedelta(hours=2))
+    assert [(row["mean"], row["last"]) for row in rows] == [(10, 10)]
+
+    # Entities without a numeric value are no longer compiled
+    assert compiler.compile(START + timedelta(hours=3)) == []
+
+
+def test_recorder_compiles_statistics(hass_recorder):
+    """Test the recorder stores the statistics when a period ends."""
+    hass = hass_recorder
+    now = dt_util.utcnow()
+
+    hass.states.set("sensor.power", "10", ATTRIBUTES)
+    hass.states.set("sensor.text", "hello", ATTRIBUTES)
+    hass.block_till_done()
+
+    hass.bus.fire(EVENT_TIME_CHANGED, {"now": now + timedelta(minutes=5)})
+    hass.block_till_done()
+    hass.data[DATA_INSTANCE].block_till_done()
+
+    with session_scope(hass=hass) as session:
+        # The real timer may also have ended a period in the meantime
+        rows = list(session.query(StatisticsShortTerm))
+        assert {(row.entity_id, row.mean, row.last) for row in rows} == {
+            ("sensor.power", 10, 10)
+        }
+        assert rows[0].to_native().attributes == ATTRIBUTES
+
+    hass.bus.fire(EVENT_TIME_CHANGED, {"now": now + timedelta(hours=1, minutes=5)})
+    hass.block_till_done()
+    hass.data[DATA_INSTANCE].block_till_done()
+
+    with session_scope(hass=hass) as session:
+        compiled = session.query(Statistics).count()
+        assert compiled >= 1
+
+    with patch(
+        "homeassistant.components.recorder.purge.dt_util.utcnow",
+        return_value=now + timedelta(days=30),
+    ):
+        hass.services.call("recorder", "purge", {"keep_days": 1})
+        hass.block_till_done()
+        hass.data[DATA_INSTANCE].block_till_done()
+
+    # The short term statistics are purged, the hourly ones are kept
+    with session_scope(hass=hass) as session:
+        assert session.query(StatisticsShortTerm).count() == 0
+        rows = list(session.query(Statistics))
+        assert len(rows) == compiled
+        assert {row.entity_id for row in rows} == {"sensor.power"}
+        assert rows[0].to_native().attributes == ATTRIBUTES
@@ -12,6 +12,8 @@ from homeassistant.setup import async_setup_component
 import homeassistant.core as ha
 from homeassistant.const import MATCH_ALL
 from homeassistant.helpers.event import (
+    DATA_POINT_IN_TIME_SCHEDULER,
+    DATA_STATE_CHANGE_DISPATCHER,
     async_call_later,
     async_track_point_in_time,
     async_track_point_in_utc_time,
@@ -86,6 +88,139 @@ async def test_track_point_in_time(hass):
     assert len(runs) == 2
 
 
+async def test_track_point_in_utc_time_without_time_changed(hass):
+    """Test point in time listeners fire at their deadline without ticks."""
+    runs = []
+
+    async_track_point_in_utc_time(
+        hass,
+        callback(lambda now: runs.append(now)),
+        dt_util.utcnow() + timedelta(seconds=0.05),
+    )
+    assert len(runs) == 0
+
+    await asyncio.sleep(0.1)
+    await hass.async_block_till_done()
+    assert len(runs) == 1
+
+
+async def test_track_point_in_utc_time_order(hass):
+    """Test point in time listeners fire in order of their deadline."""
+    runs = []
+    base = datetime(2017, 12, 19, 15, 40, 0, tzinfo=dt_util.UTC)
+
+    for seconds in (30, 10, 20):
+        async_track_point_in_utc_time(
+            hass,
+            callback(lambda now, seconds=seconds: runs.append(seconds)),
+            base + timedelta(seconds=seconds),
+        )
+
+    unsub = async_track_point_in_utc_time(
+        hass, callback(lambda now: runs.append(15)), base + timedelta(seconds=15)
+    )
+    unsub()
+
+    _send_time_changed(hass, base + timedelta(seconds=20))
+    await hass.async_block_till_done()
+    assert runs == [10, 20]
+
+    _send_time_changed(hass, base + timedelta(seconds=40))
+    await hass.async_block_till_done()
+    assert runs == [10, 20, 30]
+
+
+async def test_track_point_in_utc_time_releases_listeners(hass):
+    """Test the scheduler only listens for time while timers are pending."""
+    point_in_time = dt_util.utcnow() + timedelta(hours=1)
+
+    unsub = async_track_point_in_utc_time(
+        hass, callback(lambda now: None), point_in_time
+    )
+    unsub_2 = async_track_point_in_utc_time(
+        hass, callback(lambda now: None), point_in_time
+    )
+    assert hass.bus.async_listeners()[ha.EVENT_TIME_CHANGED] == 1
+
+    unsub()
+    assert hass.bus.async_listeners()[ha.EVENT_TIME_CHANGED] == 1
+
+    unsub_2()
+    assert ha.EVENT_TIME_CHANGED not in hass.bus.async_listeners()
+
+    # Cancelling twice is a no-op
+    unsub_2()
+
+
+async def test_track_point_in_utc_time_after_past_deadline(hass):
+    """Test a past deadline does not keep a later one from its loop timer."""
+    runs = []
+
+    async_track_point_in_utc_time(
+        hass,
+        callback(lambda now: runs.append("later")),
+        dt_util.utcnow() + timedelta(seconds=0.05),
+    )
+    # Replaces the loop timer of the later deadline
+    async_track_point_in_utc_time(
+        hass,
+        callback(lambda now: runs.append("past")),
+        dt_util.utcnow() - timedelta(seconds=1),
+    )
+
+    _send_time_changed(hass, dt_util.utcnow())
+    await hass.async_block_till_done()
+    assert runs == ["past"]
+
+    await asyncio.sleep(0.1)
+    await hass.async_block_till_done()
+    assert runs == ["past", "later"]
+
+
+async def test_track_point_in_utc_time_cancel_due(hass):
+    """Test an action can cancel another action that is due as well."""
+    runs = []
+    point_in_time = datetime(2017, 12, 19, 15, 40, 0, tzinfo=dt_util.UTC)
+
+    @callback
+    def cancelling_action(now):
+        """Cancel the other action."""
+        runs.append("cancelling")
+        unsub()
+
+    async_track_point_in_utc_time(hass, cancelling_action, point_in_time)
+    unsub = async_track_point_in_utc_time(
+        hass, callback(lambda now: runs.append("cancelled")), point_in_time
+    )
+
+    _send_time_changed(hass, point_in_time)
+    await hass.async_block_till_done()
+    assert runs == ["cancelling"]
+    assert hass.data[DATA_POINT_IN_TIME_SCHEDULER]._cancelled == 0
+    assert ha.EVENT_TIME_CHANGED not in hass.bus.async_listeners()
+
+
+async def test_track_point_in_utc_time_error(hass, caplog):
+    """Test an error in an action does not prevent other actions."""
+    runs = []
+    point_in_time = datetime(2017, 12, 19, 15, 40, 0, tzinfo=dt_util.UTC)
+
+    @callback
+    def failing_action(now):
+        """Raise an error."""
+        raise ValueError("Boom")
+
+    async_track_point_in_utc_time(hass, failing_action, point_in_time)
+    async_track_point_in_utc_time(
+        hass, callback(lambda now: runs.append(now)), point_in_time
+    )
+
+    _send_time_changed(hass, point_in_time)
+    await hass.async_block_till_done()
+    assert runs == [point_in_time]
+    assert "Error running point in time action" in caplog.text
+
+
 async def test_track_state_change(hass):
     """Test track_state_change."""
     # 2 lists to track how often our callbacks get called
@@ -165,6 +300,66 @@ async def test_track_state_change(hass):
     assert len(wildercard_runs) == 6
 
 
+async def test_track_state_change_shared_listener(hass):
+    """Test state change trackers share a single bus listener."""
+    kitchen_runs = []
+    all_runs = []
+
+    unsub_kitchen = async_track_state_change(
+        hass,
+        ["light.Kitchen", "light.kitchen"],
+        callback(lambda entity_id, old_state, new_state: kitchen_runs.append(1)),
+    )
+    unsubs = [
+        async_track_state_change(
+            hass, f"light.unrelated_{idx}", callback(lambda *args: None)
+        )
+        for idx in range(10)
+    ]
+    unsub_all = async_track_state_change(
+        hass, MATCH_ALL, callback(lambda *args: all_runs.append(1))
+    )
+
+    assert hass.bus.async_listeners()[ha.EVENT_STATE_CHANGED] == 1
+    assert (
+        hass.data[DATA_STATE_CHANGE_DISPATCHER].async_listeners()["light.kitchen"] == 1
+    )
+
+    hass.states.async_set("light.kitchen", "on")
+    hass.states.async_set("light.living_room", "on")
+    await hass.async_block_till_done()
+    assert len(kitchen_runs) == 1
+    assert len(all_runs) == 2
+
+    unsub_kitchen()
+    unsub_all()
+    for unsub in unsubs:
+        unsub()
+
+    assert hass.data[DATA_STATE_CHANGE_DISPATCHER].async_listeners() == {}
+    assert ha.EVENT_STATE_CHANGED not in hass.bus.async_listeners()
+
+
+async def test_track_state_change_error(hass, caplog):
+    """Test an error in a tracker does not prevent other trackers."""
+    runs = []
+
+    @callback
+    def failing_action(entity_id, old_state, new_state):
+        """Raise an error."""
+        raise ValueError("Boom")
+
+    async_track_state_change(hass, "light.kitchen", failing_action)
+    async_track_state_change(
+        hass, "light.kitchen", callback(lambda *args: runs.append(1))
+    )
+
+    hass.states.async_set("light.kitchen", "on")
+    await hass.async_block_till_done()
+    assert len(runs) == 1
+    assert "Error running state change listener" in caplog.text
+
+
 async def test_track_template(hass):
     """Test tracking template."""
     specific_runs = []
@@ -14,7 +14,11 @@ import pytz
 import pytest
 
 import homeassistant.core as ha
-from homeassistant.exceptions import InvalidEntityFormatError, InvalidStateError
+from homeassistant.exceptions import (
+    HomeAssistantError,
+    InvalidEntityFormatError,
+    InvalidStateError,
+)
 import homeassistant.util.dt as dt_util
 from homeassistant.util.unit_system import METRIC_SYSTEM
 from homeassistant.const import (
@@ -147,6 +151,85 @@ def test_async_run_job_delegates_non_async():
     assert len(hass.async_add_job.mock_calls) == 1
 
 
+def test_hassjob_job_type():
+    """Test the job type of a HassJob is determined when it is created."""
+
+    async def coro_job():
+        pass
+
+    @ha.callback
+    def callback_job():
+        pass
+
+    def executor_job():
+        pass
+
+    assert ha.HassJob(callback_job).job_type == ha.HassJobType.Callback
+    assert (
+        ha.HassJob(functools.partial(callback_job)).job_type == ha.HassJobType.Callback
+    )
+    assert (
+        ha.HassJob(functools.partial(coro_job)).job_type
+        == ha.HassJobType.Coroutinefunction
+    )
+    assert ha.HassJob(executor_job).job_type == ha.HassJobType.Executor
+
+    coro = coro_job()
+    with pytest.raises(ValueError):
+        ha.HassJob(coro)
+    coro.close()
+
+
+def test_async_add_hass_job_schedule_callback():
+    """Test that we schedule callback jobs without checking them again."""
+    hass = MagicMock()
+    job = ha.HassJob(ha.callback(MagicMock()))
+
+    ha.HomeAssistant.async_add_hass_job(hass, job)
+    assert len(hass.loop.call_soon.mock_calls) == 1
+    assert len(hass.loop.create_task.mock_calls) == 0
+    assert len(hass.loop.run_in_executor.mock_calls) == 0
+
+
+def test_async_add_hass_job_add_threaded_job_to_pool():
+    """Test that we add executor jobs to the job pool."""
+    hass = MagicMock()
+
+    def job():
+        pass
+
+    ha.HomeAssistant.async_add_hass_job(hass, ha.HassJob(job))
+    assert len(hass.loop.call_soon.mock_calls) == 0
+    assert len(hass.loop.create_task.mock_calls) == 0
+    assert len(hass.loop.run_in_executor.mock_calls) == 1
+
+
+def test_async_run_hass_job_calls_callback():
+    """Test that callback jobs are run immediately."""
+    hass = MagicMock()
+    calls = []
+
+    def job():
+        calls.append(1)
+
+    ha.HomeAssistant.async_run_hass_job(hass, ha.HassJob(ha.callback(job)))
+    assert len(calls) == 1
+    assert len(hass.async_add_hass_job.mock_calls) == 0
+
+
+def test_async_run_hass_job_delegates_non_async():
+    """Test that other jobs are added to be run later."""
+    hass = MagicMock()
+    calls = []
+
+    def job():
+        calls.append(1)
+
+    ha.HomeAssistant.async_run_hass_job(hass, ha.HassJob(job))
+    assert len(calls) == 0
+    assert len(hass.async_add_hass_job.mock_calls) == 1
+
+
 def test_stage_shutdown():
     """Simulate a shutdown, test calling stuff."""
     hass = get_test_home_assistant()
@@ -470,6 +553,106 @@ class TestEventBus(unittest.TestCase):
         assert len(coroutine_calls) == 1
 
 
+async def test_eventbus_filtered_listener(hass):
+    """Test a listener is only scheduled for the events its filter passes."""
+    calls = []
+
+    @ha.callback
+    def listener(event):
+        """Mock listener."""
+        calls.append(event)
+
+    @ha.callback
+    def event_filter(event):
+        """Pass the events with a matching entity."""
+        return event.data["entity_id"] == "light.kitchen"
+
+    unsub = hass.bus.async_listen("test", listener, event_filter=event_filter)
+
+    hass.bus.async_fire("test", {"entity_id": "light.kitchen"})
+    hass.bus.async_fire("test", {"entity_id": "light.living_room"})
+    await hass.async_block_till_done()
+    assert len(calls) == 1
+    assert calls[0].data["entity_id"] == "light.kitchen"
+
+    unsub()
+    hass.bus.async_fire("test", {"entity_id": "light.kitchen"})
+    await hass.async_block_till_done()
+    assert len(calls) == 1
+
+
+async def test_eventbus_filter_raises(hass, caplog):
+    """Test a listener is skipped when its filter raises."""
+    calls = []
+
+    @ha.callback
+    def listener(event):
+        """Mock listener."""
+        calls.append(event)
+
+    hass.bus.async_listen("test", listener, event_filter=lambda event: 1 / 0)
+    hass.bus.async_fire("test")
+    await hass.async_block_till_done()
+
+    assert calls == []
+    assert "Error in event filter" in caplog.text
+
+
+async def test_eventbus_run_immediately(hass, caplog):
+    """Test a listener that runs while the event is fired."""
+    calls = []
+
+    @ha.callback
+    def listener(event):
+        """Mock listener."""
+        calls.append(event)
+        if event.data.get("fail"):
+            raise ValueError("fail")
+
+    unsub = hass.bus.async_listen("test", listener, run_immediately=True)
+
+    hass.bus.async_fire("test")
+    assert len(calls) == 1
+
+    hass.bus.async_fire("test", {"fail": True})
+    assert len(calls) == 2
+    assert "Error running listener" in caplog.text
+
+    unsub()
+    hass.bus.async_fire("test")
+    assert len(calls) == 2
+
+
+async def test_eventbus_run_immediately_not_callback(hass):
+    """Test only callbacks can run while the event is fired."""
+
+    def listener(event):
+        """Mock listener."""
+
+    with pytest.raises(HomeAssistantError):
+        hass.bus.async_listen("test", listener, run_immediately=True)
+
+
+async def test_eventbus_remove_listener_while_firing(hass):
+    """Test listeners removed while an event is fired still get that event."""
+    calls = []
+    unsubs = []
+
+    @ha.callback
+    def listener(event):
+        """Remove all listeners."""
+        calls.append(event)
+        while unsubs:
+            unsubs.pop()()
+
+    unsubs.append(hass.bus.async_listen("test", listener, run_immediately=True))
+    unsubs.append(hass.bus.async_listen("test", listener, run_immediately=True))
+
+    hass.bus.async_fire("test")
+    assert len(calls) == 2
+    assert "test" not in hass.bus.async_listeners()
+
+
 def test_state_init():
     """Test state.init."""
     with pytest.raises(InvalidEntityFormatError):
@@ -585,6 +768,27 @@ class TestStateMachine(unittest.TestCase):
         states = sorted(state.entity_id for state in self.states.all())
         assert ["light.bowl", "switch.ac"] == states
 
+    def test_all_of_domain(self):
+        """Test the states of a domain follow sets and removes."""
+        assert [state.entity_id for state in self.states.all("light")] == ["light.bowl"]
+        assert self.states.all("LIGHT")[0] is self.states.get("light.bowl")
+        assert self.states.all("sensor") == []
+
+        self.states.set("light.Kitchen", "on")
+        self.states.set("light.bowl", "off")
+        states = {state.entity_id: state for state in self.states.all("light")}
+        assert states == {
+            "light.bowl": self.states.get("light.bowl"),
+            "light.kitchen": self.states.get("light.kitchen"),
+        }
+        assert states["light.bowl"].state == "off"
+
+        self.states.remove("light.bowl")
+        self.states.remove("light.kitchen")
+        assert self.states.all("light") == []
+        assert self.states.entity_ids("light") == []
+        assert self.states.entity_ids("switch") == ["switch.ac"]
+
     def test_remove(self):
         """Test remove method."""
         events = []
@@ -236,3 +236,14 @@ async def test_get_config_flows(hass):
         flows = await loader.async_get_config_flows(hass)
         assert "test_2" in flows
         assert "test_1" not in flows
+
+
+def test_integration_from_module():
+    """Test modules and files are attributed to their integration."""
+    assert loader.integration_from_module("homeassistant.components.hue.light") == "hue"
+    assert loader.integration_from_module("custom_components.my_hub") == "my_hub"
+    assert (
+        loader.integration_from_module("/config/custom_components/my_hub/sensor.py")
+        == "my_hub"
+    )
+    assert loader.integration_from_module("homeassistant.core") == "homeassistant.core"
@@ -217,6 +217,17 @@ def test_throttle_on_two_method():
     assert tester.goodbye()
 
 
+def test_percentile():
+    """Test the percentile of sorted values."""
+    assert util.percentile([], 0.5) is None
+    assert util.percentile([1], 0.99) == 1
+    values = list(range(101))
+    assert util.percentile(values, 0) == 0
+    assert util.percentile(values, 0.5) == 50
+    assert util.percentile(values, 0.95) == 95
+    assert util.percentile(values, 1) == 100
+
+
 @patch.object(util, "random")
 def test_get_random_string(mock_random):
     """Test get random string."""